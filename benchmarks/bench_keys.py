@@ -0,0 +1,100 @@
+"""Signing-key lookup throughput as the number of threads grows.
+
+Run from the repository root::
+
+    python benchmarks/bench_keys.py [--number 20000] [--threads 1 2 4 8 16 32 64]
+
+Each thread resolves the same ``kid`` ``--number`` times against a warm key
+snapshot, as gthread workers do on every authenticated request; the JWKS
+endpoint is stubbed. Lookups take no lock, so on a free-threaded interpreter
+total throughput should grow with the thread count. With the GIL it stays
+roughly flat; what matters there is that it does not fall off.
+"""
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+import django
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.conf import settings
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+ISSUER = "https://kc.bench/realms/bench"
+
+settings.configure(
+    INSTALLED_APPS=["django.contrib.auth", "django.contrib.contenttypes"],
+    DATABASES={},
+    KEYCLOAK_CONFIG={"ISSUER": ISSUER},
+)
+django.setup()
+
+from drf_keycloak import keys  # noqa: E402
+
+
+def _jwks(count):
+    """A realm with ``count`` rotated keys, ``k0`` being the current one."""
+    jwks = []
+    for i in range(count):
+        public_key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048
+        ).public_key()
+        jwk = jwt.algorithms.RSAAlgorithm.to_jwk(public_key, as_dict=True)
+        jwk.update({"kid": f"k{i}", "use": "sig", "alg": "RS256"})
+        jwks.append(jwk)
+    return {"keys": jwks}
+
+
+def _run(threads, number, kid):
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for _ in range(number):
+            keys.resolve_signing_key(kid)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return threads * number / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument(
+        "--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64]
+    )
+    parser.add_argument("--keys", type=int, default=8, help="keys in the JWKS")
+    args = parser.parse_args()
+
+    response = (None, _jwks(args.keys))
+    with mock.patch.object(keys.keycloak_api, "get_jwks", return_value=response):
+        keys.resolve_signing_key("k0")  # load the snapshot
+
+        gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+        print(
+            f"{args.keys} keys, {args.number} lookups per thread, "
+            f"GIL {'enabled' if gil else 'disabled'}"
+        )
+        baseline = None
+        for threads in args.threads:
+            rate = _run(threads, args.number, f"k{args.keys - 1}")
+            baseline = baseline or rate
+            print(
+                f"  {threads:>3} thread(s) {rate:>12,.0f} lookups/s "
+                f"({rate / baseline:4.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
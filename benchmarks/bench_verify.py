@@ -0,0 +1,100 @@
+"""Per-token verification cost: PyJWT path vs. FAST_VERIFICATION.
+
+Run from the repository root::
+
+    python benchmarks/bench_verify.py [--number 5000] [--algorithm RS256]
+
+The JWKS lookup is stubbed with an in-memory key, so what is measured is
+header parsing, token parsing, signature verification and claim checks. The
+PyJWT path still pays for ``get_signing_key``'s separate header parse.
+"""
+
+import argparse
+import sys
+import time
+import timeit
+from pathlib import Path
+from unittest import mock
+
+import django
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from django.conf import settings
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+ISSUER = "https://kc.bench/realms/bench"
+
+settings.configure(
+    INSTALLED_APPS=["django.contrib.auth", "django.contrib.contenttypes"],
+    DATABASES={},
+    KEYCLOAK_CONFIG={"ISSUER": ISSUER},
+)
+django.setup()
+
+from django.test.utils import override_settings  # noqa: E402
+
+from drf_keycloak import keys  # noqa: E402
+from drf_keycloak.token import JWToken  # noqa: E402
+
+
+def _private_key(algorithm):
+    if algorithm.startswith("ES"):
+        return ec.generate_private_key(ec.SECP256R1())
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def _token(private_key, algorithm):
+    now = int(time.time())
+    claims = {
+        "iss": ISSUER,
+        "aud": "account",
+        "sub": "0f3b2e0c-7a51-4b4e-9d0e-6a1f0c1f2d3e",
+        "preferred_username": "bench",
+        "email": "bench@example.com",
+        "resource_access": {"account": {"roles": ["view-profile", "manage-account"]}},
+        "iat": now,
+        "exp": now + 3600,
+    }
+    return jwt.encode(claims, private_key, algorithm=algorithm, headers={"kid": "k1"})
+
+
+def _measure(token, number, **config):
+    config = {"ISSUER": ISSUER, "AUDIENCE": "account", **config}
+    with override_settings(KEYCLOAK_CONFIG=config):
+        JWToken(token)  # warm up lazily built state
+        return min(timeit.repeat(lambda: JWToken(token), number=number, repeat=5))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=5000)
+    parser.add_argument("--algorithm", default="RS256", choices=["RS256", "ES256"])
+    args = parser.parse_args()
+
+    private_key = _private_key(args.algorithm)
+    public_key = private_key.public_key()
+    token = _token(private_key, args.algorithm)
+
+    with (
+        mock.patch.object(keys, "resolve_signing_key", return_value=public_key),
+        mock.patch("drf_keycloak.token.resolve_signing_key", return_value=public_key),
+    ):
+        results = {
+            "PyJWT (jwt.decode)": _measure(
+                token, args.number, ALGORITHM=[args.algorithm]
+            ),
+            "FAST_VERIFICATION": _measure(
+                token, args.number, ALGORITHM=[args.algorithm], FAST_VERIFICATION=True
+            ),
+        }
+
+    baseline = results["PyJWT (jwt.decode)"]
+    print(f"{args.algorithm}, {args.number} tokens per run, best of 5")
+    for name, total in results.items():
+        per_token = total / args.number * 1e6
+        print(f"  {name:<20} {per_token:8.1f} us/token  ({baseline / total:4.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""Native async authentication for ASGI deployments.
+
+Async counterparts of ``KeycloakApi``, ``keys.get_signing_key``, ``JWToken``
+and ``KeycloakAuthBackend``. Network I/O goes through ``httpx.AsyncClient`` and
+user lookup/sync through Django's async ORM, so no step blocks the event loop.
+Only the shared JWKS store and the on-disk JWKS snapshot, which have sync APIs
+only, are used from a worker thread.
+
+``AsyncKeycloakAuthBackend.authenticate`` is a coroutine function. Use it with
+an async-capable DRF request (e.g. adrf's), which awaits such authenticators;
+plain DRF calls ``authenticate`` synchronously and needs the regular backend.
+"""
+
+import asyncio
+import logging
+import weakref
+from contextlib import nullcontext
+
+try:
+    import httpx
+except ImportError as exc:
+    # httpx is an optional dependency; only needed for the async path.
+    raise ImportError(
+        "drf_keycloak.aio requires httpx. "
+        "Install it with: pip install drf-keycloak[async]"
+    ) from exc
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from rest_framework.exceptions import APIException, AuthenticationFailed
+
+from . import discovery, keys
+from .api import KeycloakApi
+from .authentication import (
+    KeycloakAuthBackend,
+    KeycloakStatelessAuthBackend,
+    token_errors,
+)
+from .cache import token_digest
+from .exceptions import KeycloakAPIError, TokenBackendError
+from .jwks_store import get_jwks_snapshot, get_jwks_store
+from .resilience import (
+    get_circuit_breaker,
+    get_introspection_bulkhead,
+    record_response,
+)
+from .revocation import ais_revoked
+from .settings import keycloak_settings
+from .singleflight import AsyncSingleFlight
+from .token import JWToken
+from .users import claims_fingerprint, get_user_cache, is_synced, mark_synced
+from .verifier import get_verifier
+from .writeback import defer_user_save
+
+logger = logging.getLogger("drf_keycloak")
+
+
+class AsyncKeycloakApi(KeycloakApi):
+    """``KeycloakApi`` over ``httpx.AsyncClient``.
+
+    An ``AsyncClient`` is bound to the event loop it first ran on, so one is
+    kept per running loop (and per value of the ``VERIFY_CERTIFICATE`` and
+    ``HTTP_*`` settings).
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def connection(self):
+        loop = asyncio.get_running_loop()
+        options = (self._verify, self.timeout, self._pool_options)
+        entry = self._clients.get(loop)
+        if entry is None or entry[0] != options:
+            entry = self._clients[loop] = (options, self._build_client(options[0]))
+        return entry[1]
+
+    def _build_client(self, verify):
+        connect, read = self.timeout
+        # httpx retries connection failures only, never a request that was sent
+        transport = httpx.AsyncHTTPTransport(
+            verify=verify,
+            retries=keycloak_settings.HTTP_RETRIES,
+            limits=httpx.Limits(
+                max_keepalive_connections=keycloak_settings.HTTP_POOL_MAXSIZE
+            ),
+        )
+        return httpx.AsyncClient(
+            transport=transport, timeout=httpx.Timeout(read, connect=connect)
+        )
+
+    @property
+    def _pool_options(self):
+        return keycloak_settings.HTTP_RETRIES, keycloak_settings.HTTP_POOL_MAXSIZE
+
+    async def endpoint(self, name, base_url=None):
+        """Async ``discovery.endpoint``: fetches the document without blocking."""
+        base_url = base_url or self.base_url
+        if discovery.needs_fetch(base_url):
+            try:
+                data = await self.get(url=discovery.well_known_url(base_url))
+            except APIException as exc:
+                logger.warning("Discovery for %s failed: %s", base_url, exc)
+                data = None
+            discovery.store_document(base_url, data)
+        return discovery.endpoint(name, base_url)
+
+    async def get_userinfo(self, token):
+        """Fetch the userinfo document for a token."""
+        return await self.get(
+            url=await self.endpoint("userinfo_endpoint"),
+            headers={"Authorization": "Bearer " + token},
+        )
+
+    async def get_introspect(self, token):
+        """Validate a token via Keycloak's introspection endpoint."""
+        url = await self.endpoint("introspection_endpoint")
+        async with get_introspection_bulkhead(asynchronous=True) or nullcontext():
+            return await self.post(url=url, data=self._introspection_data(token))
+
+    async def get_jwks(self, url, cached=None):
+        """Async ``KeycloakApi.get_jwks``."""
+        headers = {"Accept": "application/json"}
+        if cached is not None:
+            headers["If-None-Match"] = cached[0]
+        response = await self.send("get", url, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            return cached
+        return response.headers.get("ETag"), self.clean_response(response)
+
+    async def send(self, method, url, **kwargs):
+        """Send a request; return the raw response. Network failures fail closed."""
+        breaker = get_circuit_breaker(url)
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            response = await getattr(self.connection, method)(url, **kwargs)
+        except httpx.HTTPError as exc:
+            logger.warning("Keycloak %s %s failed: %s", method.upper(), url, exc)
+            if breaker is not None:
+                breaker.record_failure()
+            raise KeycloakAPIError() from exc
+        except BaseException:
+            # e.g. cancelled: the breaker slot must not stay taken
+            if breaker is not None:
+                breaker.release()
+            raise
+        if breaker is not None:
+            record_response(breaker, response)
+        return response
+
+    async def get(self, path=None, headers=None, url=None):
+        """GET helper. Network failures fail closed as 503."""
+        response = await self.send("get", url or self._url(path), headers=headers)
+        return self.clean_response(response)
+
+    async def post(self, path=None, data=None, url=None):
+        """POST helper. Network failures fail closed as 503."""
+        response = await self.send("post", url or self._url(path), data=data)
+        return self.clean_response(response)
+
+
+async_keycloak_api = AsyncKeycloakApi()
+
+
+# one JWKS fetch / introspection call in flight per URL / token, per event loop
+_fetches = AsyncSingleFlight()
+_introspections = AsyncSingleFlight()
+
+
+async def _fetch_signing_keys(url, newer_than=None):
+    """Load the JWKS for ``url``; concurrent calls share one fetch."""
+    return await _fetches.do(url, _fetch_signing_keys_now, url, newer_than)
+
+
+async def _fetch_signing_keys_now(url, newer_than):
+    if get_jwks_store() is not None:
+        # the shared store's lock and cache calls are sync; keep them off the loop
+        return await sync_to_async(keys._fetch_signing_keys, thread_sensitive=False)(
+            url, newer_than=newer_than
+        )
+    realm = keys._realm(url)
+    try:
+        response = await async_keycloak_api.get_jwks(url, realm.http_cache)
+    except KeycloakAPIError:
+        if newer_than is not None:
+            raise
+        fallback = await _with_snapshot(keys._fallback_signing_keys, url)
+        if fallback is None:
+            raise
+        return fallback
+    except APIException as exc:
+        raise TokenBackendError("No signing keys available") from exc
+    # the snapshot, ETag, cooldown and background refresher are shared with the
+    # sync path
+    data = keys._revalidated(realm, response)
+    return await _with_snapshot(keys._load_keyset, url, data)
+
+
+async def _with_snapshot(func, *args):
+    """``func(*args)``, from a worker thread if it may use JWKS_SNAPSHOT_PATH.
+
+    The snapshot is read and written (with an fsync) synchronously.
+    """
+    if get_jwks_snapshot() is None:
+        return func(*args)
+    return await sync_to_async(func, thread_sensitive=False)(*args)
+
+
+async def _cached_signing_keys(url):
+    """``keys._cached_signing_keys``, kept off the loop on a cold start.
+
+    A realm without keys yet is seeded from the on-disk snapshot, if any.
+    """
+    realm = keys._realm(url)
+    if realm.keyset is None and not realm.disk_checked:
+        return await _with_snapshot(keys._cached_signing_keys, url)
+    return keys._cached_signing_keys(url)
+
+
+async def aget_signing_key(token, issuer=None):
+    """Async ``keys.get_signing_key``: same errors, same refresh gate."""
+    return await aresolve_signing_key(keys._unverified_kid(token), issuer)
+
+
+async def aresolve_signing_key(kid, issuer=None):
+    """Async ``keys.resolve_signing_key``."""
+    keys._check_kid(kid)
+    url = await async_keycloak_api.endpoint("jwks_uri", keys._base_url(issuer))
+
+    signing_keys = await _cached_signing_keys(url)
+    if signing_keys is None:
+        signing_keys = await _fetch_signing_keys(url)
+
+    signing_key = keys._match(signing_keys, kid)
+    if signing_key is not None:
+        return signing_key
+
+    if keys._refresh_allowed(url):
+        newer_than = keys._snapshot_time(url)
+        signing_keys = await _fetch_signing_keys(url, newer_than=newer_than)
+    else:
+        signing_keys = await _fetches.wait(url)
+        if signing_keys is None:
+            raise TokenBackendError("Signing key not found")
+    signing_key = keys._match(signing_keys, kid)
+    if signing_key is None:
+        raise TokenBackendError("Signing key not found")
+    return signing_key
+
+
+class AsyncJWToken(JWToken):
+    """Awaitable ``JWToken``: ``payload = await AsyncJWToken(raw).validate()``."""
+
+    def __init__(self, token=None):
+        super().__init__()
+        self.token = token
+
+    async def validate(self):
+        self.payload = await self.adecode(self.token)
+        if await ais_revoked(self.payload):
+            self._reject_revoked()
+        if keycloak_settings.VERIFY_TOKENS_WITH_KEYCLOAK:
+            await self.averify_token_with_keycloak()
+        return self.payload
+
+    async def adecode(self, token):
+        payload = self._cached_payload(token)
+        if payload is None:
+            jws = self._fast_path_jws(token)
+            if jws is not None:
+                issuer = self._token_issuer(jws)
+                key = await aresolve_signing_key(jws.kid, issuer)
+                payload = get_verifier().verify(jws, key, issuer)
+            else:
+                issuer = self._token_issuer(token)
+                key = await aget_signing_key(token, issuer)
+                payload = self._verify(token, key, issuer)
+            payload = self._remember_payload(token, payload)
+        return payload
+
+    async def averify_token_with_keycloak(self):
+        active = self._cached_verdict()
+        if active is None:
+            result = await _introspections.do(
+                token_digest(self.token),
+                async_keycloak_api.get_introspect,
+                self.token,
+            )
+            active = self._remember_verdict(self._is_active(result))
+        if not active:
+            self._reject_inactive()
+
+
+class AsyncKeycloakAuthBackend(KeycloakAuthBackend):
+    """``KeycloakAuthBackend`` whose ``authenticate`` is a coroutine."""
+
+    async def authenticate(self, request):
+        self.raw_token = self._request_token(request)
+        if self.raw_token is None:
+            return None
+
+        with token_errors():
+            validated_token = await AsyncJWToken(self.raw_token).validate()
+
+        return await self.aget_user_or_create(validated_token), validated_token
+
+    async def aget_user_or_create(self, validated_token):
+        lookup = self.get_user_lookup(validated_token)
+        cache = get_user_cache()
+        user_id = validated_token[keycloak_settings.USER_ID_CLAIM]
+        user = await cache.aget(user_id) if cache is not None else None
+        if user is not None:
+            await self.aupdate_user(user, validated_token)
+        else:
+            try:
+                user, created = await self.user_model.objects.aget_or_create(**lookup)
+            except IntegrityError:
+                # Concurrent first request for the same user raced us to the insert.
+                user, created = await self.user_model.objects.aget(**lookup), False
+
+            if created:
+                user.set_unusable_password()
+            await self.aupdate_user(user, validated_token, force_save=created)
+            if cache is not None and self.user_can_authenticate(user):
+                await cache.aset(user_id, user)
+
+        if not self.user_can_authenticate(user):
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+    async def aupdate_user(self, user, claims, force_save=False):
+        fingerprint = claims_fingerprint(claims)
+        if not force_save and is_synced(user, fingerprint):
+            return user
+        changed = self._apply_claims(user, claims)
+        if changed and not force_save and defer_user_save(user, changed):
+            return user
+        if force_save:
+            await user.asave()
+        elif changed:
+            await user.asave(update_fields=changed)
+        mark_synced(user, fingerprint)
+        return user
+
+
+class AsyncKeycloakStatelessAuthBackend(
+    KeycloakStatelessAuthBackend, AsyncKeycloakAuthBackend
+):
+    """Async ``KeycloakStatelessAuthBackend``; no database access at all."""
+
+    async def aget_user_or_create(self, validated_token):
+        return self.get_user_or_create(validated_token)
@@ -1,17 +1,68 @@
-"""Manage Keycloak HTTP calls (userinfo and token introspection)."""
+"""Manage Keycloak HTTP calls (JWKS, userinfo and token introspection)."""
 
 import logging
+import threading
+from contextlib import nullcontext
 
 import requests
 from django.utils.encoding import force_str
+from requests.adapters import HTTPAdapter
 from rest_framework import status
 from rest_framework.exceptions import APIException
+from urllib3.util import Retry
 
+from . import discovery
 from .exceptions import KeycloakAPIError
+from .resilience import (
+    get_circuit_breaker,
+    get_introspection_bulkhead,
+    record_response,
+)
 from .settings import keycloak_settings
 
 logger = logging.getLogger("drf_keycloak")
 
+# Upstream statuses worth retrying: the proxy or Keycloak is briefly unavailable.
+_RETRY_STATUSES = (502, 503, 504)
+# Only requests that are safe to repeat are retried once they reached Keycloak;
+# connection failures (nothing was sent) are retried for any method.
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def _retry_policy():
+    retries = keycloak_settings.HTTP_RETRIES
+    options = {
+        "total": retries,
+        "connect": retries,
+        "read": retries,
+        "status": retries,
+        "backoff_factor": keycloak_settings.HTTP_RETRY_BACKOFF,
+        "status_forcelist": _RETRY_STATUSES,
+        "raise_on_status": False,
+    }
+    try:
+        return Retry(allowed_methods=_IDEMPOTENT_METHODS, **options)
+    except TypeError:  # pragma: no cover - urllib3 < 1.26
+        return Retry(method_whitelist=_IDEMPOTENT_METHODS, **options)
+
+
+def build_session():
+    """A ``requests.Session`` tuned from the ``HTTP_*`` settings.
+
+    Keeps up to ``HTTP_POOL_MAXSIZE`` keep-alive connections per host (for
+    ``HTTP_POOL_CONNECTIONS`` hosts) and retries failed idempotent requests
+    ``HTTP_RETRIES`` times with exponential backoff.
+    """
+    adapter = HTTPAdapter(
+        pool_connections=keycloak_settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=keycloak_settings.HTTP_POOL_MAXSIZE,
+        max_retries=_retry_policy(),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 
 class KeycloakApi:
     """Thin client for the Keycloak endpoints this package needs.
@@ -19,12 +70,37 @@ class KeycloakApi:
     Configuration is read live from ``keycloak_settings`` on every call so that
     ``override_settings`` / runtime reconfiguration is honored (the previous
     implementation snapshotted settings at import time).
-    """
 
-    timeout = 30
+    All calls share one session (``connection``), built on first use by
+    ``HTTP_SESSION_FACTORY`` or ``build_session`` and rebuilt after a settings
+    change.
+    """
 
     def __init__(self):
-        self.connection = requests.Session()
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self):
+        session = self._session
+        if session is None:
+            with self._lock:
+                if self._session is None:
+                    factory = keycloak_settings.HTTP_SESSION_FACTORY or build_session
+                    self._session = factory()
+                session = self._session
+        return session
+
+    def reset_connection(self):
+        """Build a new session on next use; the old one is left to in-flight calls."""
+        self._session = None
+
+    @property
+    def timeout(self):
+        """``(connect, read)`` timeout in seconds."""
+        read = keycloak_settings.HTTP_TIMEOUT
+        connect = keycloak_settings.HTTP_CONNECT_TIMEOUT
+        return (read if connect is None else connect, read)
 
     @property
     def base_url(self):
@@ -45,7 +121,7 @@ class KeycloakApi:
     def get_userinfo(self, token):
         """Fetch the userinfo document for a token."""
         return self.get(
-            path="protocol/openid-connect/userinfo",
+            url=discovery.endpoint("userinfo_endpoint", self.base_url),
             headers={"Authorization": "Bearer " + token},
         )
 
@@ -54,18 +130,38 @@ class KeycloakApi:
 
         Returns the introspection document (a dict). Network failures and
         Keycloak server errors raise ``KeycloakAPIError`` (503) so they fail
-        closed and visibly.
+        closed and visibly, as does a call the introspection bulkhead turns
+        away (see ``resilience``).
+        """
+        url = discovery.endpoint("introspection_endpoint", self.base_url)
+        with get_introspection_bulkhead() or nullcontext():
+            return self.post(url=url, data=self._introspection_data(token))
+
+    def get_jwks(self, url, cached=None):
+        """Fetch the JWK set at ``url``, revalidating ``cached`` if given.
+
+        Returns ``(etag, jwks)``; ``etag`` is None if the server sent none.
+        ``cached`` is an earlier such pair: its ETag is sent as
+        ``If-None-Match``, and on ``304 Not Modified`` it is returned as is.
         """
+        headers = {"Accept": "application/json"}
+        if cached is not None:
+            headers["If-None-Match"] = cached[0]
+        response = self.send("get", url, headers=headers)
+        if response.status_code == status.HTTP_304_NOT_MODIFIED and cached is not None:
+            return cached
+        return response.headers.get("ETag"), self.clean_response(response)
+
+    def _introspection_data(self, token):
         if not self.client_secret_key:
             raise RuntimeError(
                 'Please set KEYCLOAK_CONFIG["CLIENT_SECRET"] in your settings.'
             )
-        post_data = {
+        return {
             "client_id": self.client_id,
             "client_secret": self.client_secret_key,
             "token": token,
         }
-        return self.post("protocol/openid-connect/token/introspect", data=post_data)
 
     def clean_response(self, response):
         """Return parsed JSON/body for 2xx, else raise a typed error.
@@ -103,29 +199,50 @@ class KeycloakApi:
             message = response.content
         return force_str(message)
 
-    def get(self, path=None, headers=None):
-        """GET helper. Network failures fail closed as 503."""
-        url = f"{self.base_url}/{path}" if path else self.base_url
+    def _url(self, path):
+        return f"{self.base_url}/{path}" if path else self.base_url
+
+    def send(self, method, url, **kwargs):
+        """Send a request over the shared session; return the raw response.
+
+        Network failures fail closed as 503, as does any call while the host's
+        circuit breaker is open (see ``resilience``). A call that fails in any
+        other way gives its breaker slot back.
+        """
+        breaker = get_circuit_breaker(url)
+        if breaker is not None:
+            breaker.before_call()
         try:
-            response = self.connection.get(
-                url, headers=headers, timeout=self.timeout, verify=self._verify
+            response = getattr(self.connection, method)(
+                url, timeout=self.timeout, verify=self._verify, **kwargs
             )
         except requests.RequestException as exc:
-            logger.warning("Keycloak GET %s failed: %s", url, exc)
+            logger.warning("Keycloak %s %s failed: %s", method.upper(), url, exc)
+            if breaker is not None:
+                breaker.record_failure()
             raise KeycloakAPIError() from exc
+        except BaseException:
+            if breaker is not None:
+                breaker.release()
+            raise
+        if breaker is not None:
+            record_response(breaker, response)
+        return response
+
+    def get(self, path=None, headers=None, url=None):
+        """GET helper. Network failures fail closed as 503."""
+        response = self.send("get", url or self._url(path), headers=headers)
         return self.clean_response(response)
 
-    def post(self, path, data):
+    def post(self, path=None, data=None, url=None):
         """POST helper. Network failures fail closed as 503."""
-        url = f"{self.base_url}/{path}"
-        try:
-            response = self.connection.post(
-                url, data=data, timeout=self.timeout, verify=self._verify
-            )
-        except requests.RequestException as exc:
-            logger.warning("Keycloak POST %s failed: %s", url, exc)
-            raise KeycloakAPIError() from exc
+        response = self.send("post", url or self._url(path), data=data)
         return self.clean_response(response)
 
 
 keycloak_api = KeycloakApi()
+
+
+def reset_keycloak_api():
+    """Rebuild the shared session on next use (e.g. after a settings change)."""
+    keycloak_api.reset_connection()
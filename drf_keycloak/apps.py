@@ -0,0 +1,15 @@
+"""Django app configuration."""
+
+from django.apps import AppConfig
+
+
+class DrfKeycloakConfig(AppConfig):
+    name = "drf_keycloak"
+    verbose_name = "Keycloak"
+
+    def ready(self):
+        from .users import connect_signals
+        from .warmup import warm_up_on_startup
+
+        connect_signals()
+        warm_up_on_startup()
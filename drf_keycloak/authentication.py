@@ -1,15 +1,21 @@
 """Keycloak User Authentication"""
 
 import logging
+from contextlib import contextmanager
+from functools import partial
 
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError
+from django.utils.functional import SimpleLazyObject
 from rest_framework import authentication
 from rest_framework.exceptions import AuthenticationFailed
 
 from .exceptions import TokenBackendError, TokenBackendExpiredToken
+from .models import TokenUser
 from .settings import keycloak_settings
 from .token import JWToken
+from .users import claims_fingerprint, get_user_cache, is_synced, mark_synced
+from .writeback import defer_user_save
 
 logger = logging.getLogger("drf_keycloak")
 
@@ -31,6 +37,17 @@ class ExpiredToken(InvalidToken):
     default_code = "token_expired"
 
 
+@contextmanager
+def token_errors():
+    """Translate token-backend failures into DRF 401s."""
+    try:
+        yield
+    except TokenBackendExpiredToken as exc:
+        raise ExpiredToken() from exc
+    except TokenBackendError as exc:
+        raise InvalidToken() from exc
+
+
 class KeycloakAuthBackend(authentication.BaseAuthentication):
     """
     Validates the JWT locally (and optionally against the Keycloak API),
@@ -68,30 +85,57 @@ class KeycloakAuthBackend(authentication.BaseAuthentication):
         return parts[1]
 
     def authenticate(self, request):
-        header = request.headers.get("Authorization")
-        if header is None:
-            return None
-
-        self.raw_token = self.get_raw_token(header)
+        self.raw_token = self._request_token(request)
         if self.raw_token is None:
             return None
 
-        try:
+        with token_errors():
             validated_token = JWToken(self.raw_token).payload
-        except TokenBackendExpiredToken as exc:
-            raise ExpiredToken() from exc
-        except TokenBackendError as exc:
-            raise InvalidToken() from exc
         # KeycloakAPIError (503) and config RuntimeError intentionally propagate:
         # an outage must fail closed and visibly, not silently downgrade to
         # anonymous.
 
         return self.get_user_or_create(validated_token), validated_token
 
+    def _request_token(self, request):
+        header = request.headers.get("Authorization")
+        if header is None:
+            return None
+        return self.get_raw_token(header)
+
     def get_user_or_create(self, validated_token):
         """
         Find or create the user identified by the token, and keep it in sync.
+
+        With ``USER_CACHE`` configured, a cached user is synced in memory and
+        returned without touching the database; a sync that changes a field
+        saves the user, which evicts it from the cache.
         """
+        lookup = self.get_user_lookup(validated_token)
+        cache = get_user_cache()
+        user_id = validated_token[keycloak_settings.USER_ID_CLAIM]
+        user = cache.get(user_id) if cache is not None else None
+        if user is not None:
+            self.update_user(user, validated_token)
+        else:
+            try:
+                user, created = self.user_model.objects.get_or_create(**lookup)
+            except IntegrityError:
+                # Concurrent first request for the same user raced us to the insert.
+                user, created = self.user_model.objects.get(**lookup), False
+
+            if created:
+                user.set_unusable_password()
+            self.update_user(user, validated_token, force_save=created)
+            if cache is not None and self.user_can_authenticate(user):
+                cache.set(user_id, user)
+
+        if not self.user_can_authenticate(user):
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+    def get_user_lookup(self, validated_token):
+        """The ``USER_ID_FIELD`` lookup for the user the token identifies."""
         try:
             user_id = validated_token[keycloak_settings.USER_ID_CLAIM]
         except KeyError as exc:
@@ -102,21 +146,7 @@ class KeycloakAuthBackend(authentication.BaseAuthentication):
             # Empty/blank claim (e.g. a service account without a username)
             # would otherwise create a broken user with an empty identifier.
             raise InvalidToken("Token contained no recognizable user identification")
-
-        lookup = {keycloak_settings.USER_ID_FIELD: user_id}
-        try:
-            user, created = self.user_model.objects.get_or_create(**lookup)
-        except IntegrityError:
-            # Concurrent first request for the same user raced us to the insert.
-            user, created = self.user_model.objects.get(**lookup), False
-
-        if created:
-            user.set_unusable_password()
-        self.update_user(user, validated_token, force_save=created)
-
-        if not self.user_can_authenticate(user):
-            raise AuthenticationFailed("User is inactive", code="user_inactive")
-        return user
+        return {keycloak_settings.USER_ID_FIELD: user_id}
 
     def user_can_authenticate(self, user):
         """
@@ -130,23 +160,46 @@ class KeycloakAuthBackend(authentication.BaseAuthentication):
         """
         Sync mapped fields from the token on every login, writing only when a
         value actually changed (or force_save is set, e.g. to persist a freshly
-        created user). Values longer than the target column are truncated (and
+        created user). An existing user is saved with ``update_fields`` set to
+        the changed fields only. Values longer than the target column are truncated (and
         logged) so a long Keycloak value can't 500 the request.
 
         Security-relevant fields (is_staff, is_superuser, ...) are deliberately
         NOT in the default CLAIM_MAPPING and should not be added there.
+
+        With ``CLAIM_FINGERPRINT_CACHE_SIZE`` set, claims identical to the last
+        sync of this user skip the field walk altogether. With
+        ``DEFERRED_USER_SAVE`` set, a change to an existing user is queued for
+        a batched background write instead of saved here.
         """
-        dirty = force_save
+        fingerprint = claims_fingerprint(claims)
+        if not force_save and is_synced(user, fingerprint):
+            return user
+        changed = self._apply_claims(user, claims)
+        if changed and not force_save and defer_user_save(user, changed):
+            # not persisted yet, so not "synced" until the write-back lands
+            return user
+        if force_save:
+            user.save()
+        elif changed:
+            # only the synced columns: ``user`` may be a cached snapshot, and
+            # writing the rest back would undo changes made since, such as a
+            # deactivation
+            user.save(update_fields=changed)
+        mark_synced(user, fingerprint)
+        return user
+
+    def _apply_claims(self, user, claims):
+        """Copy mapped claims onto ``user``; return the fields that changed."""
+        changed = []
         for field, claim in keycloak_settings.CLAIM_MAPPING.items():
             if claim not in claims:
                 continue
             value = self._fit_to_field(user, field, claims[claim])
             if getattr(user, field, None) != value:
                 setattr(user, field, value)
-                dirty = True
-        if dirty:
-            user.save()
-        return user
+                changed.append(field)
+        return changed
 
     @staticmethod
     def _fit_to_field(user, field, value):
@@ -163,3 +216,29 @@ class KeycloakAuthBackend(authentication.BaseAuthentication):
                 )
                 return value[:max_length]
         return value
+
+
+class KeycloakStatelessAuthBackend(KeycloakAuthBackend):
+    """
+    Validates the JWT like ``KeycloakAuthBackend`` but never touches the
+    database: ``request.user`` is a ``TokenUser`` built from the payload.
+    """
+
+    def get_user_or_create(self, validated_token):
+        # same "recognizable identity" check as the database-backed path
+        self.get_user_lookup(validated_token)
+        return TokenUser(validated_token)
+
+
+class KeycloakLazyAuthBackend(KeycloakAuthBackend):
+    """
+    Validates the JWT eagerly but defers the user lookup and claim sync until
+    ``request.user`` is first used, so views that only read ``request.auth``
+    (e.g. behind ``HasPermission``) do no database work. An inactive user is
+    rejected at that first use rather than during authentication.
+    """
+
+    def get_user_or_create(self, validated_token):
+        # a token without a usable identity still fails up front
+        self.get_user_lookup(validated_token)
+        return SimpleLazyObject(partial(super().get_user_or_create, validated_token))
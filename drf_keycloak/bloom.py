@@ -0,0 +1,130 @@
+"""Compact probabilistic sets of revoked token and session ids.
+
+A ``BloomFilter`` answers "possibly added" or "certainly not added" in a fixed
+number of bit probes, using about 29 bits per entry at a one-in-a-million error
+rate: a few megabytes for hundreds of thousands of ids, where a set of the
+strings would take tens. Entries cannot be removed, so
+``TimeBucketedBloomFilter`` files each one under the time it stops mattering
+and drops a whole bucket once that time has passed.
+"""
+
+import hashlib
+import math
+import threading
+import time
+
+
+def _positions(key, size, hashes):
+    """The ``hashes`` bit positions of ``key`` in a filter of ``size`` bits.
+
+    Double hashing (Kirsch and Mitzenmacher): two 64-bit halves of one digest
+    stand in for ``hashes`` independent hash functions.
+    """
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % size for i in range(hashes)]
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter for ``capacity`` keys at ``error_rate``."""
+
+    __slots__ = ("size", "hashes", "capacity", "count", "_bits")
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(1, capacity)
+        self.size = max(
+            8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key):
+        return _positions(key, self.size, self.hashes)
+
+    def add_positions(self, positions):
+        bits = self._bits
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def has_positions(self, positions):
+        bits = self._bits
+        for position in positions:
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        self.add_positions(self.positions(key))
+
+    def __contains__(self, key):
+        return self.has_positions(self.positions(key))
+
+
+class TimeBucketedBloomFilter:
+    """Bloom filters bucketed by expiry; expired buckets are dropped whole.
+
+    ``lifetime`` is the longest an entry may need to be kept, split into
+    ``buckets`` buckets of equal width. Each bucket starts with a filter for
+    ``capacity / buckets`` entries and chains another one when that fills, so
+    a burst of revocations raises memory rather than the error rate. An entry
+    is forgotten at most one bucket width after its expiry, and kept no longer
+    than ``lifetime``: a later expiry is clamped, which bounds the number of
+    buckets.
+
+    Lookups take no lock: the bucket map is replaced, never mutated, and bits
+    are only ever set.
+    """
+
+    def __init__(self, capacity, error_rate, lifetime, buckets):
+        self.error_rate = error_rate
+        self.lifetime = lifetime
+        self.width = max(1.0, lifetime / max(1, buckets))
+        self.bucket_capacity = math.ceil(max(1, capacity) / max(1, buckets))
+        self._lock = threading.Lock()
+        self._buckets = {}  # bucket index -> [BloomFilter, ...]
+        # every filter has the same size, so a key's positions are shared
+        template = BloomFilter(self.bucket_capacity, error_rate)
+        self._size, self._hashes = template.size, template.hashes
+
+    def __len__(self):
+        """Entries added to live buckets, false positives aside."""
+        return sum(f.count for filters in self._buckets.values() for f in filters)
+
+    def _expired(self, index, now):
+        return (index + 1) * self.width <= now
+
+    def add(self, key, expires_at):
+        """Add ``key`` until ``expires_at`` (epoch seconds); past keys are skipped."""
+        now = time.time()
+        if expires_at <= now:
+            return
+        expires_at = min(expires_at, now + self.lifetime)
+        index = int(expires_at // self.width)
+        positions = _positions(key, self._size, self._hashes)
+        with self._lock:
+            filters = self._buckets.get(index)
+            if filters is None or any(self._expired(i, now) for i in self._buckets):
+                buckets = {
+                    i: f for i, f in self._buckets.items() if not self._expired(i, now)
+                }
+                filters = buckets.setdefault(index, [])
+                self._buckets = buckets
+            if any(bloom.has_positions(positions) for bloom in filters):
+                return  # already there, e.g. a file reloaded
+            if not filters or filters[-1].count >= self.bucket_capacity:
+                filters.append(BloomFilter(self.bucket_capacity, self.error_rate))
+            filters[-1].add_positions(positions)
+
+    def __contains__(self, key):
+        now = time.time()
+        positions = _positions(key, self._size, self._hashes)
+        for index, filters in self._buckets.items():
+            if self._expired(index, now):
+                continue
+            for bloom in filters:
+                if bloom.has_positions(positions):
+                    return True
+        return False
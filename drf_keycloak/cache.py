@@ -0,0 +1,64 @@
+"""Small in-process caches used on the authentication hot path."""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def token_digest(token):
+    """Cache key for a raw token.
+
+    A digest rather than the token itself, so cache contents (and anything
+    that dumps them) never hold bearer credentials.
+    """
+    if isinstance(token, str):
+        token = token.encode()
+    return hashlib.sha256(token).digest()
+
+
+class ExpiringLRUCache:
+    """Thread-safe, size-bounded LRU whose entries carry an absolute deadline.
+
+    Deadlines are wall-clock epoch seconds (``time.time()``) because they are
+    derived from JWT ``exp`` claims. An expired entry is never returned; it is
+    dropped on the lookup that finds it.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        if self.maxsize <= 0 or expires_at <= time.time():
+            return
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
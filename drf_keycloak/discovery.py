@@ -0,0 +1,150 @@
+"""OpenID Connect discovery: realm endpoints from ``.well-known``.
+
+With ``USE_DISCOVERY`` off (the default) every endpoint is the conventional
+Keycloak path under the realm's base URL. With it on, the realm's
+``.well-known/openid-configuration`` is fetched once and kept for
+``DISCOVERY_TTL`` seconds; its ``jwks_uri``, ``introspection_endpoint`` and
+``userinfo_endpoint`` are used instead, so e.g. the JWKS can be served by a
+caching proxy or CDN that the document points at.
+
+An expired document keeps being served while one thread refetches it. If the
+fetch fails, the previous document (or, without one, the conventional paths)
+is used and the fetch is retried after ``_RETRY_AFTER`` seconds, so a
+discovery outage neither blocks nor floods anything.
+"""
+
+import logging
+import threading
+import time
+
+from rest_framework.exceptions import APIException
+
+from .settings import keycloak_settings
+
+logger = logging.getLogger("drf_keycloak")
+
+# The conventional Keycloak path of each endpoint, relative to the realm URL.
+DEFAULT_PATHS = {
+    "jwks_uri": "protocol/openid-connect/certs",
+    "introspection_endpoint": "protocol/openid-connect/token/introspect",
+    "userinfo_endpoint": "protocol/openid-connect/userinfo",
+}
+
+# Seconds before a failed discovery fetch is retried.
+_RETRY_AFTER = 60
+
+_lock = threading.Lock()
+# base URL -> (document or None, monotonic deadline); copy-on-write, so the
+# per-request lookup takes no lock
+_documents = {}
+
+
+def well_known_url(base_url):
+    return f"{base_url}/.well-known/openid-configuration"
+
+
+def _fresh(base_url):
+    """``(document,)`` while the entry for ``base_url`` is current, else None."""
+    entry = _documents.get(base_url)
+    if entry is not None and time.monotonic() < entry[1]:
+        return (entry[0],)
+    return None
+
+
+def store_document(base_url, data):
+    """Record the outcome of a fetch for ``base_url``; return the document.
+
+    ``data`` is the response body, or None when the fetch failed. A failure
+    keeps the previous document, if any, until the next retry.
+    """
+    global _documents
+    now = time.monotonic()
+    if isinstance(data, dict):
+        document, deadline = data, now + keycloak_settings.DISCOVERY_TTL
+        _check_algorithms(base_url, document)
+    else:
+        if data is not None:
+            logger.warning("Ignoring invalid discovery document of %s", base_url)
+        previous = _documents.get(base_url)
+        document = previous[0] if previous is not None else None
+        deadline = now + _RETRY_AFTER
+    documents = dict(_documents)
+    documents[base_url] = (document, deadline)
+    _documents = documents
+    return document
+
+
+def _check_algorithms(base_url, document):
+    advertised = document.get("id_token_signing_alg_values_supported")
+    if not isinstance(advertised, list):
+        return
+    if not set(advertised) & set(keycloak_settings.algorithms):
+        logger.warning(
+            "%s advertises signing algorithms %s, none of which is in ALGORITHM",
+            base_url,
+            advertised,
+        )
+
+
+def _fetch(base_url):
+    # local import: api uses this module to resolve its endpoints
+    from .api import keycloak_api
+
+    try:
+        data = keycloak_api.get(url=well_known_url(base_url))
+    except APIException as exc:
+        logger.warning("Discovery for %s failed: %s", base_url, exc)
+        data = None
+    return store_document(base_url, data)
+
+
+def get_document(base_url=None):
+    """The discovery document of ``base_url`` (default: the API base), or None.
+
+    None when ``USE_DISCOVERY`` is off or no document could be fetched yet.
+    """
+    if not keycloak_settings.USE_DISCOVERY:
+        return None
+    base_url = base_url or keycloak_settings.base_url
+    fresh = _fresh(base_url)
+    if fresh is not None:
+        return fresh[0]
+    entry = _documents.get(base_url)
+    if entry is not None and entry[0] is not None:
+        # serve the expired document unless we get to refresh it
+        if not _lock.acquire(blocking=False):
+            return entry[0]
+    else:
+        _lock.acquire()
+    try:
+        fresh = _fresh(base_url)
+        if fresh is not None:
+            return fresh[0]
+        return _fetch(base_url)
+    finally:
+        _lock.release()
+
+
+def endpoint(name, base_url=None):
+    """URL of endpoint ``name`` (a ``DEFAULT_PATHS`` key) for ``base_url``."""
+    base_url = base_url or keycloak_settings.base_url
+    document = get_document(base_url)
+    if document is not None:
+        url = document.get(name)
+        if isinstance(url, str) and url:
+            return url
+    return f"{base_url}/{DEFAULT_PATHS[name]}"
+
+
+def needs_fetch(base_url=None):
+    """True if ``endpoint`` would fetch the document of ``base_url`` now."""
+    if not keycloak_settings.USE_DISCOVERY:
+        return False
+    return _fresh(base_url or keycloak_settings.base_url) is None
+
+
+def reset_discovery():
+    """Forget every fetched document (e.g. after a settings change)."""
+    global _documents
+    with _lock:
+        _documents = {}
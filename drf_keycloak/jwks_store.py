@@ -0,0 +1,142 @@
+"""Stores for the raw JWK set outside the process.
+
+With ``JWKS_SNAPSHOT_PATH`` set, the last good JWK set of each realm is kept in
+that file. It is written atomically, so a reader never sees a partial file. A
+fresh process loads it before any network call, and any process falls back to
+it while Keycloak is unreachable.
+
+With ``JWKS_CACHE_ALIAS`` set, ``keys`` keeps the JWK set it fetched in that
+Django cache, so all workers on all nodes share one copy instead of each
+fetching its own. Only one process refetches an expiring set at a time: the
+refresh is guarded by a lock taken with ``cache.add``, and the others keep
+using the set they have until the new one is published, or, with none yet,
+briefly wait for it.
+
+Entries hold the raw JWKS document plus the wall-clock time it was fetched,
+so every process can tell how old it is. Parsing into key objects stays
+per process (see ``keys``).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from django.core.cache import caches
+
+from .settings import keycloak_settings
+
+logger = logging.getLogger("drf_keycloak")
+
+# Seconds a refresh lock is held at most, in case its holder dies mid-fetch.
+# Longer than the JWKS fetch timeout, so a slow fetch is not duplicated.
+_LOCK_TIMEOUT = 60
+# Seconds a published entry is kept, whether fresh or not; readers decide
+# what is still fresh enough from ``fetched_at``.
+_ENTRY_TIMEOUT = 60 * 60 * 24
+
+
+class CacheJWKSStore:
+    """Raw JWK sets in the Django cache ``JWKS_CACHE_ALIAS``, keyed by URL."""
+
+    def __init__(self, alias):
+        self._cache = caches[alias]
+
+    @staticmethod
+    def _key(url, suffix="jwks"):
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return f"drf_keycloak:{suffix}:{digest}"
+
+    def get(self, url):
+        """``(jwks, fetched_at)`` for ``url``, or None."""
+        entry = self._cache.get(self._key(url))
+        if not isinstance(entry, dict):
+            return None
+        return entry.get("jwks"), entry.get("fetched_at", 0)
+
+    def set(self, url, jwks, fetched_at):
+        self._cache.set(
+            self._key(url),
+            {"jwks": jwks, "fetched_at": fetched_at},
+            _ENTRY_TIMEOUT,
+        )
+
+    def acquire(self, url):
+        """Take the refresh lock for ``url``; False if another process holds it."""
+        return self._cache.add(self._key(url, "jwks-lock"), 1, _LOCK_TIMEOUT)
+
+    def release(self, url):
+        self._cache.delete(self._key(url, "jwks-lock"))
+
+
+def get_jwks_store():
+    """The configured shared store, or None when ``JWKS_CACHE_ALIAS`` is unset."""
+    alias = keycloak_settings.JWKS_CACHE_ALIAS
+    if not alias:
+        return None
+    return CacheJWKSStore(alias)
+
+
+class FileJWKSSnapshot:
+    """The last good JWK set per URL, as one JSON file at ``path``.
+
+    Failures to read or write are logged, never raised: the snapshot is a
+    fallback and must not break key resolution.
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                content = json.load(fh)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as exc:
+            logger.warning("Cannot read JWKS snapshot %s: %s", self.path, exc)
+            return {}
+        sets = content.get("sets") if isinstance(content, dict) else None
+        return sets if isinstance(sets, dict) else {}
+
+    def load(self, url):
+        """``(jwks, fetched_at)`` if the file holds a set for ``url``, else None."""
+        entry = self._read().get(url)
+        if not isinstance(entry, dict):
+            return None
+        fetched_at = entry.get("fetched_at")
+        if not isinstance(fetched_at, int | float):
+            return None
+        return entry.get("jwks"), fetched_at
+
+    def save(self, url, jwks, fetched_at):
+        """Replace the file atomically: write a temp file, then rename it.
+
+        Two processes saving different URLs at once may drop one of them;
+        it is written again on that realm's next refresh.
+        """
+        sets = self._read()
+        sets[url] = {"fetched_at": fetched_at, "jwks": jwks}
+        directory = os.path.dirname(self.path) or "."
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".jwks-")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                    json.dump({"sets": sets}, fh)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as exc:
+            logger.warning("Cannot write JWKS snapshot %s: %s", self.path, exc)
+
+
+def get_jwks_snapshot():
+    """The configured snapshot file, or None when ``JWKS_SNAPSHOT_PATH`` is unset."""
+    path = keycloak_settings.JWKS_SNAPSHOT_PATH
+    if not path:
+        return None
+    return FileJWKSSnapshot(path)
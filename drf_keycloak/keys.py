@@ -1,81 +1,120 @@
 """JWKS signing-key resolution.
 
-This is the single source of signing keys for token validation. PyJWT's
-``PyJWKClient`` already caches the JWKS and refreshes it on key rotation; we
-wrap it only to:
+This is the single source of signing keys for token validation. The JWKS is
+fetched over ``KeycloakApi``'s pooled session, revalidated with its ``ETag``
+so that an unchanged set costs a ``304``. The parsed signing keys are kept here
+as one immutable ``kid``-indexed snapshot per realm, shared by the sync and
+async paths, and the raw set can be shared across processes through
+``jwks_store``. Each realm (the configured one, plus every ``TRUSTED_ISSUERS``
+entry) has its own snapshot, ``ETag`` and refresh cooldown in a registry keyed
+by JWKS URL. On top of that we:
 
   * rate-limit the *forced* refresh so an attacker spamming tokens with random
-    ``kid`` values can't amplify into unbounded fetches against Keycloak, and
-  * translate ``PyJWKClient`` errors into our 401/503 taxonomy (those classes
-    subclass ``PyJWTError`` but NOT ``InvalidTokenError``, so without this they
-    would surface as uncaught 500s).
+    ``kid`` values can't amplify into unbounded fetches against Keycloak,
+  * translate fetch failures into our 401/503 taxonomy, and
+  * optionally refresh the snapshot from a background thread ahead of expiry
+    (``JWKS_BACKGROUND_REFRESH``), so no request waits on a routine fetch.
 """
 
-import ssl
+import logging
 import threading
 import time
 
 import jwt
-from jwt import PyJWKClient
-from jwt.exceptions import PyJWKClientError
-
-try:  # PyJWT >= 2.8
-    from jwt.exceptions import PyJWKClientConnectionError
-except ImportError:  # pragma: no cover - older PyJWT
-    PyJWKClientConnectionError = PyJWKClientError
+from jwt.exceptions import InvalidKeyError, PyJWKError
+from rest_framework.exceptions import APIException
 
+from . import discovery
+from .api import keycloak_api
 from .exceptions import KeycloakAPIError, TokenBackendError
+from .jwks_store import get_jwks_snapshot, get_jwks_store
 from .settings import keycloak_settings
+from .singleflight import SingleFlight
+
+logger = logging.getLogger("drf_keycloak")
 
 _JWKS_LIFESPAN = 60 * 10
 # Minimum seconds between two forced JWKS refreshes. Bounds the blast radius of
 # an unknown-kid flood to one extra fetch per window.
 _REFRESH_COOLDOWN = 60
+# Seconds a process that finds the shared refresh lock taken, with no usable
+# shared set, waits for the holder to publish one before fetching itself; and
+# how often it looks.
+_SHARED_WAIT = 5
+_SHARED_POLL = 0.05
+# Registry entries are only created for configured realms, so this is a
+# backstop, not a working limit.
+_MAX_REALMS = 256
 
+# Taken only to build or replace state, never to read it: the registry is
+# copy-on-write and every per-realm field is replaced whole, so the per-request
+# path reads module and object attributes without locking.
 _lock = threading.Lock()
-_client = None
-_client_url = None
-# -inf (not 0.0): time.monotonic()'s epoch is arbitrary, so on a freshly booted
-# host monotonic() can be < the cooldown and 0.0 would wrongly block the very
-# first refresh. -inf means "never refreshed yet -> allow".
-_last_refresh = float("-inf")
-
-
-def _certs_url():
-    return f"{keycloak_settings.base_url}/protocol/openid-connect/certs"
-
-
-def _build_client(url):
-    ssl_context = None
-    if not keycloak_settings.VERIFY_CERTIFICATE:
-        ssl_context = ssl._create_unverified_context()  # noqa: S323 - opt-in
-    return PyJWKClient(
-        url,
-        cache_jwk_set=True,
-        lifespan=_JWKS_LIFESPAN,
-        ssl_context=ssl_context,
-    )
-
-
-def _get_client():
-    """Return the cached client, rebuilding it if the JWKS URL changed."""
-    global _client, _client_url
-    url = _certs_url()
-    with _lock:
-        if _client is None or _client_url != url:
-            _client = _build_client(url)
-            _client_url = url
-        return _client
+_registry = {}
+_refresher = None
+# one JWKS fetch in flight per URL, shared by every thread that needs it
+_fetches = SingleFlight()
+
+
+class _RealmKeys:
+    """Everything cached for one JWKS URL."""
+
+    __slots__ = ("url", "http_cache", "last_refresh", "keyset", "disk_checked")
+
+    def __init__(self, url):
+        self.url = url
+        # (ETag, JWKS) of the last download that carried an ETag
+        self.http_cache = None
+        # -inf (not 0.0): time.monotonic()'s epoch is arbitrary, so on a freshly
+        # booted host monotonic() can be < the cooldown and 0.0 would wrongly
+        # block the very first refresh. -inf means "never refreshed yet -> allow".
+        self.last_refresh = float("-inf")
+        # (keys, monotonic fetch time, wall-clock fetch time, raw JWKS). Replaced
+        # whole on every load and never mutated, so readers need no lock.
+        self.keyset = None
+        # whether this realm was already seeded from JWKS_SNAPSHOT_PATH
+        self.disk_checked = False
+
+
+def _realm(url):
+    global _registry
+    realm = _registry.get(url)
+    if realm is None:
+        with _lock:
+            realm = _registry.get(url)
+            if realm is None:
+                # publish a new mapping instead of mutating the one readers see
+                registry = dict(_registry)
+                if len(registry) >= _MAX_REALMS:
+                    del registry[next(iter(registry))]
+                realm = registry[url] = _RealmKeys(url)
+                _registry = registry
+    return realm
+
+
+def _base_url(issuer=None):
+    """Realm URL of ``issuer`` (one of ``TRUSTED_ISSUERS``), else the API base."""
+    if issuer is None:
+        return keycloak_settings.base_url
+    return keycloak_settings.trusted_issuers[issuer]
+
+
+def _certs_url(issuer=None):
+    """JWKS URL of ``issuer``'s realm; see ``discovery``."""
+    return discovery.endpoint("jwks_uri", _base_url(issuer))
 
 
-def _refresh_allowed():
+def _refresh_allowed(url=None):
     """True at most once per cooldown window (anti-amplification gate)."""
-    global _last_refresh
+    realm = _realm(url or _certs_url())
     now = time.monotonic()
+    if now - realm.last_refresh < _REFRESH_COOLDOWN:
+        # the common answer during an unknown-kid flood; no need to lock for it
+        return False
     with _lock:
-        if now - _last_refresh < _REFRESH_COOLDOWN:
+        if now - realm.last_refresh < _REFRESH_COOLDOWN:
             return False
-        _last_refresh = now
+        realm.last_refresh = now
         return True
 
 
@@ -83,67 +122,382 @@ def _match(signing_keys, kid):
     if kid is None:
         # A token without a kid is only unambiguous when there is exactly one
         # signing key. Otherwise we cannot safely pick one.
-        return signing_keys[0] if len(signing_keys) == 1 else None
-    for key in signing_keys:
-        if key.key_id == kid:
-            return key
+        if len(signing_keys) == 1:
+            return next(iter(signing_keys.values()))
+        return None
+    return signing_keys.get(kid)
+
+
+def _check_kid(kid):
+    """Reject a ``kid`` that is neither a string nor absent, as PyJWT does."""
+    if kid is not None and not isinstance(kid, str):
+        raise TokenBackendError("Token header is invalid")
+
+
+def _unverified_kid(token):
+    try:
+        return jwt.get_unverified_header(token).get("kid")
+    except jwt.PyJWTError as exc:
+        raise TokenBackendError("Token header is invalid") from exc
+
+
+def _signing_keys(data):
+    """The signing keys of a JWK set as ``{kid: public key}``.
+
+    Built once per fetch so that resolving a key is a single dict lookup. Keeps
+    keys meant for signatures (``use`` "sig" or absent) that have a ``kid``,
+    minus those whose ``alg`` is not in ``ALGORITHM``: no token we accept can
+    use them.
+    Unusable members are skipped; for a repeated ``kid`` the first one wins.
+    """
+    jwks = data.get("keys") if isinstance(data, dict) else None
+    if not isinstance(jwks, list):
+        raise TokenBackendError("No signing keys available")
+    algorithms = keycloak_settings.algorithms
+    signing_keys = {}
+    for jwk in jwks:
+        if not isinstance(jwk, dict):
+            continue
+        kid = jwk.get("kid")
+        if not kid or kid in signing_keys or jwk.get("use") not in ("sig", None):
+            continue
+        if jwk.get("alg") is not None and jwk["alg"] not in algorithms:
+            continue
+        try:
+            signing_keys[kid] = jwt.PyJWK(jwk).key
+        except (PyJWKError, InvalidKeyError):
+            continue
+    if not signing_keys:
+        raise TokenBackendError("No signing keys available")
+    return signing_keys
+
+
+def _store_keyset(url, signing_keys, fetched_at, data):
+    """Make ``signing_keys``, parsed from ``data``, the snapshot for ``url``.
+
+    ``fetched_at`` is the wall-clock time of the fetch. When the keys came from
+    a shared store (possibly fetched by another process a while ago), the
+    snapshot ages from that moment rather than from now.
+    """
+    age = max(0.0, time.time() - fetched_at)
+    _realm(url).keyset = (signing_keys, time.monotonic() - age, fetched_at, data)
+    if keycloak_settings.JWKS_BACKGROUND_REFRESH:
+        _ensure_refresher()
+
+
+def _load_keyset(url, data, fetched_at=None, persist=True):
+    """Parse ``data`` into the snapshot for ``url`` and return its keys.
+
+    A set this process already parsed (a shared entry seen before, or the same
+    document revalidated with a ``304``) is not parsed again. A set fetched
+    anew is written to the on-disk snapshot unless ``persist`` is False.
+    """
+    fetched_at = time.time() if fetched_at is None else fetched_at
+    keyset = _realm(url).keyset
+    if keyset is not None and (keyset[3] is data or keyset[2] == fetched_at):
+        signing_keys = keyset[0]
+    else:
+        signing_keys = _signing_keys(data)
+    if persist and (keyset is None or keyset[2] != fetched_at):
+        snapshot = get_jwks_snapshot()
+        if snapshot is not None:
+            snapshot.save(url, data, fetched_at)
+    _store_keyset(url, signing_keys, fetched_at, data)
+    return signing_keys
+
+
+def _load_disk_snapshot(url):
+    """Seed an empty realm from ``JWKS_SNAPSHOT_PATH`` (tried once).
+
+    A snapshot past ``_JWKS_LIFESPAN`` but younger than
+    ``JWKS_SNAPSHOT_MAX_AGE`` is served for one cooldown while a background
+    thread revalidates it, so a cold start does no network I/O on the request
+    path, even while Keycloak is down.
+    """
+    realm = _realm(url)
+    if realm.disk_checked:
+        return None
+    realm.disk_checked = True
+    snapshot = get_jwks_snapshot()
+    entry = snapshot.load(url) if snapshot is not None else None
+    if entry is None:
+        return None
+    try:
+        signing_keys = _load_keyset(url, *entry, persist=False)
+    except TokenBackendError:
+        logger.warning("Ignoring JWKS snapshot without usable signing keys")
+        return None
+    data, fetched_at = entry
+    age = time.time() - fetched_at
+    if _JWKS_LIFESPAN <= age < keycloak_settings.JWKS_SNAPSHOT_MAX_AGE:
+        retry_at = time.monotonic() - _JWKS_LIFESPAN + _REFRESH_COOLDOWN
+        realm.keyset = (signing_keys, retry_at, fetched_at, data)
+        _revalidate_in_background(url)
+    return realm.keyset
+
+
+def _revalidate_in_background(url):
+    """Fetch the JWKS for ``url`` from a daemon thread, sharing any fetch in flight."""
+
+    def revalidate():
+        try:
+            _fetch_signing_keys(url)
+        except (KeycloakAPIError, TokenBackendError) as exc:
+            # the snapshot stays served; the next request after the cooldown retries
+            logger.warning("Revalidation of JWKS snapshot %s failed: %r", url, exc)
+
+    threading.Thread(
+        target=revalidate, name="drf-keycloak-jwks-revalidate", daemon=True
+    ).start()
+
+
+def _fallback_signing_keys(url):
+    """The last good keys while Keycloak is unreachable, or None.
+
+    Only with ``JWKS_SNAPSHOT_PATH`` set. Uses whichever is newer of the
+    in-memory and on-disk sets, if younger than ``JWKS_SNAPSHOT_MAX_AGE``,
+    and serves it for one cooldown before the endpoint is tried again.
+    """
+    snapshot = get_jwks_snapshot()
+    if snapshot is None:
+        return None
+    realm = _realm(url)
+    keyset = realm.keyset
+    best = (keyset[2], keyset[0], keyset[3]) if keyset is not None else None
+    entry = snapshot.load(url)
+    if entry is not None and (best is None or entry[1] > best[0]):
+        try:
+            best = (entry[1], _signing_keys(entry[0]), entry[0])
+        except TokenBackendError:
+            pass
+    if best is None or time.time() - best[0] >= keycloak_settings.JWKS_SNAPSHOT_MAX_AGE:
+        return None
+    fetched_at, signing_keys, data = best
+    logger.warning("JWKS endpoint %s unreachable; serving the last good key set", url)
+    retry_at = time.monotonic() - _JWKS_LIFESPAN + _REFRESH_COOLDOWN
+    realm.keyset = (signing_keys, retry_at, fetched_at, data)
+    return signing_keys
+
+
+def _snapshot_time(url=None):
+    """Wall-clock fetch time of the snapshot for ``url`` (None if there is none)."""
+    keyset = _realm(url or _certs_url()).keyset
+    return None if keyset is None else keyset[2]
+
+
+def _cached_signing_keys(url):
+    """The snapshot's keys if still servable for ``url``, else None.
+
+    A snapshot is fresh for ``_JWKS_LIFESPAN``. While the background refresher
+    runs, it stays servable for ``JWKS_STALE_IF_ERROR`` seconds beyond that
+    (stale-while-revalidate / stale-if-error), so an expiring or failing
+    refresh never blocks a request.
+    """
+    keyset = _realm(url).keyset
+    if keyset is None:
+        keyset = _load_disk_snapshot(url)
+        if keyset is None:
+            return None
+    max_age = _JWKS_LIFESPAN
+    if keycloak_settings.JWKS_BACKGROUND_REFRESH:
+        _ensure_refresher()
+        max_age += keycloak_settings.JWKS_STALE_IF_ERROR
+    if time.monotonic() - keyset[1] >= max_age:
+        return None
+    return keyset[0]
+
+
+def _download_jwks(url):
+    """GET the raw JWK set. Raises ``KeycloakAPIError`` / ``TokenBackendError``."""
+    realm = _realm(url)
+    try:
+        response = keycloak_api.get_jwks(url, realm.http_cache)
+    except KeycloakAPIError:
+        raise
+    except APIException as exc:
+        # a 4xx: the endpoint serves no key set
+        raise TokenBackendError("No signing keys available") from exc
+    return _revalidated(realm, response)
+
+
+def _revalidated(realm, response):
+    """Remember the ``(etag, jwks)`` of a download for the next one; return the JWKS."""
+    realm.http_cache = response if response[0] else None
+    return response[1]
+
+
+def _fetch_signing_keys(url, max_age=_JWKS_LIFESPAN, newer_than=None):
+    """Load the JWKS into the snapshot and return its signing keys.
+
+    Concurrent fetches of the same URL share one download. Falls back to the
+    last good set (see ``_fallback_signing_keys``) when Keycloak is
+    unreachable, except for a forced refresh.
+    """
+    try:
+        return _fetches.do(url, _fetch_signing_keys_from, url, max_age, newer_than)
+    except KeycloakAPIError:
+        signing_keys = None if newer_than is not None else _fallback_signing_keys(url)
+        if signing_keys is None:
+            raise
+        return signing_keys
+
+
+def _fetch_signing_keys_from(url, max_age, newer_than):
+    """Load the JWKS from the shared store or Keycloak.
+
+    Without a shared store (``JWKS_CACHE_ALIAS``) this always downloads. With
+    one, a shared entry younger than ``max_age`` seconds (and, for a forced
+    refresh, newer than ``newer_than``) is used instead. Otherwise one process
+    downloads under the store's lock and publishes the result. A process that
+    finds the lock taken keeps using the shared entry it has; without one (a
+    cold boot, or a forced refresh) it waits up to ``_SHARED_WAIT`` seconds
+    for the holder's entry and only then downloads itself.
+    """
+    store = get_jwks_store()
+    if store is None:
+        return _load_keyset(url, _download_jwks(url))
+
+    entry = store.get(url)
+    if entry is not None:
+        data, fetched_at = entry
+        if time.time() - fetched_at < max_age and (
+            newer_than is None or fetched_at > newer_than
+        ):
+            return _load_keyset(url, data, fetched_at)
+
+    locked = store.acquire(url)
+    if not locked and entry is not None and newer_than is None:
+        # someone else is refreshing; the entry we have will do until then
+        return _load_keyset(url, *entry)
+    if not locked:
+        published = _await_shared_entry(store, url, newer_than)
+        if published is not None:
+            return _load_keyset(url, *published)
+    try:
+        data, fetched_at = _download_jwks(url), time.time()
+        signing_keys = _load_keyset(url, data, fetched_at)
+        store.set(url, data, fetched_at)
+    finally:
+        if locked:
+            store.release(url)
+    return signing_keys
+
+
+def _await_shared_entry(store, url, newer_than):
+    """The entry the lock holder publishes for ``url``, or None if it is late.
+
+    Keeps every worker of a cold boot from downloading the set at once.
+    """
+    deadline = time.monotonic() + _SHARED_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(_SHARED_POLL)
+        entry = store.get(url)
+        if entry is not None and (newer_than is None or entry[1] > newer_than):
+            return entry
     return None
 
 
+class _Refresher(threading.Thread):
+    """Daemon thread refetching every known JWKS each ``JWKS_REFRESH_INTERVAL``."""
+
+    def __init__(self, interval):
+        super().__init__(name="drf-keycloak-jwks", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for url in _registry:
+                try:
+                    # adopt a set another process fetched within the interval
+                    _fetch_signing_keys(url, max_age=self.interval)
+                except (KeycloakAPIError, TokenBackendError) as exc:
+                    # keep serving the previous snapshot; the next tick retries
+                    logger.warning("Background refresh of %s failed: %r", url, exc)
+
+
+def _ensure_refresher():
+    """Start the background refresher unless it is already running.
+
+    Checked on use rather than at import so that it also (re)starts in a
+    worker forked from a preloading master, where the thread does not exist.
+    """
+    global _refresher
+    refresher = _refresher
+    if refresher is not None and refresher.is_alive():
+        return
+    with _lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = _Refresher(keycloak_settings.JWKS_REFRESH_INTERVAL)
+            _refresher.start()
+
+
 def reset_jwks_client():
-    """Drop the cached client so the next call rebuilds it.
+    """Drop every cached client, key snapshot and the refresher.
 
     Called when JWKS-relevant settings change (e.g. override_settings in tests
     or a runtime reconfiguration), otherwise the client would keep fetching
     from the old realm URL.
     """
-    global _client, _client_url, _last_refresh
+    global _refresher, _registry
     with _lock:
-        _client = None
-        _client_url = None
-        _last_refresh = float("-inf")
+        _registry = {}
+        if _refresher is not None:
+            _refresher.stopped.set()
+            _refresher = None
+
+
+def prefetch_signing_keys():
+    """Load the signing keys of every configured realm now; return them.
+
+    Same errors as ``get_signing_key``. Used by the startup warm-up.
+    """
+    issuers = keycloak_settings.trusted_issuers or [None]
+    signing_keys = []
+    for issuer in issuers:
+        signing_keys.extend(_fetch_signing_keys(_certs_url(issuer)).values())
+    return signing_keys
 
 
-def get_signing_key(token):
+def get_signing_key(token, issuer=None):
     """Resolve the signing key for ``token``.
 
-    Raises ``TokenBackendError`` (401-class) for a malformed header or an
-    unknown ``kid``, and ``KeycloakAPIError`` (503) when the JWKS endpoint is
-    unreachable.
+    ``issuer`` selects one of ``TRUSTED_ISSUERS``; None means the configured
+    realm. Raises ``TokenBackendError`` (401-class) for a malformed header or
+    an unknown ``kid``, and ``KeycloakAPIError`` (503) when the JWKS endpoint
+    is unreachable.
     """
-    try:
-        kid = jwt.get_unverified_header(token).get("kid")
-    except jwt.PyJWTError as exc:
-        raise TokenBackendError("Token header is invalid") from exc
+    return resolve_signing_key(_unverified_kid(token), issuer)
 
-    client = _get_client()
 
-    # 1. Cache-first lookup. get_signing_keys() only hits the network on cold
-    #    start or once the cached set has aged past its lifespan.
-    try:
-        signing_keys = client.get_signing_keys()
-    except PyJWKClientConnectionError as exc:
-        raise KeycloakAPIError() from exc
-    except PyJWKClientError as exc:
-        raise TokenBackendError("No signing keys available") from exc
+def resolve_signing_key(kid, issuer=None):
+    """Resolve the signing key for a ``kid`` the caller already parsed.
+
+    Same errors as ``get_signing_key``, minus the header parsing.
+    """
+    _check_kid(kid)
+    url = _certs_url(issuer)
+
+    # 1. Snapshot-first lookup. Only hits the network on cold start or once the
+    #    snapshot has aged out.
+    signing_keys = _cached_signing_keys(url)
+    if signing_keys is None:
+        signing_keys = _fetch_signing_keys(url)
 
     signing_key = _match(signing_keys, kid)
     if signing_key is not None:
-        return signing_key.key
+        return signing_key
 
     # 2. Unknown kid. This may be a genuine rotation, so force one refresh —
-    #    but only if the cooldown permits, to deny amplification.
-    if not _refresh_allowed():
-        raise TokenBackendError("Signing key not found")
-
-    try:
-        signing_keys = client.get_signing_keys(refresh=True)
-    except PyJWKClientConnectionError as exc:
-        raise KeycloakAPIError() from exc
-    except PyJWKClientError as exc:
-        raise TokenBackendError("Signing key not found") from exc
-
+    #    but only if the cooldown permits, to deny amplification. Within the
+    #    cooldown, a refresh another thread has in flight is still waited for.
+    if _refresh_allowed(url):
+        signing_keys = _fetch_signing_keys(url, newer_than=_snapshot_time(url))
+    else:
+        signing_keys = _fetches.wait(url)
+        if signing_keys is None:
+            raise TokenBackendError("Signing key not found")
     signing_key = _match(signing_keys, kid)
     if signing_key is None:
         raise TokenBackendError("Signing key not found")
-    return signing_key.key
+    return signing_key
@@ -0,0 +1,20 @@
+"""manage.py keycloak_warmup"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from drf_keycloak.exceptions import KeycloakAPIError, TokenBackendError
+from drf_keycloak.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetch the Keycloak signing keys. Exits non-zero if that fails, so it "
+        "can serve as a readiness probe."
+    )
+
+    def handle(self, *args, **options):
+        try:
+            warm_up()
+        except (KeycloakAPIError, TokenBackendError) as exc:
+            raise CommandError(f"Keycloak warm-up failed: {exc}") from exc
+        self.stdout.write(self.style.SUCCESS("Keycloak warm-up succeeded"))
@@ -0,0 +1,106 @@
+"""Database-free user built from a validated token."""
+
+from django.contrib.auth import models as auth_models
+from django.db.models.manager import EmptyManager
+
+from .settings import keycloak_settings
+
+
+class TokenUser:
+    """
+    A read-only stand-in for a Django user, backed only by the token payload.
+
+    Returned by ``KeycloakStatelessAuthBackend`` for services that need the
+    caller's identity and roles but do not own user data. ``id``/``pk`` is the
+    ``USER_ID_CLAIM`` value; every ``CLAIM_MAPPING`` field (``first_name``,
+    ``email``, ...) reads its claim from the payload, ``None`` if absent. It has
+    no Django groups or permissions; authorize with ``HasPermission``, which
+    checks the token's roles.
+    """
+
+    __slots__ = ("token",)
+
+    is_active = True
+    is_staff = False
+    is_superuser = False
+    is_anonymous = False
+    is_authenticated = True
+
+    _groups = EmptyManager(auth_models.Group)
+    _user_permissions = EmptyManager(auth_models.Permission)
+
+    def __init__(self, token):
+        self.token = token
+
+    def __str__(self):
+        return f"TokenUser {self.id}"
+
+    def __repr__(self):
+        return f"<TokenUser: {self.id}>"
+
+    def __getattr__(self, attr):
+        # only reached for names not defined on the class
+        try:
+            claim = keycloak_settings.CLAIM_MAPPING[attr]
+        except KeyError:
+            raise AttributeError(
+                f"'TokenUser' object has no attribute '{attr}'"
+            ) from None
+        return self.token.get(claim)
+
+    @property
+    def id(self):
+        return self.token[keycloak_settings.USER_ID_CLAIM]
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def username(self):
+        claim = keycloak_settings.CLAIM_MAPPING.get("username")
+        return self.token.get(claim, "") if claim else ""
+
+    @property
+    def groups(self):
+        return self._groups
+
+    @property
+    def user_permissions(self):
+        return self._user_permissions
+
+    def __eq__(self, other):
+        return isinstance(other, TokenUser) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def get_username(self):
+        return self.username
+
+    def save(self):
+        raise NotImplementedError("Token users have no database representation.")
+
+    def delete(self):
+        raise NotImplementedError("Token users have no database representation.")
+
+    def set_password(self, raw_password):
+        raise NotImplementedError("Token users have no database representation.")
+
+    def check_password(self, raw_password):
+        raise NotImplementedError("Token users have no database representation.")
+
+    def get_group_permissions(self, obj=None):
+        return set()
+
+    def get_all_permissions(self, obj=None):
+        return set()
+
+    def has_perm(self, perm, obj=None):
+        return False
+
+    def has_perms(self, perm_list, obj=None):
+        return False
+
+    def has_module_perms(self, module):
+        return False
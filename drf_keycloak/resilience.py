@@ -0,0 +1,296 @@
+"""Failing fast while Keycloak is down.
+
+With ``CIRCUIT_BREAKER_THRESHOLD`` set, every Keycloak host gets a circuit
+breaker. After that many consecutive failed calls (network errors or 5xx), the
+circuit opens: calls to that host raise ``KeycloakAPIError`` at once, without
+touching the network, so worker threads are not tied up waiting for timeouts.
+After ``CIRCUIT_BREAKER_RESET_TIMEOUT`` seconds the circuit is half-open and
+lets ``CIRCUIT_BREAKER_HALF_OPEN_CALLS`` probe calls through. A successful probe
+closes it again; a failed one reopens it.
+
+``circuit_breakers()`` reports the state of every breaker for monitoring, and
+state changes are logged.
+
+With ``INTROSPECTION_MAX_CONCURRENCY`` set, introspection calls also go through
+a bulkhead: at most that many are in flight per process (per event loop for the
+async backend). Up to ``INTROSPECTION_QUEUE_SIZE`` more wait for a slot, each
+for at most ``INTROSPECTION_QUEUE_TIMEOUT`` seconds; past that, or with the
+queue full, the call raises ``KeycloakAPIError`` instead of adding to
+Keycloak's load.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+from .exceptions import KeycloakAPIError
+from .settings import keycloak_settings
+
+logger = logging.getLogger("drf_keycloak")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one upstream."""
+
+    def __init__(self, name, threshold, reset_timeout, half_open_calls=1):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probes = 0
+
+    @property
+    def state(self):
+        """Current state; an open circuit past its timeout reads as half-open."""
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def allow(self):
+        """Whether a call may go out now.
+
+        Every allowed call must be recorded, or released if it ends without
+        an outcome; an unreturned half-open probe would keep the circuit
+        rejecting calls for good.
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            return False
+
+    def before_call(self):
+        """Raise ``KeycloakAPIError`` unless a call may go out now."""
+        if not self.allow():
+            raise KeycloakAPIError()
+
+    def release(self):
+        """Return the probe slot of an allowed call that ended without an outcome.
+
+        For a call that was cancelled or failed on our side: it says nothing
+        about the upstream, so it neither closes nor reopens the circuit.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info("Circuit for %s closed", self.name)
+            self._state = CLOSED
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            self._failures += 1
+            state = self._current_state(now)
+            if state == HALF_OPEN or (
+                state == CLOSED and self._failures >= self.threshold
+            ):
+                logger.warning(
+                    "Circuit for %s opened after %d failure(s); failing fast for %ss",
+                    self.name,
+                    self._failures,
+                    self.reset_timeout,
+                )
+                self._state = OPEN
+                self._opened_at = now
+
+    def snapshot(self):
+        """State and counters as a dict, for health checks and metrics."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            retry_in = None
+            if state == OPEN:
+                retry_in = max(0.0, self.reset_timeout - (now - self._opened_at))
+            return {"state": state, "failures": self._failures, "retry_in": retry_in}
+
+
+def record_response(breaker, response):
+    """Record a 5xx ``response`` as a failure of ``breaker``, else as a success."""
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+_lock = threading.Lock()
+_breakers = {}
+
+
+def get_circuit_breaker(url):
+    """The breaker for ``url``'s host; None if ``CIRCUIT_BREAKER_THRESHOLD`` is 0."""
+    threshold = keycloak_settings.CIRCUIT_BREAKER_THRESHOLD
+    if not threshold:
+        return None
+    name = urlsplit(url).netloc
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(
+                    name,
+                    threshold,
+                    keycloak_settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+                    keycloak_settings.CIRCUIT_BREAKER_HALF_OPEN_CALLS,
+                )
+    return breaker
+
+
+def circuit_breakers():
+    """``{host: snapshot}`` for every breaker created so far."""
+    return {name: breaker.snapshot() for name, breaker in list(_breakers.items())}
+
+
+def reset_circuit_breakers():
+    """Forget every breaker (e.g. after a settings change)."""
+    with _lock:
+        _breakers.clear()
+
+
+class Bulkhead:
+    """Caps the calls in flight, with a bounded queue of deadline-bound waiters."""
+
+    def __init__(self, name, max_calls, max_queue, timeout):
+        self.name = name
+        self.max_calls = max_calls
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._cond = threading.Condition(threading.Lock())
+        self._active = 0
+        self._waiting = 0
+
+    def acquire(self):
+        """Take a slot, waiting up to ``timeout``; else raise ``KeycloakAPIError``."""
+        with self._cond:
+            if self._active < self.max_calls and not self._waiting:
+                self._active += 1
+                return
+            if self._waiting >= self.max_queue:
+                self._reject("queue full")
+            deadline = time.monotonic() + self.timeout
+            self._waiting += 1
+            try:
+                while self._active >= self.max_calls:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject("timed out waiting")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._active += 1
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def _reject(self, reason):
+        logger.warning("%s bulkhead rejected a call: %s", self.name, reason)
+        raise KeycloakAPIError()
+
+    def snapshot(self):
+        """In-flight and queued calls as a dict, for health checks and metrics."""
+        return {"active": self._active, "waiting": self._waiting}
+
+
+class AsyncBulkhead(Bulkhead):
+    """``Bulkhead`` for coroutines; each event loop gets its own slots."""
+
+    def __init__(self, name, max_calls, max_queue, timeout):
+        super().__init__(name, max_calls, max_queue, timeout)
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_calls)
+        return semaphore
+
+    async def acquire(self):
+        semaphore = self._semaphore()
+        if not semaphore.locked():
+            await semaphore.acquire()
+        else:
+            if self._waiting >= self.max_queue:
+                self._reject("queue full")
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self._reject("timed out waiting")
+            finally:
+                self._waiting -= 1
+        self._active += 1
+
+    def release(self):
+        self._active -= 1
+        self._semaphore().release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+_bulkheads = {}
+
+
+def get_introspection_bulkhead(asynchronous=False):
+    """The introspection bulkhead; None if ``INTROSPECTION_MAX_CONCURRENCY`` is 0."""
+    max_calls = keycloak_settings.INTROSPECTION_MAX_CONCURRENCY
+    if not max_calls:
+        return None
+    bulkhead = _bulkheads.get(asynchronous)
+    if bulkhead is None:
+        with _lock:
+            bulkhead = _bulkheads.get(asynchronous)
+            if bulkhead is None:
+                cls = AsyncBulkhead if asynchronous else Bulkhead
+                bulkhead = _bulkheads[asynchronous] = cls(
+                    "Introspection",
+                    max_calls,
+                    keycloak_settings.INTROSPECTION_QUEUE_SIZE,
+                    keycloak_settings.INTROSPECTION_QUEUE_TIMEOUT,
+                )
+    return bulkhead
+
+
+def reset_bulkheads():
+    """Forget the bulkheads (e.g. after a settings change)."""
+    with _lock:
+        _bulkheads.clear()
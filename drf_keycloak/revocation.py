@@ -0,0 +1,378 @@
+"""Rejecting tokens of ended sessions before their ``exp``.
+
+Keycloak can tell a client when a session ends by POSTing a signed
+``logout_token`` to its back-channel logout URL (OpenID Connect Back-Channel
+Logout 1.0, see ``views.BackchannelLogoutView``). With ``REVOCATION_STORE`` set,
+the session (``sid``), or the user (``sub``) when the logout names no session,
+is recorded there together with the logout's ``iat``. Every request then looks
+up its token's ``sid`` and ``sub``, with the not-before watermark in the same
+batched call, and rejects a token issued at or before a recorded logout.
+Tokens the user gets by logging in again are issued later and pass.
+
+Entries are kept for ``REVOCATION_TTL`` seconds, which must be at least the
+lifespan of an access token. ``LocalRevocationStore`` only knows about logouts
+received by its own process; with several workers use ``DjangoRevocationStore``
+and a cache they share.
+
+The same store keeps the not-before watermark Keycloak pushes to the client's
+admin URL (``views.PushNotBeforeView``): every token of the realm issued
+before it is rejected, an integer comparison against ``iat``.
+
+For revocation lists too large to keep as strings in every worker, set
+``REVOCATION_FILTER_CAPACITY``: revoked ``jti`` and ``sid`` values then go into
+a ``bloom.TimeBucketedBloomFilter``, fed from the JSON Lines file at
+``REVOCATION_FILTER_PATH`` (reread when it changes) and/or by calling
+``add_revocations``. A token whose ``jti`` or session matches is rejected; at
+``REVOCATION_FILTER_ERROR_RATE`` a token that was never revoked matches too.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+from .bloom import TimeBucketedBloomFilter
+from .cache import ExpiringLRUCache
+from .settings import keycloak_settings
+
+logger = logging.getLogger("drf_keycloak")
+
+
+class BaseRevocationStore:
+    """Interface for ``REVOCATION_STORE`` implementations.
+
+    ``key`` is a ``(kind, issuer, value)`` tuple, e.g. ``("sid", iss, sid)``;
+    ``revoked_at`` is the epoch second of the logout or not-before watermark.
+    """
+
+    def revoke(self, key, revoked_at):
+        raise NotImplementedError
+
+    def revoked_at(self, key):
+        """When ``key`` was revoked, or None."""
+        raise NotImplementedError
+
+    async def arevoked_at(self, key):
+        return self.revoked_at(key)
+
+    def revoked_at_many(self, keys):
+        """``revoked_at`` of each of ``keys``, in order; override to batch."""
+        return [self.revoked_at(key) for key in keys]
+
+    async def arevoked_at_many(self, keys):
+        return self.revoked_at_many(keys)
+
+
+class LocalRevocationStore(BaseRevocationStore):
+    """Per-process LRU of up to ``REVOCATION_CACHE_SIZE`` revocations."""
+
+    def __init__(self):
+        self._cache = ExpiringLRUCache(keycloak_settings.REVOCATION_CACHE_SIZE)
+
+    def revoke(self, key, revoked_at):
+        previous = self._cache.get(key)
+        if previous is None or previous < revoked_at:
+            deadline = time.time() + keycloak_settings.REVOCATION_TTL
+            self._cache.set(key, revoked_at, deadline)
+
+    def revoked_at(self, key):
+        return self._cache.get(key)
+
+
+class DjangoRevocationStore(BaseRevocationStore):
+    """Revocations kept in the Django cache ``REVOCATION_CACHE_ALIAS``.
+
+    Shared across processes, so a logout received by one worker is honoured
+    by all of them.
+    """
+
+    def __init__(self):
+        self._cache = caches[keycloak_settings.REVOCATION_CACHE_ALIAS]
+
+    @staticmethod
+    def _key(key):
+        kind, issuer, value = key
+        # hashed: claim values may contain characters memcached rejects
+        digest = hashlib.sha256(f"{issuer}\0{value}".encode()).hexdigest()
+        return f"drf_keycloak:revoked:{kind}:{digest}"
+
+    def revoke(self, key, revoked_at):
+        previous = self.revoked_at(key)
+        if previous is None or previous < revoked_at:
+            self._cache.set(
+                self._key(key), revoked_at, keycloak_settings.REVOCATION_TTL
+            )
+
+    def revoked_at(self, key):
+        return self._cache.get(self._key(key))
+
+    async def arevoked_at(self, key):
+        return await self._cache.aget(self._key(key))
+
+    def revoked_at_many(self, keys):
+        names = [self._key(key) for key in keys]
+        found = self._cache.get_many(names)
+        return [found.get(name) for name in names]
+
+    async def arevoked_at_many(self, keys):
+        names = [self._key(key) for key in keys]
+        found = await self._cache.aget_many(names)
+        return [found.get(name) for name in names]
+
+
+_store = None
+
+
+def get_revocation_store():
+    """The configured ``REVOCATION_STORE`` instance, or None when disabled."""
+    global _store
+    if _store is None and keycloak_settings.REVOCATION_STORE is not None:
+        _store = keycloak_settings.REVOCATION_STORE()
+    return _store
+
+
+class RevocationFilter:
+    """Revoked ``jti`` and ``sid`` values in a time-bucketed Bloom filter.
+
+    Each entry is a dict with a ``jti`` or ``sid`` and optionally ``exp``, the
+    epoch second after which it no longer matters (the revoked token's or
+    session's expiry); the entry is kept for ``REVOCATION_TTL`` at most.
+    Entries can only be added: they drop out with their expiry.
+    """
+
+    def __init__(self, path=None):
+        self.bloom = TimeBucketedBloomFilter(
+            keycloak_settings.REVOCATION_FILTER_CAPACITY,
+            keycloak_settings.REVOCATION_FILTER_ERROR_RATE,
+            keycloak_settings.REVOCATION_TTL,
+            keycloak_settings.REVOCATION_FILTER_BUCKETS,
+        )
+        self.path = path
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()  # set once the first load is over
+
+    def add(self, entries):
+        """Add ``entries``; returns how many ``jti``/``sid`` values were added."""
+        default_exp = time.time() + keycloak_settings.REVOCATION_TTL
+        added = 0
+        for entry in entries:
+            exp = entry.get("exp", default_exp) if isinstance(entry, dict) else None
+            if not _number(exp) or exp <= time.time():
+                continue
+            for kind in ("jti", "sid"):
+                value = entry.get(kind)
+                if isinstance(value, str) and value:
+                    self.bloom.add(f"{kind}:{value}", exp)
+                    added += 1
+        return added
+
+    def _read(self):
+        skipped = 0
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    skipped += line.strip() != ""
+        if skipped:
+            logger.warning("Skipped %d bad line(s) in %s", skipped, self.path)
+
+    def refresh(self):
+        """Reload ``path`` if it changed, at most every RELOAD_INTERVAL seconds.
+
+        Until the first load is over, every caller waits for it, so that no
+        listed token is accepted meanwhile; later loads, which can take seconds
+        for a large file, run in a background thread. Failures are logged and
+        leave the filter as it was.
+        """
+        if self.path is None:
+            return
+        if not self._loaded.is_set():
+            with self._lock:
+                if not self._loaded.is_set():
+                    mtime = self._check()
+                    if mtime != self._mtime:
+                        self._add_file(mtime)
+                    self._loaded.set()
+            return
+        if time.monotonic() < self._next_check:
+            return
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is checking or loading
+        mtime = self._check()
+        if mtime == self._mtime:
+            self._lock.release()
+        else:
+            threading.Thread(
+                target=self._load,
+                args=(mtime,),
+                name="drf-keycloak-revocations",
+                daemon=True,
+            ).start()
+
+    def _check(self):
+        """Schedule the next check; the file's mtime, or the last one on error."""
+        interval = keycloak_settings.REVOCATION_FILTER_RELOAD_INTERVAL
+        self._next_check = time.monotonic() + interval
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError as exc:
+            logger.warning("Cannot read revocation file %s: %s", self.path, exc)
+            return self._mtime
+
+    def _add_file(self, mtime):
+        try:
+            added = self.add(self._read())
+            self._mtime = mtime
+            logger.info("Loaded %d revocation(s) from %s", added, self.path)
+        except OSError as exc:
+            logger.warning("Cannot read revocation file %s: %s", self.path, exc)
+
+    def _load(self, mtime):
+        """``_add_file`` in the background; releases the lock ``refresh`` took."""
+        try:
+            self._add_file(mtime)
+        finally:
+            self._lock.release()
+
+    def matches(self, payload):
+        """True if the token's ``jti`` or session was added (or collides)."""
+        self.refresh()
+        jti = payload.get("jti")
+        if isinstance(jti, str) and f"jti:{jti}" in self.bloom:
+            return True
+        sid = payload.get("sid") or payload.get("session_state")
+        return isinstance(sid, str) and f"sid:{sid}" in self.bloom
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_revocation_filter():
+    """The revocation filter, or None when ``REVOCATION_FILTER_CAPACITY`` is 0."""
+    global _filter
+    if _filter is None and keycloak_settings.REVOCATION_FILTER_CAPACITY:
+        with _filter_lock:
+            if _filter is None:
+                _filter = RevocationFilter(keycloak_settings.REVOCATION_FILTER_PATH)
+    return _filter
+
+
+def add_revocations(entries):
+    """Add revoked ``jti``/``sid`` entries to this process's filter.
+
+    For feeds other than ``REVOCATION_FILTER_PATH``, such as a message queue
+    consumer; the entries are as described on ``RevocationFilter``. Returns
+    how many values were added. Raises ``ImproperlyConfigured`` when
+    ``REVOCATION_FILTER_CAPACITY`` is 0.
+    """
+    revocation_filter = get_revocation_filter()
+    if revocation_filter is None:
+        raise ImproperlyConfigured("REVOCATION_FILTER_CAPACITY is 0")
+    return revocation_filter.add(entries)
+
+
+def reset_revocation_store():
+    """Forget the store and filter (called when KEYCLOAK_CONFIG changes)."""
+    global _store, _filter
+    _store = None
+    _filter = None
+
+
+def _number(value):
+    return isinstance(value, int | float) and not isinstance(value, bool)
+
+
+def _not_before_key(issuer):
+    return ("not_before", issuer, keycloak_settings.CLIENT_ID)
+
+
+def _keys(payload):
+    """Store keys that may revoke a token, each with ``inclusive``.
+
+    A token issued in the very second of a logout is revoked too; one issued
+    at the not-before watermark is not, as in Keycloak's own adapters.
+    """
+    issuer = payload.get("iss")
+    yield _not_before_key(issuer), False
+    # older Keycloak versions only carry the session id as session_state
+    sid = payload.get("sid") or payload.get("session_state")
+    if isinstance(sid, str) and sid:
+        yield ("sid", issuer, sid), True
+    sub = payload.get("sub")
+    if isinstance(sub, str) and sub:
+        yield ("sub", issuer, sub), True
+
+
+def _revoked(payload, revoked_at, inclusive):
+    if revoked_at is None:
+        return False
+    # a token without a usable iat cannot be shown to postdate the revocation
+    iat = payload.get("iat")
+    if not _number(iat):
+        return True
+    return iat <= revoked_at if inclusive else iat < revoked_at
+
+
+def _filtered(payload):
+    revocation_filter = get_revocation_filter()
+    return revocation_filter is not None and revocation_filter.matches(payload)
+
+
+def is_revoked(payload):
+    """True if the revocation filter or store covers the token ``payload``."""
+    if _filtered(payload):
+        return True
+    store = get_revocation_store()
+    if store is None:
+        return False
+    keys = list(_keys(payload))
+    found = store.revoked_at_many([key for key, _ in keys])
+    return any(
+        _revoked(payload, revoked_at, inclusive)
+        for (_, inclusive), revoked_at in zip(keys, found, strict=True)
+    )
+
+
+async def ais_revoked(payload):
+    """Async ``is_revoked``."""
+    if _filtered(payload):
+        return True
+    store = get_revocation_store()
+    if store is None:
+        return False
+    keys = list(_keys(payload))
+    found = await store.arevoked_at_many([key for key, _ in keys])
+    return any(
+        _revoked(payload, revoked_at, inclusive)
+        for (_, inclusive), revoked_at in zip(keys, found, strict=True)
+    )
+
+
+def revoke_logout(payload):
+    """Record the logout described by a validated ``logout_token`` payload.
+
+    A logout naming a session ends only that session; one naming just the user
+    ends all of the user's sessions.
+    """
+    store = get_revocation_store()
+    issuer = payload.get("iss")
+    sid = payload.get("sid")
+    key = ("sid", issuer, sid) if sid else ("sub", issuer, payload["sub"])
+    store.revoke(key, payload["iat"])
+
+
+def push_not_before(issuer, not_before):
+    """Reject every token of ``issuer`` issued before ``not_before``.
+
+    The watermark only moves forward; a push with an older value is ignored.
+    """
+    get_revocation_store().revoke(_not_before_key(issuer), not_before)
@@ -1,5 +1,7 @@
 """default keycloak settings"""
 
+from functools import cached_property
+
 from django.conf import settings
 from django.test.signals import setting_changed
 from rest_framework.settings import APISettings
@@ -16,6 +18,14 @@ DEFAULT = {
     "AUDIENCE": None,
     "ALGORITHM": ["RS256"],
     "ISSUER": "http://localhost:8080/realms/master",
+    # accept tokens from several realms: a list of issuers, or a dict mapping
+    # each issuer to the base URL its keys are fetched from; replaces ISSUER
+    # for token validation
+    "TRUSTED_ISSUERS": None,
+    # resolve the JWKS, introspection and userinfo URLs from the realm's
+    # .well-known/openid-configuration, refetched every DISCOVERY_TTL seconds
+    "USE_DISCOVERY": False,
+    "DISCOVERY_TTL": 60 * 60 * 24,
     "PERMISSION_PATH": "resource_access.account.roles",
     "USER_ID_FIELD": "username",
     # NOTE: preferred_username is mutable and can be reassigned in Keycloak.
@@ -25,8 +35,83 @@ DEFAULT = {
     "VERIFY_SIGNATURE": True,
     "VERIFY_TOKENS_WITH_KEYCLOAK": False,
     "VERIFY_CERTIFICATE": True,
+    # seconds to wait for any Keycloak call (JWKS, introspection, userinfo);
+    # the connect phase uses HTTP_CONNECT_TIMEOUT instead when set
+    "HTTP_TIMEOUT": 30,
+    "HTTP_CONNECT_TIMEOUT": None,
+    # hosts with a connection pool / keep-alive connections kept per host
+    "HTTP_POOL_CONNECTIONS": 10,
+    "HTTP_POOL_MAXSIZE": 10,
+    # retries of failed idempotent calls, waiting BACKOFF * 2**n seconds between
+    "HTTP_RETRIES": 0,
+    "HTTP_RETRY_BACKOFF": 0.5,
+    # import path of a callable returning the requests.Session to use
+    "HTTP_SESSION_FACTORY": None,
+    # consecutive failed calls that open a host's circuit (0 disables), seconds
+    # it stays open, and probe calls let through once it is half-open
+    "CIRCUIT_BREAKER_THRESHOLD": 0,
+    "CIRCUIT_BREAKER_RESET_TIMEOUT": 30,
+    "CIRCUIT_BREAKER_HALF_OPEN_CALLS": 1,
     # seconds of clock-skew tolerance for exp/nbf/iat checks
     "LEEWAY": 0,
+    # parse each token once and verify it without PyJWT's generic machinery
+    "FAST_VERIFICATION": False,
+    # max number of validated tokens kept in-process; 0 disables the cache
+    "TOKEN_CACHE_SIZE": 0,
+    # seconds an introspection verdict is reused (active / inactive); 0 disables
+    "INTROSPECTION_CACHE_TTL": 0,
+    "INTROSPECTION_CACHE_NEGATIVE_TTL": 0,
+    "INTROSPECTION_CACHE_SIZE": 1024,
+    # introspection calls in flight per process (0 disables the limit), calls
+    # allowed to wait for a slot, and seconds each may wait before a 503
+    "INTROSPECTION_MAX_CONCURRENCY": 0,
+    "INTROSPECTION_QUEUE_SIZE": 100,
+    "INTROSPECTION_QUEUE_TIMEOUT": 1,
+    # import path of a drf_keycloak.users.BaseUserCache subclass; None disables
+    "USER_CACHE": None,
+    "USER_CACHE_TIMEOUT": 300,
+    # entries kept by LocalUserCache / Django cache alias used by DjangoUserCache
+    "USER_CACHE_SIZE": 1024,
+    "USER_CACHE_ALIAS": "default",
+    # import path of a drf_keycloak.revocation.BaseRevocationStore subclass that
+    # records back-channel logouts; None disables revocation checks
+    "REVOCATION_STORE": None,
+    # seconds a logout is remembered; at least the access token lifespan
+    "REVOCATION_TTL": 60 * 60,
+    # entries kept by LocalRevocationStore / alias used by DjangoRevocationStore
+    "REVOCATION_CACHE_SIZE": 10000,
+    "REVOCATION_CACHE_ALIAS": "default",
+    # expected revoked jti/sid values held in the Bloom filter (0 disables), its
+    # false-positive rate per bucket, and buckets REVOCATION_TTL is split into
+    "REVOCATION_FILTER_CAPACITY": 0,
+    "REVOCATION_FILTER_ERROR_RATE": 1e-6,
+    "REVOCATION_FILTER_BUCKETS": 12,
+    # JSON Lines file of {"jti" or "sid", "exp"} entries loaded into the filter,
+    # checked for changes every RELOAD_INTERVAL seconds
+    "REVOCATION_FILTER_PATH": None,
+    "REVOCATION_FILTER_RELOAD_INTERVAL": 60,
+    # users whose last-synced claim fingerprint is remembered (0 disables), and
+    # seconds a fingerprint is trusted before the claims are compared again
+    "CLAIM_FINGERPRINT_CACHE_SIZE": 0,
+    "CLAIM_FINGERPRINT_TIMEOUT": 300,
+    # queue claim changes and persist them in batches off the request path
+    "DEFERRED_USER_SAVE": False,
+    "DEFERRED_USER_SAVE_INTERVAL": 1.0,
+    "DEFERRED_USER_SAVE_MAX_PENDING": 1000,
+    # refetch the JWKS from a background thread ahead of expiry
+    "JWKS_BACKGROUND_REFRESH": False,
+    "JWKS_REFRESH_INTERVAL": 300,
+    # seconds past expiry a key set is still served while background refresh fails
+    "JWKS_STALE_IF_ERROR": 3600,
+    # Django cache alias sharing the fetched JWKS across processes; None disables
+    "JWKS_CACHE_ALIAS": None,
+    # file keeping the last good JWKS for cold starts and Keycloak outages
+    "JWKS_SNAPSHOT_PATH": None,
+    # oldest snapshot still served while Keycloak is unreachable (seconds)
+    "JWKS_SNAPSHOT_MAX_AGE": 60 * 60 * 24,
+    # fetch the signing keys in AppConfig.ready; STRICT makes failures fatal
+    "WARM_UP_ON_STARTUP": False,
+    "WARM_UP_STRICT": False,
     # django key, keycloak value
     "CLAIM_MAPPING": {
         "first_name": "given_name",
@@ -36,6 +121,9 @@ DEFAULT = {
     },
 }
 
+# settings given as dotted import paths, resolved to the object they name
+IMPORT_STRINGS = frozenset({"USER_CACHE", "HTTP_SESSION_FACTORY", "REVOCATION_STORE"})
+
 # settings that, when changed, must invalidate the cached JWKS client because
 # they determine which Keycloak the signing keys are fetched from.
 _JWKS_RELEVANT = frozenset({"SERVER_URL", "ISSUER", "VERIFY_CERTIFICATE"})
@@ -46,7 +134,12 @@ class KeycloakSettings(APISettings):
 
     def __init__(self, user_settings=None, defaults=None, import_strings=None):
         super().__init__(user_settings, defaults, import_strings)
-        self.import_strings = ""
+        # never fall back to DRF's own IMPORT_STRINGS
+        self.import_strings = import_strings or ()
+
+    def reload(self):
+        super().reload()
+        self.__dict__.pop("trusted_issuers", None)
 
     @property
     def user_settings(self):
@@ -72,8 +165,22 @@ class KeycloakSettings(APISettings):
         """API base: explicit SERVER_URL, else fall back to ISSUER."""
         return self.SERVER_URL or self.ISSUER
 
+    @cached_property
+    def trusted_issuers(self):
+        """TRUSTED_ISSUERS as ``{issuer: base URL}``; empty when unset.
 
-keycloak_settings = KeycloakSettings(None, DEFAULT)
+        A plain list means each issuer is also its own base URL. Cached, since
+        it is consulted for every token; ``reload`` clears it.
+        """
+        issuers = self.TRUSTED_ISSUERS
+        if not issuers:
+            return {}
+        if isinstance(issuers, dict):
+            return {issuer: base or issuer for issuer, base in issuers.items()}
+        return {issuer: issuer for issuer in issuers}
+
+
+keycloak_settings = KeycloakSettings(None, DEFAULT, IMPORT_STRINGS)
 
 
 def reload_keycloak_settings(*args, **kwargs):  # pylint: disable=unused-argument
@@ -82,10 +189,29 @@ def reload_keycloak_settings(*args, **kwargs):  # pylint: disable=unused-argumen
     if setting == "KEYCLOAK_CONFIG":
         keycloak_settings.reload()
         # The JWKS client snapshots its URL at construction; rebuild it so a
-        # changed SERVER_URL/ISSUER is honored instead of hitting the old realm.
-        from .keys import reset_jwks_client  # local import avoids import cycle
-
+        # changed SERVER_URL/ISSUER is honored instead of hitting the old realm,
+        # and drop payloads that were validated against the old configuration.
+        # Local imports avoid an import cycle.
+        from .api import reset_keycloak_api
+        from .discovery import reset_discovery
+        from .keys import reset_jwks_client
+        from .resilience import reset_bulkheads, reset_circuit_breakers
+        from .revocation import reset_revocation_store
+        from .token import reset_token_cache
+        from .users import reset_user_cache
+        from .verifier import reset_verifier
+        from .writeback import reset_write_buffer
+
+        reset_keycloak_api()
+        reset_circuit_breakers()
+        reset_bulkheads()
+        reset_revocation_store()
+        reset_discovery()
         reset_jwks_client()
+        reset_token_cache()
+        reset_verifier()
+        reset_user_cache()
+        reset_write_buffer()
 
 
 # reload for unit test
@@ -0,0 +1,109 @@
+"""Coalescing of concurrent identical calls to Keycloak.
+
+When many requests need the same thing at once (the JWKS right after it
+expired, or the introspection verdict for a token a client sends on 20
+parallel requests), only the first caller for a key makes the call. The
+others wait for it and share its result, or its exception. Nothing is kept
+once the call returns; remembering results is the caches' job.
+"""
+
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-level coalescing: one in-flight call per key."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return ``fn(*args, **kwargs)``, shared with concurrent callers of ``key``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            return self._outcome(call)
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def wait(self, key, default=None):
+        """The outcome of the call in flight for ``key``; ``default`` if none."""
+        call = self._calls.get(key)
+        if call is None:
+            return default
+        return self._outcome(call)
+
+    @staticmethod
+    def _outcome(call):
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+class AsyncSingleFlight:
+    """Coroutine-level coalescing: one in-flight call per key and event loop."""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        """Await ``fn(*args, **kwargs)``, shared with concurrent callers of ``key``."""
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        while (future := self._calls.get(key)) is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # we were cancelled, not the call we waited for
+                # its caller was cancelled; make the call ourselves
+
+        future = self._calls[key] = loop.create_future()
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # retrieved: no "never retrieved" warning
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    async def wait(self, key, default=None):
+        """The outcome of the call in flight for ``key``; ``default`` if none."""
+        future = self._calls.get((asyncio.get_running_loop(), key))
+        if future is None:
+            return default
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if future.cancelled():
+                return default
+            raise
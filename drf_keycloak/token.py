@@ -1,16 +1,107 @@
 """Verify an access token: local signature/claims, optional introspection."""
 
 import logging
+import time
 
 import jwt
 
 from .api import keycloak_api
+from .cache import ExpiringLRUCache, token_digest
 from .exceptions import TokenBackendError, TokenBackendExpiredToken
-from .keys import get_signing_key
+from .keys import get_signing_key, resolve_signing_key
+from .revocation import is_revoked
 from .settings import keycloak_settings
+from .singleflight import SingleFlight
+from .verifier import CompactJWS, get_verifier
+from .verifier import parse as parse_jws
 
 logger = logging.getLogger("drf_keycloak")
 
+# Verified payloads (see TOKEN_CACHE_SIZE) and introspection verdicts (see
+# INTROSPECTION_CACHE_TTL), both keyed by token digest. Built lazily so the size
+# settings are read after Django settings are configured.
+_token_cache = None
+_introspection_cache = None
+# parallel requests carrying the same token share one introspection call
+_introspections = SingleFlight()
+
+
+def _get_token_cache():
+    global _token_cache
+    cache = _token_cache
+    if cache is None:
+        cache = _token_cache = ExpiringLRUCache(keycloak_settings.TOKEN_CACHE_SIZE)
+    return cache
+
+
+def _get_introspection_cache():
+    global _introspection_cache
+    cache = _introspection_cache
+    if cache is None:
+        cache = _introspection_cache = ExpiringLRUCache(
+            keycloak_settings.INTROSPECTION_CACHE_SIZE
+        )
+    return cache
+
+
+def reset_token_cache():
+    """Forget every cached payload and introspection verdict.
+
+    Called when KEYCLOAK_CONFIG changes: a result obtained under the old
+    issuer/audience/keys/client must not be served under the new ones.
+    """
+    global _token_cache, _introspection_cache
+    _token_cache = None
+    _introspection_cache = None
+
+
+def _trusted_issuer(token):
+    """The ``TRUSTED_ISSUERS`` entry the token names as its ``iss``.
+
+    None when ``TRUSTED_ISSUERS`` is unset (validate against ``ISSUER``).
+    The claim is read unverified only to pick the realm whose keys must
+    have signed the token, and is then checked as part of validation.
+    """
+    trusted = keycloak_settings.trusted_issuers
+    if not trusted:
+        return None
+    jws = token if isinstance(token, CompactJWS) else parse_jws(token)
+    issuer = jws.payload.get("iss")
+    if not isinstance(issuer, str) or issuer not in trusted:
+        logger.debug("Token invalid: untrusted issuer %r", issuer)
+        raise TokenBackendError("Token is invalid")
+    return issuer
+
+
+def _verify_jwt(token, key, audience, issuer=None):
+    """Check signature and claims of ``token`` against ``key``.
+
+    ``audience`` None skips the ``aud`` check; ``issuer`` overrides ``ISSUER``
+    (see ``_trusted_issuer``).
+    """
+    try:
+        return jwt.decode(
+            token,
+            key,
+            algorithms=keycloak_settings.algorithms,
+            audience=audience,
+            issuer=issuer or keycloak_settings.ISSUER,
+            leeway=keycloak_settings.LEEWAY,
+            options={
+                "verify_aud": audience is not None,
+                "verify_signature": keycloak_settings.VERIFY_SIGNATURE,
+                "verify_exp": True,
+            },
+        )
+    except jwt.ExpiredSignatureError as exc:
+        logger.debug("Token expired")
+        raise TokenBackendExpiredToken("Token is expired") from exc
+    except jwt.InvalidAlgorithmError as exc:
+        raise TokenBackendError("Algorithm is invalid") from exc
+    except jwt.InvalidTokenError as exc:
+        logger.debug("Token invalid: %s", exc)
+        raise TokenBackendError("Token is invalid") from exc
+
 
 class JWToken:
     """Validate an existing JWT access token and expose its payload."""
@@ -20,6 +111,8 @@ class JWToken:
         self.audience = keycloak_settings.AUDIENCE
         if self.token:
             self.payload = self.decode(self.token)
+            if is_revoked(self.payload):
+                self._reject_revoked()
             if keycloak_settings.VERIFY_TOKENS_WITH_KEYCLOAK:
                 self.verify_token_with_keycloak()
 
@@ -30,13 +123,60 @@ class JWToken:
         network round-trip is reserved for tokens that are already locally
         valid. Fails closed: a non-dict or inactive response is rejected.
         Network/5xx failures raise KeycloakAPIError (503) from the API layer.
+
+        With ``INTROSPECTION_CACHE_TTL`` / ``INTROSPECTION_CACHE_NEGATIVE_TTL``
+        set, the verdict is reused for that long (never past the token's
+        ``exp``), trading revocation latency for one round-trip per token
+        instead of per request. Failures to reach Keycloak are never cached.
         """
-        result = keycloak_api.get_introspect(self.token)
-        if isinstance(result, dict) and result.get("active", False):
+        if self._introspect():
+            return None
+        self._reject_inactive()
+
+    def _introspect(self):
+        active = self._cached_verdict()
+        if active is None:
+            result = _introspections.do(
+                token_digest(self.token), keycloak_api.get_introspect, self.token
+            )
+            active = self._remember_verdict(self._is_active(result))
+        return active
+
+    @staticmethod
+    def _introspection_ttls():
+        return (
+            keycloak_settings.INTROSPECTION_CACHE_TTL,
+            keycloak_settings.INTROSPECTION_CACHE_NEGATIVE_TTL,
+        )
+
+    def _cached_verdict(self):
+        """The cached introspection verdict, or None (miss or cache disabled)."""
+        if not any(self._introspection_ttls()):
             return None
+        return _get_introspection_cache().get(token_digest(self.token))
+
+    def _remember_verdict(self, active):
+        ttl, negative_ttl = self._introspection_ttls()
+        if ttl or negative_ttl:
+            lifetime = ttl if active else negative_ttl
+            deadline = min(time.time() + lifetime, self._cache_deadline(self.payload))
+            _get_introspection_cache().set(token_digest(self.token), active, deadline)
+        return active
+
+    @staticmethod
+    def _is_active(result):
+        return isinstance(result, dict) and bool(result.get("active", False))
+
+    @staticmethod
+    def _reject_inactive():
         logger.debug("Introspection reported token inactive")
         raise TokenBackendError("Token is not active")
 
+    @staticmethod
+    def _reject_revoked():
+        logger.debug("Token belongs to a logged-out session")
+        raise TokenBackendError("Token is revoked")
+
     def decode(self, token):
         """Validate the token and return its payload.
 
@@ -44,26 +184,162 @@ class JWToken:
         if malformed or badly signed. Key-resolution failures propagate from
         ``keys.get_signing_key`` (TokenBackendError = 401, KeycloakAPIError =
         503).
+
+        With ``TOKEN_CACHE_SIZE`` set, a token that already passed validation
+        is served from the cache until its ``exp`` (minus ``LEEWAY``), skipping
+        the signature check. Only successful validations are cached.
+
+        With ``FAST_VERIFICATION`` set, asymmetric tokens are parsed once and
+        verified by ``verifier.TokenVerifier`` instead of ``jwt.decode``.
         """
+        payload = self._cached_payload(token)
+        if payload is None:
+            jws = self._fast_path_jws(token)
+            if jws is not None:
+                issuer = self._token_issuer(jws)
+                key = resolve_signing_key(jws.kid, issuer)
+                payload = get_verifier().verify(jws, key, issuer)
+            else:
+                issuer = self._token_issuer(token)
+                payload = self._verify(token, get_signing_key(token, issuer), issuer)
+            payload = self._remember_payload(token, payload)
+        return payload
+
+    @staticmethod
+    def _token_issuer(token):
+        """See ``_trusted_issuer``."""
+        return _trusted_issuer(token)
+
+    @staticmethod
+    def _fast_path_jws(token):
+        """The parsed token if ``FAST_VERIFICATION`` can handle it, else None.
+
+        Signature verification can only be skipped through PyJWT, so
+        ``VERIFY_SIGNATURE=False`` always takes the PyJWT path.
+        """
+        if not (
+            keycloak_settings.FAST_VERIFICATION and keycloak_settings.VERIFY_SIGNATURE
+        ):
+            return None
+        jws = parse_jws(token)
+        return jws if get_verifier().supports(jws) else None
+
+    @staticmethod
+    def _cached_payload(token):
+        """A copy of the cached payload, or None (miss or cache disabled)."""
+        if not keycloak_settings.TOKEN_CACHE_SIZE:
+            return None
+        payload = _get_token_cache().get(token_digest(token))
+        # a shallow copy so a caller adding keys can't poison the shared entry
+        return None if payload is None else dict(payload)
+
+    def _remember_payload(self, token, payload):
+        if not keycloak_settings.TOKEN_CACHE_SIZE:
+            return payload
+        _get_token_cache().set(
+            token_digest(token), payload, self._cache_deadline(payload)
+        )
+        return dict(payload)
+
+    @staticmethod
+    def _cache_deadline(payload):
+        """Epoch second after which nothing cached for this token is served.
+
+        Bounded by the token's own ``exp`` and deliberately shortened by
+        ``LEEWAY``: a cache hit is never more lenient than a full decode. A
+        token without a numeric ``exp`` is not cached at all.
+        """
+        exp = payload.get("exp")
+        if not isinstance(exp, int | float) or isinstance(exp, bool):
+            return 0
+        return exp - keycloak_settings.LEEWAY
+
+    def _verify(self, token, key, issuer=None):
+        """``_verify_jwt`` against this token's ``audience``."""
+        return _verify_jwt(token, key, self.audience, issuer)
+
+
+# the ``events`` member that marks a JWT as a back-channel logout token
+BACKCHANNEL_LOGOUT_EVENT = "http://schemas.openid.net/event/backchannel-logout"
+
+
+class LogoutToken:
+    """Validate a back-channel ``logout_token`` and expose its payload.
+
+    Checked as OpenID Connect Back-Channel Logout 1.0 requires: signed by the
+    realm's keys, issued by a trusted issuer for ``CLIENT_ID``, with an ``iat``,
+    the logout event, a ``sub`` or ``sid``, and no ``nonce``. Raises
+    ``TokenBackendError`` otherwise.
+    """
+
+    def __init__(self, token):
+        self.token = token
+        issuer = _trusted_issuer(token)
+        key = get_signing_key(token, issuer)
+        payload = _verify_jwt(token, key, keycloak_settings.CLIENT_ID, issuer)
+        self._check_claims(payload)
+        self.payload = payload
+
+    @staticmethod
+    def _check_claims(payload):
+        events = payload.get("events")
+        if not (
+            isinstance(events, dict)
+            and isinstance(events.get(BACKCHANNEL_LOGOUT_EVENT), dict)
+            and isinstance(payload.get("iat"), int | float)
+            and (payload.get("sub") or payload.get("sid"))
+            and "nonce" not in payload
+        ):
+            logger.debug("Logout token invalid: missing or forbidden claims")
+            raise TokenBackendError("Logout token is invalid")
+
+
+class PushNotBeforeToken:
+    """Validate the signed action of a Keycloak "push not-before".
+
+    Keycloak posts it as a bare compact JWS to the client's admin URL. Unlike
+    a JWT it carries no ``iss`` or ``exp``; it is checked against the keys of
+    each trusted realm in turn (``issuer`` is the realm that signed it), and
+    must name the ``PUSH_NOT_BEFORE`` action, ``CLIENT_ID`` as its
+    ``resource``, an ``expiration`` in the future and an integer
+    ``notBefore``. Raises ``TokenBackendError`` otherwise.
+    """
+
+    def __init__(self, token):
+        self.token = token
+        # rejects a malformed header, a non-string kid included, before any
+        # key lookup: this endpoint is open to anyone
+        jws = parse_jws(token)
+        for issuer in keycloak_settings.trusted_issuers or (None,):
+            try:
+                key = resolve_signing_key(jws.kid, issuer)
+            except TokenBackendError:
+                continue
+            self.issuer = issuer or keycloak_settings.ISSUER
+            self.payload = self._decode_action(token, key)
+            return
+        raise TokenBackendError("Signing key not found")
+
+    @staticmethod
+    def _decode_action(token, key):
         try:
-            return jwt.decode(
+            payload = jwt.decode(
                 token,
-                get_signing_key(token),
+                key,
                 algorithms=keycloak_settings.algorithms,
-                audience=self.audience,
-                issuer=keycloak_settings.ISSUER,
-                leeway=keycloak_settings.LEEWAY,
-                options={
-                    "verify_aud": self.audience is not None,
-                    "verify_signature": keycloak_settings.VERIFY_SIGNATURE,
-                    "verify_exp": True,
-                },
+                options={"verify_aud": False, "verify_iss": False},
             )
-        except jwt.ExpiredSignatureError as exc:
-            logger.debug("Token expired")
-            raise TokenBackendExpiredToken("Token is expired") from exc
-        except jwt.InvalidAlgorithmError as exc:
-            raise TokenBackendError("Algorithm is invalid") from exc
         except jwt.InvalidTokenError as exc:
-            logger.debug("Token invalid: %s", exc)
-            raise TokenBackendError("Token is invalid") from exc
+            logger.debug("Admin action invalid: %s", exc)
+            raise TokenBackendError("Admin action is invalid") from exc
+        expiration = payload.get("expiration")
+        if not (
+            payload.get("action") == "PUSH_NOT_BEFORE"
+            and payload.get("resource") == keycloak_settings.CLIENT_ID
+            and isinstance(payload.get("notBefore"), int)
+            and isinstance(expiration, int)
+            and expiration + keycloak_settings.LEEWAY > time.time()
+        ):
+            logger.debug("Admin action invalid: wrong action, resource or expired")
+            raise TokenBackendError("Admin action is invalid")
+        return payload
@@ -0,0 +1,17 @@
+"""URLs of the endpoints Keycloak calls: ``path("keycloak/", include(...))``."""
+
+from django.urls import path
+
+from .views import BackchannelLogoutView, PushNotBeforeView
+
+app_name = "drf_keycloak"
+
+urlpatterns = [
+    path(
+        "backchannel-logout/",
+        BackchannelLogoutView.as_view(),
+        name="backchannel-logout",
+    ),
+    # Keycloak appends this exact path to the client's Admin URL
+    path("k_push_not_before", PushNotBeforeView.as_view(), name="push-not-before"),
+]
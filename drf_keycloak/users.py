@@ -0,0 +1,194 @@
+"""Caching of resolved users and of their last-synced claims.
+
+With ``USER_CACHE`` set, ``KeycloakAuthBackend`` returns a cached user instead
+of running ``get_or_create`` on every request. Entries are dropped when the
+user is saved or deleted (and thereby when a claim change is synced, since
+that saves the user), and expire after ``USER_CACHE_TIMEOUT`` regardless, which
+bounds staleness from writes that bypass signals (``QuerySet.update``).
+
+With ``CLAIM_FINGERPRINT_CACHE_SIZE`` set, a hash of the mapped claim values is
+remembered per user after each sync, so a request whose claims hash the same
+skips the ``CLAIM_MAPPING`` walk entirely. Fingerprints are dropped on save and
+delete like cached users, but expire after their own
+``CLAIM_FINGERPRINT_TIMEOUT``, so a longer-lived user cache does not delay the
+claim sync.
+"""
+
+import copy
+import hashlib
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+
+from .cache import ExpiringLRUCache
+from .settings import keycloak_settings
+
+
+class BaseUserCache:
+    """Interface for ``USER_CACHE`` implementations.
+
+    ``user_id`` is the value of the token's ``USER_ID_CLAIM``, i.e. the value
+    of the user's ``USER_ID_FIELD``. ``get`` must return an instance the caller
+    may mutate without affecting other requests.
+    """
+
+    def get(self, user_id):
+        raise NotImplementedError
+
+    def set(self, user_id, user):
+        raise NotImplementedError
+
+    def delete(self, user_id):
+        raise NotImplementedError
+
+    async def aget(self, user_id):
+        return self.get(user_id)
+
+    async def aset(self, user_id, user):
+        self.set(user_id, user)
+
+
+class LocalUserCache(BaseUserCache):
+    """Per-process LRU of up to ``USER_CACHE_SIZE`` users.
+
+    A save or delete only evicts the user in the process that made it: a user
+    deactivated through another worker or host keeps authenticating here for
+    up to ``USER_CACHE_TIMEOUT``. Use ``DjangoUserCache`` with a shared cache
+    when more than one worker serves requests.
+    """
+
+    def __init__(self):
+        self._cache = ExpiringLRUCache(keycloak_settings.USER_CACHE_SIZE)
+
+    def get(self, user_id):
+        user = self._cache.get(user_id)
+        # a copy: the cached instance is shared by every thread in the process
+        return None if user is None else copy.copy(user)
+
+    def set(self, user_id, user):
+        deadline = time.time() + keycloak_settings.USER_CACHE_TIMEOUT
+        self._cache.set(user_id, copy.copy(user), deadline)
+
+    def delete(self, user_id):
+        self._cache.delete(user_id)
+
+
+class DjangoUserCache(BaseUserCache):
+    """Users pickled into the Django cache ``USER_CACHE_ALIAS``.
+
+    Shared across processes, so a save/delete in one worker invalidates the
+    entry for all of them.
+    """
+
+    def __init__(self):
+        self._cache = caches[keycloak_settings.USER_CACHE_ALIAS]
+
+    @staticmethod
+    def _key(user_id):
+        # hashed: claim values may contain characters memcached rejects
+        digest = hashlib.sha256(str(user_id).encode()).hexdigest()
+        return f"drf_keycloak:user:{keycloak_settings.USER_ID_FIELD}:{digest}"
+
+    def get(self, user_id):
+        return self._cache.get(self._key(user_id))
+
+    def set(self, user_id, user):
+        self._cache.set(self._key(user_id), user, keycloak_settings.USER_CACHE_TIMEOUT)
+
+    def delete(self, user_id):
+        self._cache.delete(self._key(user_id))
+
+    async def aget(self, user_id):
+        return await self._cache.aget(self._key(user_id))
+
+    async def aset(self, user_id, user):
+        await self._cache.aset(
+            self._key(user_id), user, keycloak_settings.USER_CACHE_TIMEOUT
+        )
+
+
+_user_cache = None
+_fingerprints = None
+
+
+def get_user_cache():
+    """The configured ``USER_CACHE`` instance, or None when disabled."""
+    global _user_cache
+    if _user_cache is None and keycloak_settings.USER_CACHE is not None:
+        _user_cache = keycloak_settings.USER_CACHE()
+    return _user_cache
+
+
+def _get_fingerprints():
+    global _fingerprints
+    fingerprints = _fingerprints
+    if fingerprints is None:
+        fingerprints = _fingerprints = ExpiringLRUCache(
+            keycloak_settings.CLAIM_FINGERPRINT_CACHE_SIZE
+        )
+    return fingerprints
+
+
+def claims_fingerprint(claims):
+    """Digest of the ``CLAIM_MAPPING`` values in ``claims``, or None if disabled.
+
+    A missing claim and a claim set to null hash differently, because the sync
+    skips the former but writes the latter.
+    """
+    if not keycloak_settings.CLAIM_FINGERPRINT_CACHE_SIZE:
+        return None
+    values = [
+        (claim in claims, claims.get(claim))
+        for claim in keycloak_settings.CLAIM_MAPPING.values()
+    ]
+    encoded = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+def is_synced(user, fingerprint):
+    """True if ``user`` was last synced from claims with this fingerprint."""
+    if fingerprint is None or user.pk is None:
+        return False
+    return _get_fingerprints().get(user.pk) == fingerprint
+
+
+def mark_synced(user, fingerprint):
+    if fingerprint is not None and user.pk is not None:
+        deadline = time.time() + keycloak_settings.CLAIM_FINGERPRINT_TIMEOUT
+        _get_fingerprints().set(user.pk, fingerprint, deadline)
+
+
+def reset_user_cache():
+    """Forget cached users and fingerprints (called when KEYCLOAK_CONFIG changes)."""
+    global _user_cache, _fingerprints
+    _user_cache = None
+    _fingerprints = None
+
+
+def invalidate_user(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """``post_save`` / ``post_delete`` receiver dropping the cached user.
+
+    Also forgets the user's fingerprint, so a local edit to a mapped field is
+    overwritten from the token on the next request, as without fingerprints.
+    """
+    if _fingerprints is not None and instance.pk is not None:
+        _fingerprints.delete(instance.pk)
+    cache = get_user_cache()
+    if cache is None:
+        return
+    user_id = getattr(instance, keycloak_settings.USER_ID_FIELD, None)
+    if user_id is not None:
+        cache.delete(user_id)
+
+
+def connect_signals():
+    user_model = get_user_model()
+    post_save.connect(
+        invalidate_user, sender=user_model, dispatch_uid="drf_keycloak_user_cache"
+    )
+    post_delete.connect(
+        invalidate_user, sender=user_model, dispatch_uid="drf_keycloak_user_cache"
+    )
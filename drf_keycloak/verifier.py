@@ -0,0 +1,246 @@
+"""Single-parse verification of compact JWS access tokens.
+
+``jwt.decode`` is generic: together with the ``kid`` lookup in
+``keys.get_signing_key`` a token gets split, base64-decoded and JSON-parsed
+twice, then dispatched through PyJWT's algorithm and option machinery. This
+module parses the token once, verifies the signature directly against the
+``cryptography`` public key that ``keys`` already holds, and checks the claims
+against a policy precomputed from ``keycloak_settings``.
+
+The checks mirror PyJWT's for the options ``JWToken`` uses (``exp``, ``nbf``,
+``iat``, ``iss``, optional ``aud``, ``LEEWAY``) and raise the same
+``TokenBackendError`` / ``TokenBackendExpiredToken`` messages. Anything the
+fast path does not cover (symmetric algorithms, ``crit`` or ``b64`` headers)
+is reported as unsupported so the caller can fall back to PyJWT.
+"""
+
+import base64
+import binascii
+import json
+import logging
+import time
+from typing import NamedTuple
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+
+from .exceptions import TokenBackendError, TokenBackendExpiredToken
+from .settings import keycloak_settings
+
+logger = logging.getLogger("drf_keycloak")
+
+
+def _verify_pkcs1(hash_cls):
+    def verify(key, signature, signing_input):
+        if not isinstance(key, rsa.RSAPublicKey):
+            return False
+        key.verify(signature, signing_input, padding.PKCS1v15(), hash_cls())
+        return True
+
+    return verify
+
+
+def _verify_pss(hash_cls):
+    def verify(key, signature, signing_input):
+        if not isinstance(key, rsa.RSAPublicKey):
+            return False
+        pss = padding.PSS(
+            mgf=padding.MGF1(hash_cls()), salt_length=hash_cls.digest_size
+        )
+        key.verify(signature, signing_input, pss, hash_cls())
+        return True
+
+    return verify
+
+
+def _verify_ecdsa(hash_cls, curve_cls):
+    def verify(key, signature, signing_input):
+        if not isinstance(key, ec.EllipticCurvePublicKey) or not isinstance(
+            key.curve, curve_cls
+        ):
+            return False
+        # JWS carries raw r||s; cryptography wants DER.
+        size = (key.curve.key_size + 7) // 8
+        if len(signature) != 2 * size:
+            return False
+        r = int.from_bytes(signature[:size], "big")
+        s = int.from_bytes(signature[size:], "big")
+        key.verify(encode_dss_signature(r, s), signing_input, ec.ECDSA(hash_cls()))
+        return True
+
+    return verify
+
+
+def _verify_eddsa(key, signature, signing_input):
+    if not isinstance(key, ed25519.Ed25519PublicKey | ed448.Ed448PublicKey):
+        return False
+    key.verify(signature, signing_input)
+    return True
+
+
+# alg -> verify(key, signature, signing_input); raises InvalidSignature or
+# returns False on a key/alg mismatch.
+_SIGNATURE_VERIFIERS = {
+    "RS256": _verify_pkcs1(hashes.SHA256),
+    "RS384": _verify_pkcs1(hashes.SHA384),
+    "RS512": _verify_pkcs1(hashes.SHA512),
+    "PS256": _verify_pss(hashes.SHA256),
+    "PS384": _verify_pss(hashes.SHA384),
+    "PS512": _verify_pss(hashes.SHA512),
+    "ES256": _verify_ecdsa(hashes.SHA256, ec.SECP256R1),
+    "ES384": _verify_ecdsa(hashes.SHA384, ec.SECP384R1),
+    "ES512": _verify_ecdsa(hashes.SHA512, ec.SECP521R1),
+    "EdDSA": _verify_eddsa,
+}
+
+
+class CompactJWS(NamedTuple):
+    header: dict
+    payload: dict
+    signing_input: bytes
+    signature: bytes
+
+    @property
+    def kid(self):
+        return self.header.get("kid")
+
+    @property
+    def alg(self):
+        return self.header.get("alg")
+
+
+def _b64decode(segment):
+    return base64.urlsafe_b64decode(segment + b"=" * (-len(segment) % 4))
+
+
+def _invalid(reason):
+    logger.debug("Token invalid: %s", reason)
+    return TokenBackendError("Token is invalid")
+
+
+def parse(token):
+    """Split and decode a compact JWS once. Raises ``TokenBackendError``."""
+    if isinstance(token, str):
+        token = token.encode()
+    try:
+        signing_input, signature = token.rsplit(b".", 1)
+        header_segment, payload_segment = signing_input.split(b".", 1)
+        header = json.loads(_b64decode(header_segment))
+        payload = json.loads(_b64decode(payload_segment))
+        signature = _b64decode(signature)
+    except (ValueError, binascii.Error) as exc:
+        # ValueError covers too few segments, bad UTF-8 and bad JSON
+        raise _invalid(exc) from exc
+    if not isinstance(header, dict) or not isinstance(payload, dict):
+        raise _invalid("header and payload must be JSON objects")
+    if not isinstance(header.get("kid", ""), str):
+        # PyJWT rejects these too; as a dict key it would raise TypeError
+        raise _invalid("kid must be a string")
+    return CompactJWS(header, payload, signing_input, signature)
+
+
+def _numeric(payload, claim):
+    try:
+        return int(payload[claim])
+    except (TypeError, ValueError) as exc:
+        raise _invalid(f"{claim} must be an integer") from exc
+
+
+class TokenVerifier:
+    """Signature and claim checks against settings captured at construction."""
+
+    def __init__(self, algorithms, issuer, audience, leeway):
+        self.algorithms = frozenset(algorithms)
+        self.issuer = issuer
+        self.audience = audience
+        self.leeway = leeway
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            algorithms=keycloak_settings.algorithms,
+            issuer=keycloak_settings.ISSUER,
+            audience=keycloak_settings.AUDIENCE,
+            leeway=keycloak_settings.LEEWAY,
+        )
+
+    def supports(self, jws):
+        """True if ``jws`` can be verified here; False means use PyJWT.
+
+        Raises ``TokenBackendError`` for an algorithm outside the allowlist,
+        exactly as PyJWT would.
+        """
+        alg = jws.alg
+        if not isinstance(alg, str) or alg not in self.algorithms:
+            raise TokenBackendError("Algorithm is invalid")
+        return (
+            alg in _SIGNATURE_VERIFIERS
+            and "crit" not in jws.header
+            and "b64" not in jws.header
+        )
+
+    def verify(self, jws, key, issuer=None):
+        """Verify signature then claims; return the payload.
+
+        ``issuer`` overrides the configured issuer for this token.
+        """
+        try:
+            valid = _SIGNATURE_VERIFIERS[jws.alg](key, jws.signature, jws.signing_input)
+        except InvalidSignature:
+            valid = False
+        if not valid:
+            raise _invalid("signature verification failed")
+        self.check_claims(jws.payload, issuer=issuer)
+        return jws.payload
+
+    def check_claims(self, payload, now=None, issuer=None):
+        """Same checks, in the same order, as PyJWT's claim validation."""
+        now = time.time() if now is None else now
+        issuer = self.issuer if issuer is None else issuer
+        leeway = self.leeway
+        if "iat" in payload and _numeric(payload, "iat") > now + leeway:
+            raise _invalid("the token is not yet valid (iat)")
+        if "nbf" in payload and _numeric(payload, "nbf") > now + leeway:
+            raise _invalid("the token is not yet valid (nbf)")
+        if "exp" in payload and _numeric(payload, "exp") <= now - leeway:
+            logger.debug("Token expired")
+            raise TokenBackendExpiredToken("Token is expired")
+        if issuer is not None and payload.get("iss") != issuer:
+            raise _invalid("invalid issuer")
+        if self.audience is not None:
+            self._check_audience(payload)
+        for claim in ("sub", "jti"):
+            if claim in payload and not isinstance(payload[claim], str):
+                raise _invalid(f"{claim} must be a string")
+
+    def _check_audience(self, payload):
+        aud = payload.get("aud")
+        if isinstance(aud, str):
+            aud = [aud]
+        if not isinstance(aud, list) or not all(isinstance(a, str) for a in aud):
+            raise _invalid("invalid audience")
+        expected = self.audience
+        if isinstance(expected, str):
+            expected = [expected]
+        if not set(expected) & set(aud):
+            raise _invalid("audience doesn't match")
+
+
+_verifier = None
+
+
+def get_verifier():
+    """The shared ``TokenVerifier`` for the current settings."""
+    global _verifier
+    verifier = _verifier
+    if verifier is None:
+        verifier = _verifier = TokenVerifier.from_settings()
+    return verifier
+
+
+def reset_verifier():
+    """Drop the precomputed policy (called when KEYCLOAK_CONFIG changes)."""
+    global _verifier
+    _verifier = None
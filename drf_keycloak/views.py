@@ -0,0 +1,83 @@
+"""Endpoints Keycloak calls on the API."""
+
+import logging
+
+from rest_framework import status
+from rest_framework.parsers import FormParser
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .exceptions import TokenBackendError
+from .revocation import get_revocation_store, push_not_before, revoke_logout
+from .token import LogoutToken, PushNotBeforeToken
+
+logger = logging.getLogger("drf_keycloak")
+
+
+class BackchannelLogoutView(APIView):
+    """Receive Keycloak's back-channel logouts into the ``REVOCATION_STORE``.
+
+    Set the client's "Backchannel logout URL" in Keycloak to this view. The
+    ``logout_token`` form field is validated as a ``LogoutToken`` and the
+    session (or user) it names is recorded as revoked. Answers ``200`` on
+    success and ``400`` with an OAuth error body otherwise, as the spec asks;
+    ``503`` when the signing keys cannot be fetched, so Keycloak can retry.
+    """
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    parser_classes = (FormParser,)
+
+    def post(self, request):
+        if get_revocation_store() is None:
+            logger.warning("Back-channel logout received but REVOCATION_STORE unset")
+            return _error("REVOCATION_STORE is not configured", 501)
+        raw_token = request.data.get("logout_token")
+        if not raw_token:
+            return _error("logout_token is missing")
+        try:
+            token = LogoutToken(raw_token)
+        except TokenBackendError as exc:
+            logger.info("Rejected back-channel logout: %s", exc)
+            return _error(str(exc))
+        revoke_logout(token.payload)
+        return Response(headers={"Cache-Control": "no-store"})
+
+
+class PushNotBeforeView(APIView):
+    """Receive the not-before policy Keycloak pushes to the client.
+
+    Keycloak POSTs the signed action to ``<Admin URL>/k_push_not_before`` when
+    "Push" is used on the realm's or client's Revocation tab. The action is
+    validated as a ``PushNotBeforeToken`` and its ``notBefore`` becomes the
+    realm's watermark in the ``REVOCATION_STORE``: tokens issued before it are
+    rejected from then on.
+    """
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    # the body is the bare JWS, not a form; read from request.body
+    parser_classes = ()
+
+    def post(self, request):
+        if get_revocation_store() is None:
+            logger.warning("Not-before push received but REVOCATION_STORE unset")
+            return _error("REVOCATION_STORE is not configured", 501)
+        try:
+            token = PushNotBeforeToken(request.body.strip())
+        except TokenBackendError as exc:
+            logger.info("Rejected not-before push: %s", exc)
+            return _error(str(exc))
+        not_before = token.payload["notBefore"]
+        push_not_before(token.issuer, not_before)
+        logger.info("Tokens of %s issued before %s revoked", token.issuer, not_before)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def _error(description, status_code=status.HTTP_400_BAD_REQUEST):
+    return Response(
+        {"error": "invalid_request", "error_description": description},
+        status=status_code,
+        headers={"Cache-Control": "no-store"},
+    )
@@ -0,0 +1,38 @@
+"""Fetch at startup what the first request would otherwise fetch.
+
+Without a warm-up, the first authenticated request in every new process builds
+the JWKS client and waits for the signing keys. ``warm_up`` does that ahead of
+time; ``DrfKeycloakConfig.ready`` calls it when ``WARM_UP_ON_STARTUP`` is set,
+and ``manage.py keycloak_warmup`` runs it on demand (e.g. as a readiness
+probe).
+"""
+
+import logging
+
+from .exceptions import KeycloakAPIError, TokenBackendError
+from .keys import prefetch_signing_keys
+from .settings import keycloak_settings
+
+logger = logging.getLogger("drf_keycloak")
+
+
+def warm_up():
+    """Load the signing keys into this process.
+
+    Raises ``KeycloakAPIError`` if Keycloak is unreachable and
+    ``TokenBackendError`` if it serves no usable signing keys.
+    """
+    signing_keys = prefetch_signing_keys()
+    logger.info("Keycloak warm-up loaded %d signing key(s)", len(signing_keys))
+
+
+def warm_up_on_startup():
+    """Run ``warm_up`` if enabled; log failures unless ``WARM_UP_STRICT``."""
+    if not keycloak_settings.WARM_UP_ON_STARTUP:
+        return
+    try:
+        warm_up()
+    except (KeycloakAPIError, TokenBackendError) as exc:
+        if keycloak_settings.WARM_UP_STRICT:
+            raise
+        logger.warning("Keycloak warm-up failed: %s", exc)
@@ -0,0 +1,136 @@
+"""Deferred, batched persistence of claim changes.
+
+With ``DEFERRED_USER_SAVE`` enabled, a user whose mapped claims changed is not
+saved inside authentication. It is queued instead, and the request carries on
+with the updated in-memory user. A background thread flushes the queue every
+``DEFERRED_USER_SAVE_INTERVAL`` seconds with one ``bulk_update`` per model and
+set of changed fields, so an IdP-wide attribute change turns into a few
+batched UPDATEs instead of one per request.
+
+Writes for the same user are coalesced: the latest instance wins and the
+changed fields accumulate. The queue holds at most
+``DEFERRED_USER_SAVE_MAX_PENDING`` users; beyond that callers save
+synchronously (backpressure rather than unbounded memory). Pending writes are
+flushed at interpreter exit and when KEYCLOAK_CONFIG changes.
+
+``bulk_update`` sends no ``post_save`` signals, so the flush invalidates the
+user cache and claim fingerprints itself.
+"""
+
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import connections
+
+from .settings import keycloak_settings
+from .users import invalidate_user
+
+logger = logging.getLogger("drf_keycloak")
+
+
+class UserWriteBuffer:
+    """Bounded, coalescing queue of pending user updates."""
+
+    def __init__(self, max_pending, interval):
+        self.max_pending = max_pending
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, user, fields):
+        """Queue ``fields`` of ``user`` for writing. False if the queue is full."""
+        key = (type(user), user.pk)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None and len(self._pending) >= self.max_pending:
+                return False
+            if entry is not None:
+                fields = entry[1] | set(fields)
+            self._pending[key] = (user, set(fields))
+            self._start()
+        # the cached copy (if any) predates this change and must not be served
+        invalidate_user(sender=type(user), instance=user)
+        return True
+
+    def flush(self):
+        """Write everything queued so far. Failures are logged, not raised."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        batches = defaultdict(list)
+        for (model, _pk), (user, fields) in pending.items():
+            batches[(model, frozenset(fields))].append(user)
+        for (model, fields), users in batches.items():
+            try:
+                model._default_manager.bulk_update(users, sorted(fields))
+            except Exception:  # noqa: BLE001 - keep the flusher alive
+                logger.exception(
+                    "Deferred save of %d %s rows failed", len(users), model.__name__
+                )
+            for user in users:
+                invalidate_user(sender=model, instance=user)
+
+    def stop(self):
+        """Stop the flusher thread and write what is left."""
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="drf-keycloak-writeback", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+            # the thread's own connections would otherwise stay open forever
+            connections.close_all()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_buffer():
+    """The shared buffer, or None when ``DEFERRED_USER_SAVE`` is off."""
+    global _buffer
+    if not keycloak_settings.DEFERRED_USER_SAVE:
+        return None
+    buffer = _buffer
+    if buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = UserWriteBuffer(
+                    keycloak_settings.DEFERRED_USER_SAVE_MAX_PENDING,
+                    keycloak_settings.DEFERRED_USER_SAVE_INTERVAL,
+                )
+            buffer = _buffer
+    return buffer
+
+
+def defer_user_save(user, fields):
+    """Queue the write if deferral is enabled and has room; else False."""
+    buffer = get_write_buffer()
+    return buffer is not None and buffer.add(user, fields)
+
+
+def reset_write_buffer():
+    """Flush and drop the buffer (called when KEYCLOAK_CONFIG changes)."""
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        atexit.unregister(buffer.stop)
+        buffer.stop()
@@ -22,6 +22,10 @@ _PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
 TEST_KID = "test-kid"
 
 
+def private_key():
+    return _PRIVATE_KEY
+
+
 def public_key():
     """The public key object jwt.decode expects (matches PyJWK.key)."""
     return _PRIVATE_KEY.public_key()
@@ -34,6 +38,13 @@ def public_key_pem():
     )
 
 
+def jwks(kid=TEST_KID):
+    """A JWKS document serving the test public key, as Keycloak's certs does."""
+    jwk = jwt.algorithms.RSAAlgorithm.to_jwk(public_key(), as_dict=True)
+    jwk.update({"kid": kid, "use": "sig", "alg": "RS256"})
+    return {"keys": [jwk]}
+
+
 def make_token(claims=None, exp_delta=3600, kid=TEST_KID, **header_overrides):
     """Build a real RS256-signed token with sensible Keycloak-like claims."""
     now = int(time.time())
@@ -0,0 +1,241 @@
+"""tests for the async authentication path"""
+
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from drf_keycloak import keys
+from drf_keycloak.aio import (
+    AsyncJWToken,
+    AsyncKeycloakApi,
+    AsyncKeycloakAuthBackend,
+    AsyncKeycloakStatelessAuthBackend,
+    aget_signing_key,
+)
+from drf_keycloak.authentication import InvalidToken
+from drf_keycloak.discovery import reset_discovery
+from drf_keycloak.exceptions import KeycloakAPIError, TokenBackendError
+from drf_keycloak.jwks_store import CacheJWKSStore, FileJWKSSnapshot
+from drf_keycloak.keys import reset_jwks_client
+from drf_keycloak.models import TokenUser
+
+from .conftest import TEST_ISSUER, TEST_SERVER_URL
+from .helpers import FIRST_NAME, USERNAME, create_user, jwks, make_token
+
+User = get_user_model()
+
+CERTS_URL = f"{TEST_SERVER_URL}/protocol/openid-connect/certs"
+INTROSPECT_URL = f"{TEST_SERVER_URL}/protocol/openid-connect/token/introspect"
+
+
+def _config(**extra):
+    base = {"SERVER_URL": TEST_SERVER_URL, "ISSUER": TEST_ISSUER}
+    base.update(extra)
+    return base
+
+
+class FakeKeycloak:
+    """httpx transport handler standing in for the Keycloak endpoints."""
+
+    def __init__(self):
+        self.calls = []
+        self.introspection = {"active": True}
+        self.down = False
+        self.documents = {}
+        self.etag = None
+        self.not_modified = 0
+
+    def __call__(self, request):
+        url = str(request.url)
+        self.calls.append(url)
+        if self.down:
+            raise httpx.ConnectError("refused", request=request)
+        if url == CERTS_URL:
+            if self.etag and request.headers.get("If-None-Match") == self.etag:
+                self.not_modified += 1
+                return httpx.Response(304)
+            headers = {"ETag": self.etag} if self.etag else {}
+            return httpx.Response(200, json=jwks(), headers=headers)
+        if url == INTROSPECT_URL:
+            return httpx.Response(200, json=self.introspection)
+        if url in self.documents:
+            return httpx.Response(200, json=self.documents[url]())
+        return httpx.Response(404, json={"error": "not found"})
+
+    def count(self, url):
+        return self.calls.count(url)
+
+
+class AsyncTestCase(TestCase):
+    def setUp(self):
+        reset_jwks_client()
+        self.addCleanup(reset_jwks_client)
+        self.keycloak = FakeKeycloak()
+        patcher = mock.patch.object(
+            AsyncKeycloakApi,
+            "_build_client",
+            lambda api, verify: httpx.AsyncClient(
+                transport=httpx.MockTransport(self.keycloak)
+            ),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestAsyncSigningKey(AsyncTestCase):
+    async def test_resolves_and_caches_keys(self):
+        token = make_token()
+        first = await aget_signing_key(token)
+        second = await aget_signing_key(token)
+        self.assertEqual(first.public_numbers(), second.public_numbers())
+        self.assertEqual(self.keycloak.count(CERTS_URL), 1)
+
+    async def test_unknown_kid_is_rate_limited(self):
+        await aget_signing_key(make_token())
+        for i in range(3):
+            with self.assertRaises(TokenBackendError):
+                await aget_signing_key(make_token(kid=f"bogus-{i}"))
+        # initial fetch plus at most one forced refresh
+        self.assertLessEqual(self.keycloak.count(CERTS_URL), 2)
+
+    @override_settings(KEYCLOAK_CONFIG=_config(JWKS_CACHE_ALIAS="default"))
+    async def test_uses_shared_jwks_store(self):
+        store = CacheJWKSStore("default")
+        await sync_to_async(store.set)(CERTS_URL, jwks(), time.time())
+        self.addCleanup(cache.clear)
+        await aget_signing_key(make_token())
+        self.assertEqual(self.keycloak.count(CERTS_URL), 0)
+
+    @override_settings(KEYCLOAK_CONFIG=_config(USE_DISCOVERY=True))
+    async def test_discovered_jwks_uri(self):
+        self.addCleanup(reset_discovery)
+        well_known = f"{TEST_SERVER_URL}/.well-known/openid-configuration"
+        cdn = "https://cdn.example/certs"
+        self.keycloak.documents = {well_known: lambda: {"jwks_uri": cdn}, cdn: jwks}
+        await aget_signing_key(make_token())
+        await aget_signing_key(make_token())
+        self.assertEqual(self.keycloak.calls, [well_known, cdn])
+
+    async def test_unchanged_jwks_is_revalidated(self):
+        self.keycloak.etag = '"v1"'
+        await aget_signing_key(make_token())
+        with self.assertRaises(TokenBackendError):
+            # unknown kid forces a refetch, answered with 304
+            await aget_signing_key(make_token(kid="bogus"))
+        self.assertEqual(self.keycloak.count(CERTS_URL), 2)
+        self.assertEqual(self.keycloak.not_modified, 1)
+
+    async def test_snapshot_io_stays_off_the_event_loop(self):
+        loop_thread = threading.current_thread()
+        threads = []
+
+        def record(method):
+            def wrapper(*args, **kwargs):
+                threads.append(threading.current_thread())
+                return method(*args, **kwargs)
+
+            return wrapper
+
+        with tempfile.TemporaryDirectory() as tmp:
+            config = _config(JWKS_SNAPSHOT_PATH=os.path.join(tmp, "jwks.json"))
+            with (
+                override_settings(KEYCLOAK_CONFIG=config),
+                mock.patch.object(
+                    FileJWKSSnapshot, "save", record(FileJWKSSnapshot.save)
+                ),
+                mock.patch.object(
+                    FileJWKSSnapshot, "load", record(FileJWKSSnapshot.load)
+                ),
+            ):
+                # cold start (load), then download (save)
+                await aget_signing_key(make_token())
+                # an outage falls back to the snapshot (load)
+                realm = keys._realm(CERTS_URL)
+                realm.keyset = None
+                self.keycloak.down = True
+                with self.assertLogs("drf_keycloak", "WARNING"):
+                    await aget_signing_key(make_token())
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(loop_thread, threads)
+
+    async def test_unreachable_jwks_is_503(self):
+        self.keycloak.down = True
+        with self.assertRaises(KeycloakAPIError):
+            await aget_signing_key(make_token())
+
+
+class TestAsyncJWToken(AsyncTestCase):
+    async def test_validate(self):
+        payload = await AsyncJWToken(make_token()).validate()
+        self.assertEqual(payload["preferred_username"], USERNAME)
+
+    async def test_malformed_raises_invalid(self):
+        with self.assertRaises(TokenBackendError):
+            await AsyncJWToken("invalid.token.here").validate()
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(VERIFY_TOKENS_WITH_KEYCLOAK=True, CLIENT_SECRET="s")
+    )
+    async def test_introspection_inactive_rejected(self):
+        self.keycloak.introspection = {"active": False}
+        with self.assertRaises(TokenBackendError):
+            await AsyncJWToken(make_token()).validate()
+        self.assertEqual(self.keycloak.count(INTROSPECT_URL), 1)
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(VERIFY_TOKENS_WITH_KEYCLOAK=True, CLIENT_SECRET="s")
+    )
+    async def test_introspection_outage_is_503(self):
+        await aget_signing_key(make_token())
+        self.keycloak.down = True
+        with self.assertRaises(KeycloakAPIError):
+            await AsyncJWToken(make_token()).validate()
+
+
+class TestAsyncKeycloakAuthBackend(AsyncTestCase):
+    backend = AsyncKeycloakAuthBackend()
+
+    def _request(self, token):
+        request = APIRequestFactory().get("/")
+        request.META["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        return request
+
+    async def test_valid_token_creates_user(self):
+        user, claims = await self.backend.authenticate(self._request(make_token()))
+        self.assertEqual(user, await User.objects.aget(username=USERNAME))
+        self.assertEqual(claims["preferred_username"], USERNAME)
+        self.assertFalse(user.has_usable_password())
+
+    async def test_existing_user_is_synced(self):
+        from asgiref.sync import sync_to_async
+
+        await sync_to_async(create_user)()
+        token = make_token(claims={"given_name": "Updated"})
+        user, _ = await self.backend.authenticate(self._request(token))
+        self.assertEqual(user.first_name, "Updated")
+        stored = await User.objects.aget(username=USERNAME)
+        self.assertNotEqual(stored.first_name, FIRST_NAME)
+
+    async def test_invalid_token_raises_401(self):
+        with self.assertRaises(InvalidToken):
+            await self.backend.authenticate(self._request("garbage.token.here"))
+
+    async def test_no_header_returns_none(self):
+        self.assertIsNone(await self.backend.authenticate(APIRequestFactory().get("/")))
+
+    async def test_stateless_backend_returns_token_user(self):
+        backend = AsyncKeycloakStatelessAuthBackend()
+        user, claims = await backend.authenticate(self._request(make_token()))
+        self.assertIsInstance(user, TokenUser)
+        self.assertEqual(user.username, USERNAME)
+        self.assertFalse(await User.objects.aexists())
@@ -57,6 +57,25 @@ class TestKeycloakApi(SimpleTestCase):
         with self.assertRaises(KeycloakAPIError):
             KeycloakApi().get_introspect("fake_token")
 
+    @override_settings(KEYCLOAK_CONFIG=_config(HTTP_TIMEOUT=5))
+    @mock.patch("requests.Session.get")
+    def test_get_jwks_returns_etag_and_uses_timeout(self, mock_get):
+        response = self.mock_response(200)
+        response.headers = {"ETag": '"v1"'}
+        mock_get.return_value = response
+        self.assertEqual(
+            KeycloakApi().get_jwks("https://kc/certs"), ('"v1"', self.fake_response)
+        )
+        self.assertEqual(mock_get.call_args.kwargs["timeout"], (5, 5))
+        self.assertNotIn("If-None-Match", mock_get.call_args.kwargs["headers"])
+
+    @mock.patch("requests.Session.get")
+    def test_get_jwks_not_modified_returns_cached(self, mock_get):
+        mock_get.return_value = self.mock_response(304)
+        cached = ('"v1"', {"keys": []})
+        self.assertIs(KeycloakApi().get_jwks("https://kc/certs", cached), cached)
+        self.assertEqual(mock_get.call_args.kwargs["headers"]["If-None-Match"], '"v1"')
+
     @override_settings(KEYCLOAK_CONFIG=_config())
     def test_introspect_without_client_secret_raises(self):
         with self.assertRaises(RuntimeError) as ctx:
@@ -94,3 +113,59 @@ class TestKeycloakApi(SimpleTestCase):
         from drf_keycloak.api import keycloak_api
 
         self.assertEqual("live-client", keycloak_api.client_id)
+
+
+def custom_session():
+    session = requests.Session()
+    session.headers["X-Custom"] = "yes"
+    return session
+
+
+class TestSession(SimpleTestCase):
+    def adapter(self):
+        return KeycloakApi().connection.get_adapter("https://kc.test/")
+
+    def test_defaults(self):
+        adapter = self.adapter()
+        self.assertEqual(adapter._pool_maxsize, 10)
+        self.assertEqual(adapter.max_retries.total, 0)
+        self.assertEqual(KeycloakApi().timeout, (30, 30))
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(
+            HTTP_POOL_CONNECTIONS=4,
+            HTTP_POOL_MAXSIZE=64,
+            HTTP_RETRIES=3,
+            HTTP_RETRY_BACKOFF=0.1,
+            HTTP_CONNECT_TIMEOUT=2,
+            HTTP_TIMEOUT=10,
+        )
+    )
+    def test_tuned_from_settings(self):
+        adapter = self.adapter()
+        self.assertEqual(adapter._pool_connections, 4)
+        self.assertEqual(adapter._pool_maxsize, 64)
+        retries = adapter.max_retries
+        self.assertEqual((retries.total, retries.backoff_factor), (3, 0.1))
+        self.assertEqual(KeycloakApi().timeout, (2, 10))
+
+    @override_settings(KEYCLOAK_CONFIG=_config(HTTP_RETRIES=3))
+    def test_only_idempotent_requests_are_retried_once_sent(self):
+        retries = self.adapter().max_retries
+        self.assertTrue(retries.is_retry("GET", 503))
+        self.assertFalse(retries.is_retry("POST", 503))
+        self.assertFalse(retries.is_retry("GET", 500))
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(HTTP_SESSION_FACTORY="tests.test_api.custom_session")
+    )
+    def test_session_factory(self):
+        self.assertEqual(KeycloakApi().connection.headers["X-Custom"], "yes")
+
+    def test_one_session_rebuilt_on_settings_change(self):
+        from drf_keycloak.api import keycloak_api
+
+        session = keycloak_api.connection
+        self.assertIs(keycloak_api.connection, session)
+        with override_settings(KEYCLOAK_CONFIG=_config(HTTP_POOL_MAXSIZE=64)):
+            self.assertIsNot(keycloak_api.connection, session)
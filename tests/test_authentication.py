@@ -12,9 +12,14 @@ from drf_keycloak.authentication import (
     ExpiredToken,
     InvalidToken,
     KeycloakAuthBackend,
+    KeycloakLazyAuthBackend,
+    KeycloakStatelessAuthBackend,
 )
 from drf_keycloak.exceptions import KeycloakAPIError
+from drf_keycloak.models import TokenUser
 from drf_keycloak.settings import keycloak_settings
+from drf_keycloak.users import claims_fingerprint, get_user_cache
+from drf_keycloak.writeback import get_write_buffer
 
 from .conftest import TEST_ISSUER, TEST_SERVER_URL
 from .helpers import (
@@ -98,7 +103,7 @@ class TestUpdateUser(TestCase):
         user = create_user()
         with mock.patch.object(user, "save") as mock_save:
             self.backend.update_user(user, make_claims(given_name="New"))
-            mock_save.assert_called_once()
+            mock_save.assert_called_once_with(update_fields=["first_name"])
 
     def test_long_value_is_truncated_not_500(self):
         user = create_user()
@@ -185,3 +190,261 @@ class TestAuthenticateFlow(TestCase):
         # must NOT be swallowed into anonymous access
         with self.assertRaises(KeycloakAPIError):
             self.backend.authenticate(self._request(make_token()))
+
+
+class UserCacheTests:
+    """Shared behaviour of the USER_CACHE implementations."""
+
+    backend = KeycloakAuthBackend()
+    user_cache = None
+
+    def setUp(self):
+        override = override_settings(
+            KEYCLOAK_CONFIG=_config(USER_CACHE=self.user_cache)
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        get_user_cache().delete(USERNAME)
+
+    def test_hit_skips_database(self):
+        self.backend.get_user_or_create(make_claims())
+        with self.assertNumQueries(0):
+            user = self.backend.get_user_or_create(make_claims())
+        self.assertEqual(user.username, USERNAME)
+
+    def test_save_invalidates(self):
+        user = self.backend.get_user_or_create(make_claims())
+        user.is_active = False
+        user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.backend.get_user_or_create(make_claims())
+
+    def test_delete_invalidates(self):
+        deleted = self.backend.get_user_or_create(make_claims())
+        deleted_pk = deleted.pk
+        deleted.delete()
+        # a cache hit would hand back the deleted row; a miss recreates it
+        user = self.backend.get_user_or_create(make_claims())
+        self.assertNotEqual(user.pk, deleted_pk)
+        self.assertTrue(User.objects.filter(pk=user.pk).exists())
+
+    def test_claim_change_is_synced_and_invalidates(self):
+        self.backend.get_user_or_create(make_claims())
+        user = self.backend.get_user_or_create(make_claims(given_name="New"))
+        self.assertEqual(user.first_name, "New")
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, "New")
+        self.assertIsNone(get_user_cache().get(USERNAME))
+
+    def test_claim_change_does_not_reactivate_a_cached_user(self):
+        user = self.backend.get_user_or_create(make_claims())
+        # deactivated elsewhere, without a signal reaching this process
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        self.backend.get_user_or_create(make_claims(email="new@example.com"))
+        stored = User.objects.get(pk=user.pk)
+        self.assertEqual(stored.email, "new@example.com")
+        self.assertFalse(stored.is_active)
+
+    def test_inactive_user_is_not_cached(self):
+        user = create_user()
+        user.is_active = False
+        user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.backend.get_user_or_create(make_claims())
+        self.assertIsNone(get_user_cache().get(USERNAME))
+
+
+class TestLocalUserCache(UserCacheTests, TestCase):
+    user_cache = "drf_keycloak.users.LocalUserCache"
+
+    def test_returns_independent_copies(self):
+        self.backend.get_user_or_create(make_claims())
+        self.backend.get_user_or_create(make_claims()).first_name = "Mutated"
+        self.assertEqual(
+            self.backend.get_user_or_create(make_claims()).first_name, FIRST_NAME
+        )
+
+
+class TestDjangoUserCache(UserCacheTests, TestCase):
+    user_cache = "drf_keycloak.users.DjangoUserCache"
+
+
+@override_settings(KEYCLOAK_CONFIG=_config(CLAIM_FINGERPRINT_CACHE_SIZE=16))
+class TestClaimFingerprint(TestCase):
+    backend = KeycloakAuthBackend()
+
+    def test_unchanged_claims_skip_sync(self):
+        user = self.backend.get_user_or_create(make_claims())
+        with mock.patch.object(self.backend, "_apply_claims") as mock_apply:
+            self.backend.update_user(user, make_claims())
+        mock_apply.assert_not_called()
+
+    def test_changed_claims_are_synced(self):
+        user = self.backend.get_user_or_create(make_claims())
+        self.backend.update_user(user, make_claims(given_name="New"))
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, "New")
+
+    def test_missing_and_null_claim_differ(self):
+        claims = make_claims()
+        del claims["given_name"]
+        self.assertNotEqual(
+            claims_fingerprint(claims),
+            claims_fingerprint(make_claims(given_name=None)),
+        )
+
+    def test_local_edit_is_overwritten_on_next_request(self):
+        user = self.backend.get_user_or_create(make_claims())
+        user.first_name = "Local"
+        user.save()  # post_save forgets the fingerprint
+        user = self.backend.get_user_or_create(make_claims())
+        self.assertEqual(user.first_name, FIRST_NAME)
+
+    def test_force_save_ignores_fingerprint(self):
+        user = self.backend.get_user_or_create(make_claims())
+        with mock.patch.object(user, "save") as mock_save:
+            self.backend.update_user(user, make_claims(), force_save=True)
+        mock_save.assert_called_once()
+
+    def test_disabled_by_default(self):
+        with override_settings(KEYCLOAK_CONFIG=_config()):
+            self.assertIsNone(claims_fingerprint(make_claims()))
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(
+            CLAIM_FINGERPRINT_CACHE_SIZE=16,
+            CLAIM_FINGERPRINT_TIMEOUT=0,
+            USER_CACHE_TIMEOUT=3600,
+        )
+    )
+    def test_fingerprint_lifetime_is_independent_of_user_cache(self):
+        user = self.backend.get_user_or_create(make_claims())
+        with mock.patch.object(
+            self.backend, "_apply_claims", return_value=[]
+        ) as mock_apply:
+            self.backend.update_user(user, make_claims())
+        mock_apply.assert_called_once()
+
+
+# a long interval keeps the flusher thread idle; tests flush explicitly
+@override_settings(
+    KEYCLOAK_CONFIG=_config(
+        DEFERRED_USER_SAVE=True,
+        DEFERRED_USER_SAVE_INTERVAL=3600,
+        DEFERRED_USER_SAVE_MAX_PENDING=1,
+    )
+)
+class TestDeferredUserSave(TestCase):
+    backend = KeycloakAuthBackend()
+
+    def test_change_is_written_on_flush(self):
+        user = create_user()
+        with self.assertNumQueries(0):
+            self.backend.update_user(user, make_claims(given_name="New"))
+        self.assertEqual(user.first_name, "New")
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, FIRST_NAME)
+        get_write_buffer().flush()
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, "New")
+
+    def test_writes_for_one_user_coalesce(self):
+        user = create_user()
+        self.backend.update_user(user, make_claims(given_name="New"))
+        self.backend.update_user(user, make_claims(given_name="New", email="n@x.io"))
+        self.assertEqual(len(get_write_buffer()), 1)
+        get_write_buffer().flush()
+        stored = User.objects.get(pk=user.pk)
+        self.assertEqual((stored.first_name, stored.email), ("New", "n@x.io"))
+
+    def test_full_buffer_saves_synchronously(self):
+        first = create_user()
+        second = User.objects.create_user(username="other")
+        self.backend.update_user(first, make_claims(given_name="New"))
+        self.backend.update_user(
+            second, make_claims(preferred_username="other", given_name="Sync")
+        )
+        self.assertEqual(User.objects.get(pk=second.pk).first_name, "Sync")
+        get_write_buffer().flush()
+
+    def test_new_user_is_saved_immediately(self):
+        user = self.backend.get_user_or_create(make_claims())
+        self.assertEqual(len(get_write_buffer()), 0)
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, FIRST_NAME)
+
+    def test_unchanged_claims_queue_nothing(self):
+        user = create_user()
+        self.backend.update_user(user, make_claims())
+        self.assertEqual(len(get_write_buffer()), 0)
+
+    def test_disabled_by_default(self):
+        with override_settings(KEYCLOAK_CONFIG=_config()):
+            self.assertIsNone(get_write_buffer())
+
+
+class TestStatelessAuthBackend(TestCase):
+    backend = KeycloakStatelessAuthBackend()
+
+    def setUp(self):
+        patcher = mock.patch(
+            "drf_keycloak.token.get_signing_key", return_value=public_key()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _request(self, token):
+        request = APIRequestFactory().get("/")
+        request.META["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        return request
+
+    def test_authenticates_without_database(self):
+        with self.assertNumQueries(0):
+            user, claims = self.backend.authenticate(self._request(make_token()))
+        self.assertIsInstance(user, TokenUser)
+        self.assertEqual((user.id, user.pk, user.username), (USERNAME,) * 3)
+        self.assertIs(user.token, claims)
+        self.assertFalse(User.objects.exists())
+
+    def test_mapped_claims_are_attributes(self):
+        user = TokenUser(make_claims())
+        self.assertEqual(user.first_name, FIRST_NAME)
+        self.assertEqual(user.email, EMAIL)
+        self.assertIsNone(TokenUser({"preferred_username": USERNAME}).email)
+        with self.assertRaises(AttributeError):
+            user.unmapped  # noqa: B018
+
+    def test_behaves_as_authenticated_user(self):
+        user = TokenUser(make_claims())
+        self.assertTrue(user.is_authenticated)
+        self.assertTrue(user.is_active)
+        self.assertFalse(user.is_anonymous)
+        self.assertFalse(user.has_perm("auth.view_user"))
+        self.assertEqual(list(user.groups.all()), [])
+        self.assertEqual(user, TokenUser(make_claims(given_name="Other")))
+        with self.assertRaises(AttributeError):
+            user.extra = 1  # slotted
+        with self.assertRaises(NotImplementedError):
+            user.save()
+
+    def test_missing_identity_rejected(self):
+        with self.assertRaises(InvalidToken):
+            self.backend.get_user_or_create({"email": EMAIL})
+
+
+class TestLazyAuthBackend(TestCase):
+    backend = KeycloakLazyAuthBackend()
+
+    def test_user_is_resolved_on_first_use(self):
+        with self.assertNumQueries(0):
+            user = self.backend.get_user_or_create(make_claims())
+        self.assertFalse(User.objects.exists())
+        self.assertEqual(user.first_name, FIRST_NAME)
+        self.assertEqual(user.pk, User.objects.get(username=USERNAME).pk)
+        with self.assertNumQueries(0):
+            user.email  # noqa: B018 - resolved once
+
+    def test_inactive_user_rejected_on_first_use(self):
+        User.objects.create_user(username=USERNAME, is_active=False)
+        user = self.backend.get_user_or_create(make_claims())
+        with self.assertRaises(AuthenticationFailed):
+            user.first_name  # noqa: B018
+
+    def test_missing_identity_rejected_eagerly(self):
+        with self.assertRaises(InvalidToken):
+            self.backend.get_user_or_create({"email": EMAIL})
@@ -0,0 +1,75 @@
+"""Tests for the Bloom filters behind the revocation filter."""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from drf_keycloak import bloom
+from drf_keycloak.bloom import BloomFilter, TimeBucketedBloomFilter
+
+
+class TestBloomFilter(SimpleTestCase):
+    def test_added_keys_are_found(self):
+        bf = BloomFilter(1000, 1e-6)
+        keys = [f"jti:{i}" for i in range(1000)]
+        for key in keys:
+            bf.add(key)
+        self.assertTrue(all(key in bf for key in keys))
+        self.assertEqual(bf.count, 1000)
+
+    def test_false_positive_rate_is_near_the_target(self):
+        bf = BloomFilter(2000, 0.01)
+        for i in range(2000):
+            bf.add(f"in:{i}")
+        hits = sum(f"out:{i}" in bf for i in range(20000))
+        self.assertLess(hits, 20000 * 0.02)
+
+    def test_size_follows_capacity_and_error_rate(self):
+        bf = BloomFilter(100000, 1e-6)
+        # about 29 bits and 20 probes per key at one in a million
+        self.assertAlmostEqual(bf.size / 100000, 28.8, delta=0.1)
+        self.assertEqual(bf.hashes, 20)
+
+
+class TestTimeBucketedBloomFilter(SimpleTestCase):
+    def setUp(self):
+        self.now = 1_000_000.0
+        patcher = mock.patch.object(bloom.time, "time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bf = TimeBucketedBloomFilter(100, 1e-6, lifetime=600, buckets=6)
+
+    def test_entries_expire_with_their_bucket(self):
+        self.bf.add("a", self.now + 50)
+        self.bf.add("b", self.now + 550)
+        self.assertIn("a", self.bf)
+        self.now += 200
+        self.assertNotIn("a", self.bf)
+        self.assertIn("b", self.bf)
+        self.bf.add("c", self.now + 10)  # evicts the expired bucket
+        self.assertEqual(len(self.bf), 2)
+
+    def test_expired_entries_are_not_added(self):
+        self.bf.add("a", self.now - 1)
+        self.assertNotIn("a", self.bf)
+        self.assertEqual(len(self.bf), 0)
+
+    def test_full_bucket_chains_another_filter(self):
+        for i in range(50):
+            self.bf.add(f"k{i}", self.now + 10)
+        (filters,) = self.bf._buckets.values()
+        self.assertEqual(len(filters), 3)
+        self.assertTrue(all(f"k{i}" in self.bf for i in range(50)))
+
+    def test_readding_a_key_does_not_count(self):
+        self.bf.add("a", self.now + 10)
+        self.bf.add("a", self.now + 10)
+        self.assertEqual(len(self.bf), 1)
+
+    def test_distant_expiries_are_clamped_to_the_lifetime(self):
+        for i in range(288):
+            self.bf.add(f"k{i}", self.now + 300 * (i + 1))  # up to a day ahead
+        self.assertLessEqual(len(self.bf._buckets), 6 + 1)
+        self.assertIn("k287", self.bf)
+        self.now += 600 + 100  # the lifetime plus one bucket width
+        self.assertNotIn("k287", self.bf)
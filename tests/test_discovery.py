@@ -0,0 +1,124 @@
+"""Tests for OpenID Connect discovery."""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+import drf_keycloak.discovery as discovery
+import drf_keycloak.keys as keys_module
+from drf_keycloak.api import KeycloakApi, keycloak_api
+from drf_keycloak.exceptions import KeycloakAPIError
+
+from .conftest import TEST_ISSUER, TEST_SERVER_URL
+
+CDN_JWKS = "https://cdn.example/realms/test/certs"
+DOCUMENT = {
+    "issuer": TEST_ISSUER,
+    "jwks_uri": CDN_JWKS,
+    "introspection_endpoint": "https://kc.internal/introspect",
+    "userinfo_endpoint": "https://kc.internal/userinfo",
+    "id_token_signing_alg_values_supported": ["RS256", "ES256"],
+}
+WELL_KNOWN = f"{TEST_SERVER_URL}/.well-known/openid-configuration"
+
+
+def _config(**extra):
+    base = {"SERVER_URL": TEST_SERVER_URL, "ISSUER": TEST_ISSUER}
+    base.update(extra)
+    return base
+
+
+class DiscoveryTestCase(SimpleTestCase):
+    def setUp(self):
+        discovery.reset_discovery()
+        self.addCleanup(discovery.reset_discovery)
+        patcher = mock.patch.object(keycloak_api, "get", return_value=DOCUMENT)
+        self.get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def expire(self, base_url=TEST_SERVER_URL):
+        document, deadline = discovery._documents[base_url]
+        discovery._documents[base_url] = (document, 0)
+
+
+class TestDisabled(DiscoveryTestCase):
+    def test_conventional_paths_without_fetch(self):
+        self.assertEqual(
+            discovery.endpoint("jwks_uri"),
+            f"{TEST_SERVER_URL}/protocol/openid-connect/certs",
+        )
+        self.assertIsNone(discovery.get_document())
+        self.get.assert_not_called()
+
+
+@override_settings(KEYCLOAK_CONFIG=_config(USE_DISCOVERY=True))
+class TestDiscovery(DiscoveryTestCase):
+    def test_endpoints_come_from_the_document(self):
+        self.assertEqual(discovery.endpoint("jwks_uri"), CDN_JWKS)
+        self.assertEqual(
+            discovery.endpoint("userinfo_endpoint"), "https://kc.internal/userinfo"
+        )
+        self.get.assert_called_once_with(url=WELL_KNOWN)
+
+    def test_missing_endpoint_falls_back_to_conventional_path(self):
+        self.get.return_value = {"issuer": TEST_ISSUER}
+        self.assertEqual(
+            discovery.endpoint("introspection_endpoint"),
+            f"{TEST_SERVER_URL}/protocol/openid-connect/token/introspect",
+        )
+
+    def test_document_refetched_after_ttl(self):
+        discovery.endpoint("jwks_uri")
+        self.expire()
+        self.get.return_value = {**DOCUMENT, "jwks_uri": "https://cdn2.example/certs"}
+        self.assertEqual(discovery.endpoint("jwks_uri"), "https://cdn2.example/certs")
+        self.assertEqual(self.get.call_count, 2)
+
+    def test_expired_document_served_while_another_thread_refetches(self):
+        discovery.endpoint("jwks_uri")
+        self.expire()
+        with discovery._lock:
+            self.assertEqual(discovery.endpoint("jwks_uri"), CDN_JWKS)
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_failure_keeps_previous_document_and_backs_off(self):
+        discovery.endpoint("jwks_uri")
+        self.expire()
+        self.get.side_effect = KeycloakAPIError()
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.assertEqual(discovery.endpoint("jwks_uri"), CDN_JWKS)
+        discovery.endpoint("jwks_uri")
+        self.assertEqual(self.get.call_count, 2)
+
+    def test_failure_without_document_uses_conventional_paths(self):
+        self.get.side_effect = KeycloakAPIError()
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            url = discovery.endpoint("jwks_uri")
+        self.assertEqual(url, f"{TEST_SERVER_URL}/protocol/openid-connect/certs")
+
+    def test_unsupported_algorithm_is_logged(self):
+        self.get.return_value = {
+            **DOCUMENT,
+            "id_token_signing_alg_values_supported": ["PS512"],
+        }
+        with self.assertLogs("drf_keycloak", "WARNING") as logs:
+            discovery.get_document()
+        self.assertIn("PS512", logs.output[0])
+
+    def test_settings_change_forgets_documents(self):
+        discovery.get_document()
+        with override_settings(KEYCLOAK_CONFIG=_config(USE_DISCOVERY=True)):
+            self.assertEqual(discovery._documents, {})
+
+    def test_jwks_fetched_from_jwks_uri(self):
+        self.assertEqual(keys_module._certs_url(), CDN_JWKS)
+
+    @mock.patch("requests.Session.post")
+    def test_introspection_uses_discovered_endpoint(self, mock_post):
+        mock_post.return_value = mock.Mock(status_code=200, json=lambda: {})
+        with override_settings(
+            KEYCLOAK_CONFIG=_config(USE_DISCOVERY=True, CLIENT_SECRET="secret")
+        ):
+            KeycloakApi().get_introspect("token")
+        self.assertEqual(mock_post.call_args.args[0], "https://kc.internal/introspect")
@@ -1,70 +1,129 @@
 """Tests for the consolidated JWKS signing-key resolution."""
 
+import json
+import os
+import tempfile
+import threading
+import time
 from unittest import mock
 
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.cache import cache
 from django.test import TestCase
 from django.test.utils import override_settings
+from rest_framework.exceptions import NotFound
 
 import drf_keycloak.keys as keys_module
 from drf_keycloak.exceptions import KeycloakAPIError, TokenBackendError
+from drf_keycloak.jwks_store import CacheJWKSStore
 from drf_keycloak.keys import get_signing_key, reset_jwks_client
 
-from .helpers import make_token
+from .helpers import make_token, public_key
+
+KEY = public_key()
+ROTATED = rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key()
 
 
 class FakeKey:
-    def __init__(self, kid, key="KEYMATERIAL"):
+    def __init__(self, kid, key=KEY):
         self.key_id = kid
         self.key = key
 
+    def to_jwk(self):
+        jwk = jwt.algorithms.RSAAlgorithm.to_jwk(self.key, as_dict=True)
+        jwk.update({"kid": self.key_id, "use": "sig", "alg": "RS256"})
+        return jwk
+
 
-class FakeJWKClient:
-    """Stand-in for PyJWKClient with controllable keys and a refresh counter."""
+class FakeJWKSEndpoint:
+    """A JWKS URL with controllable keys, ETag support and a refresh counter.
+
+    Patched in for ``keycloak_api.get_jwks``; one instance per URL, created on
+    first use.
+    """
 
     instances = []
 
-    def __init__(self, url, *args, **kwargs):
+    def __init__(self, url):
         self.url = url
         self.keys = [FakeKey("kid-1")]
         self.next_keys = None
+        self.fetches = 0
         self.refresh_calls = 0
+        self.not_modified = 0
         self.connection_error = False
-        FakeJWKClient.instances.append(self)
+        self.etag = None
+        FakeJWKSEndpoint.instances.append(self)
 
-    def get_signing_keys(self, refresh=False):
-        if self.connection_error:
-            from jwt.exceptions import PyJWKClientConnectionError
+    @classmethod
+    def at(cls, url=None):
+        url = url or keys_module._certs_url()
+        for endpoint in cls.instances:
+            if endpoint.url == url:
+                return endpoint
+        return cls(url)
 
-            raise PyJWKClientConnectionError("JWKS endpoint unreachable", self.url)
-        if refresh:
+    @classmethod
+    def get_jwks(cls, url, cached=None):
+        return cls.at(url).serve(cached)
+
+    def serve(self, cached):
+        # any fetch after the first is a refresh
+        if self.connection_error:
+            raise KeycloakAPIError()
+        self.fetches += 1
+        if self.fetches > 1:
             self.refresh_calls += 1
             if self.next_keys is not None:
                 self.keys = self.next_keys
-        return self.keys
+        etag = self.etag and f'"{self.etag}-{len(self.keys)}-{self.keys[0].key_id}"'
+        if etag and cached is not None and cached[0] == etag:
+            self.not_modified += 1
+            return cached
+        return etag, {"keys": [key.to_jwk() for key in self.keys]}
+
+
+def patch_jwks(test):
+    """Serve the JWKS from ``FakeJWKSEndpoint`` for the rest of ``test``."""
+    FakeJWKSEndpoint.instances = []
+    patcher = mock.patch.object(
+        keys_module.keycloak_api, "get_jwks", FakeJWKSEndpoint.get_jwks
+    )
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+def same_key(a, b):
+    return a.public_numbers() == b.public_numbers()
+
+
+def age_snapshot(seconds, url=None):
+    """Pretend the realm's snapshot was fetched ``seconds`` earlier."""
+    realm = keys_module._realm(url or keys_module._certs_url())
+    signing_keys, fetched, fetched_at, data = realm.keyset
+    realm.keyset = (signing_keys, fetched - seconds, fetched_at, data)
 
 
 class TestSigningKeyResolution(TestCase):
     def setUp(self):
         reset_jwks_client()
-        FakeJWKClient.instances = []
-        patcher = mock.patch.object(keys_module, "PyJWKClient", FakeJWKClient)
-        patcher.start()
-        self.addCleanup(patcher.stop)
+        patch_jwks(self)
         self.addCleanup(reset_jwks_client)
 
     def test_cache_hit_does_not_refresh(self):
         token = make_token(kid="kid-1")
         key = get_signing_key(token)
-        self.assertEqual(key, "KEYMATERIAL")
-        self.assertEqual(FakeJWKClient.instances[0].refresh_calls, 0)
+        self.assertTrue(same_key(key, KEY))
+        self.assertEqual(FakeJWKSEndpoint.instances[0].refresh_calls, 0)
 
     def test_unknown_kid_triggers_one_refresh_and_resolves(self):
         token = make_token(kid="kid-2")
         # arrange: rotation — refresh yields the new key
-        client = keys_module._get_client()
-        client.next_keys = [FakeKey("kid-2", key="ROTATED")]
+        client = FakeJWKSEndpoint.at()
+        client.next_keys = [FakeKey("kid-2", key=ROTATED)]
         key = get_signing_key(token)
-        self.assertEqual(key, "ROTATED")
+        self.assertTrue(same_key(key, ROTATED))
         self.assertEqual(client.refresh_calls, 1)
 
     def test_first_refresh_allowed_when_monotonic_below_cooldown(self):
@@ -72,15 +131,15 @@ class TestSigningKeyResolution(TestCase):
         # booted CI host it can be < the cooldown. The first forced refresh must
         # still be allowed (a 0.0 sentinel wrongly blocked it -> "key not found").
         token = make_token(kid="kid-2")
-        client = keys_module._get_client()
-        client.next_keys = [FakeKey("kid-2", key="ROTATED")]
+        client = FakeJWKSEndpoint.at()
+        client.next_keys = [FakeKey("kid-2", key=ROTATED)]
         with mock.patch.object(keys_module.time, "monotonic", return_value=5.0):
             key = get_signing_key(token)
-        self.assertEqual(key, "ROTATED")
+        self.assertTrue(same_key(key, ROTATED))
         self.assertEqual(client.refresh_calls, 1)
 
     def test_random_kid_flood_is_rate_limited(self):
-        client = keys_module._get_client()
+        client = FakeJWKSEndpoint.at()
         # none of these kids will ever match
         for i in range(5):
             with self.assertRaises(TokenBackendError):
@@ -89,15 +148,67 @@ class TestSigningKeyResolution(TestCase):
         self.assertLessEqual(client.refresh_calls, 1)
 
     def test_connection_error_becomes_503(self):
-        client = keys_module._get_client()
+        client = FakeJWKSEndpoint.at()
         client.connection_error = True
         with self.assertRaises(KeycloakAPIError):
             get_signing_key(make_token(kid="kid-1"))
 
+    def test_unchanged_set_is_revalidated_not_reparsed(self):
+        endpoint = FakeJWKSEndpoint.at()
+        endpoint.etag = "v"
+        token = make_token(kid="kid-1")
+        get_signing_key(token)
+        age_snapshot(keys_module._JWKS_LIFESPAN)
+        with mock.patch.object(keys_module, "_signing_keys") as mock_parse:
+            self.assertTrue(same_key(get_signing_key(token), KEY))
+        mock_parse.assert_not_called()
+        self.assertEqual(endpoint.not_modified, 1)
+        # the revalidated set is fresh again
+        self.assertIsNotNone(keys_module._cached_signing_keys(endpoint.url))
+
+    def test_changed_set_is_refetched_despite_etag(self):
+        endpoint = FakeJWKSEndpoint.at()
+        endpoint.etag = "v"
+        endpoint.next_keys = [FakeKey("kid-2", key=ROTATED)]
+        get_signing_key(make_token(kid="kid-1"))
+        self.assertTrue(same_key(get_signing_key(make_token(kid="kid-2")), ROTATED))
+        self.assertEqual(endpoint.not_modified, 0)
+
+    def test_client_error_is_401(self):
+        with mock.patch.object(
+            keys_module.keycloak_api, "get_jwks", side_effect=NotFound()
+        ):
+            with self.assertRaisesMessage(
+                TokenBackendError, "No signing keys available"
+            ):
+                get_signing_key(make_token(kid="kid-1"))
+
     def test_malformed_header_is_401(self):
         with self.assertRaises(TokenBackendError):
             get_signing_key("not-a-jwt")
 
+    def test_warm_lookup_takes_no_lock(self):
+        token = make_token(kid="kid-1")
+        get_signing_key(token)
+        with mock.patch.object(keys_module, "_lock") as lock:
+            get_signing_key(token)
+        lock.__enter__.assert_not_called()
+
+    def test_refresh_gate_in_cooldown_takes_no_lock(self):
+        with self.assertRaises(TokenBackendError):
+            get_signing_key(make_token(kid="bogus-1"))
+        with mock.patch.object(keys_module, "_lock") as lock:
+            with self.assertRaises(TokenBackendError):
+                get_signing_key(make_token(kid="bogus-2"))
+        lock.__enter__.assert_not_called()
+
+    def test_registry_is_copied_on_write(self):
+        get_signing_key(make_token(kid="kid-1"))
+        registry = keys_module._registry
+        keys_module._realm("https://other.example/certs")
+        self.assertNotIn("https://other.example/certs", registry)
+        self.assertIn("https://other.example/certs", keys_module._registry)
+
     @override_settings(
         KEYCLOAK_CONFIG={
             "SERVER_URL": "https://rotated.example/realms/x",
@@ -109,5 +220,336 @@ class TestSigningKeyResolution(TestCase):
         get_signing_key(make_token(kid="kid-1"))
         self.assertIn(
             "https://rotated.example/realms/x/protocol/openid-connect/certs",
-            FakeJWKClient.instances[-1].url,
+            FakeJWKSEndpoint.instances[-1].url,
+        )
+
+
+class TestKidIndex(TestCase):
+    def jwk(self, kid, key=KEY, **members):
+        jwk = FakeKey(kid, key).to_jwk()
+        jwk.update(members)
+        return jwk
+
+    def test_indexes_signing_keys_by_kid(self):
+        signing_keys = keys_module._signing_keys(
+            {"keys": [self.jwk("a"), self.jwk("b", ROTATED)]}
+        )
+        self.assertEqual(list(signing_keys), ["a", "b"])
+        self.assertTrue(same_key(keys_module._match(signing_keys, "b"), ROTATED))
+        self.assertIsNone(keys_module._match(signing_keys, "c"))
+
+    def test_skips_keys_no_accepted_token_can_use(self):
+        signing_keys = keys_module._signing_keys(
+            {
+                "keys": [
+                    self.jwk("enc", use="enc"),
+                    self.jwk("ps", alg="PS512"),
+                    self.jwk(""),
+                    {"kty": "unknown", "kid": "broken"},
+                    "not-a-jwk",
+                    self.jwk("ok"),
+                ]
+            }
+        )
+        self.assertEqual(list(signing_keys), ["ok"])
+
+    def test_first_of_repeated_kid_wins(self):
+        signing_keys = keys_module._signing_keys(
+            {"keys": [self.jwk("a"), self.jwk("a", ROTATED)]}
+        )
+        self.assertTrue(same_key(signing_keys["a"], KEY))
+
+    def test_kidless_token_matches_only_a_sole_key(self):
+        sole = keys_module._signing_keys({"keys": [self.jwk("a")]})
+        both = keys_module._signing_keys({"keys": [self.jwk("a"), self.jwk("b")]})
+        self.assertTrue(same_key(keys_module._match(sole, None), KEY))
+        self.assertIsNone(keys_module._match(both, None))
+
+    def test_no_usable_key_is_rejected(self):
+        with self.assertRaises(TokenBackendError):
+            keys_module._signing_keys({"keys": [self.jwk("enc", use="enc")]})
+
+    def test_non_string_kid_is_rejected_before_any_fetch(self):
+        for kid in (["a"], {}):
+            with mock.patch.object(keys_module, "_cached_signing_keys") as cached:
+                with self.assertRaisesMessage(
+                    TokenBackendError, "Token header is invalid"
+                ):
+                    keys_module.resolve_signing_key(kid)
+            cached.assert_not_called()
+
+    def test_lookup_builds_no_key_objects(self):
+        patch_jwks(self)
+        self.addCleanup(reset_jwks_client)
+        token = make_token(kid="kid-1")
+        get_signing_key(token)
+        with mock.patch.object(keys_module.jwt, "PyJWK") as pyjwk:
+            get_signing_key(token)
+        pyjwk.assert_not_called()
+
+
+class TestBackgroundRefresh(TestCase):
+    def setUp(self):
+        reset_jwks_client()
+        patch_jwks(self)
+        self.addCleanup(reset_jwks_client)
+        self.token = make_token(kid="kid-1")
+
+    def test_expired_snapshot_refetched_inline_when_disabled(self):
+        get_signing_key(self.token)
+        age_snapshot(keys_module._JWKS_LIFESPAN)
+        get_signing_key(self.token)
+        self.assertEqual(FakeJWKSEndpoint.instances[0].fetches, 2)
+
+    @override_settings(KEYCLOAK_CONFIG={"JWKS_BACKGROUND_REFRESH": True})
+    def test_expired_snapshot_served_while_refresher_runs(self):
+        with mock.patch.object(keys_module._Refresher, "start") as mock_start:
+            get_signing_key(self.token)
+            age_snapshot(keys_module._JWKS_LIFESPAN + 1)
+            self.assertTrue(same_key(get_signing_key(self.token), KEY))
+        mock_start.assert_called()
+        self.assertEqual(FakeJWKSEndpoint.instances[0].fetches, 1)
+
+    @override_settings(
+        KEYCLOAK_CONFIG={"JWKS_BACKGROUND_REFRESH": True, "JWKS_STALE_IF_ERROR": 60}
+    )
+    def test_stale_if_error_is_bounded(self):
+        with mock.patch.object(keys_module._Refresher, "start"):
+            get_signing_key(self.token)
+            age_snapshot(keys_module._JWKS_LIFESPAN + 60)
+            get_signing_key(self.token)
+        self.assertEqual(FakeJWKSEndpoint.instances[0].fetches, 2)
+
+    @override_settings(
+        KEYCLOAK_CONFIG={"JWKS_BACKGROUND_REFRESH": True, "JWKS_REFRESH_INTERVAL": 0}
+    )
+    def test_refresher_swaps_snapshot_and_keeps_it_on_error(self):
+        with mock.patch.object(keys_module._Refresher, "start"):
+            get_signing_key(self.token)
+        refresher = keys_module._refresher
+        client = FakeJWKSEndpoint.instances[0]
+        client.next_keys = [FakeKey("kid-1", key=ROTATED)]
+        # one tick of the loop, run inline
+        with mock.patch.object(refresher.stopped, "wait", side_effect=[False, True]):
+            refresher.run()
+        self.assertTrue(same_key(get_signing_key(self.token), ROTATED))
+
+        client.connection_error = True
+        with mock.patch.object(refresher.stopped, "wait", side_effect=[False, True]):
+            with self.assertLogs("drf_keycloak", "WARNING"):
+                refresher.run()
+        self.assertTrue(same_key(get_signing_key(self.token), ROTATED))
+
+    @override_settings(KEYCLOAK_CONFIG={"JWKS_BACKGROUND_REFRESH": True})
+    def test_reset_stops_refresher(self):
+        get_signing_key(self.token)
+        refresher = keys_module._refresher
+        self.assertTrue(refresher.is_alive())
+        reset_jwks_client()
+        refresher.join(timeout=1)
+        self.assertFalse(refresher.is_alive())
+
+
+@override_settings(KEYCLOAK_CONFIG={"JWKS_CACHE_ALIAS": "default"})
+class TestSharedJWKSStore(TestCase):
+    def setUp(self):
+        reset_jwks_client()
+        cache.clear()
+        patch_jwks(self)
+        self.addCleanup(reset_jwks_client)
+        self.addCleanup(cache.clear)
+        self.store = CacheJWKSStore("default")
+        self.url = keys_module._certs_url()
+
+    def _other_process(self):
+        """Forget this process's snapshot, as a fresh worker would have none."""
+        keys_module._realm(self.url).keyset = None
+
+    def _fetches(self):
+        return sum(client.fetches for client in FakeJWKSEndpoint.instances)
+
+    def test_fetched_set_is_shared(self):
+        get_signing_key(make_token(kid="kid-1"))
+        self._other_process()
+        self.assertTrue(same_key(get_signing_key(make_token(kid="kid-1")), KEY))
+        self.assertEqual(self._fetches(), 1)
+        self.assertIsNotNone(self.store.get(self.url))
+
+    def test_shared_set_is_parsed_once_per_process(self):
+        get_signing_key(make_token(kid="kid-1"))
+        age_snapshot(10**6)
+        with mock.patch.object(keys_module, "_signing_keys") as mock_parse:
+            get_signing_key(make_token(kid="kid-1"))
+        mock_parse.assert_not_called()
+
+    def test_stale_set_served_while_another_process_refreshes(self):
+        self.store.set(self.url, {"keys": [FakeKey("kid-1").to_jwk()]}, 0)
+        self.assertTrue(self.store.acquire(self.url))
+        self.assertTrue(same_key(get_signing_key(make_token(kid="kid-1")), KEY))
+        self.assertEqual(self._fetches(), 0)
+
+    def test_cold_boot_waits_for_the_lock_holder_to_publish(self):
+        self.assertTrue(self.store.acquire(self.url))
+        publish = threading.Timer(
+            0.2,
+            self.store.set,
+            (self.url, {"keys": [FakeKey("kid-1").to_jwk()]}, time.time()),
+        )
+        publish.start()
+        self.addCleanup(publish.cancel)
+        self.assertTrue(same_key(get_signing_key(make_token(kid="kid-1")), KEY))
+        self.assertEqual(self._fetches(), 0)
+
+    def test_cold_boot_fetches_itself_if_the_lock_holder_is_late(self):
+        self.assertTrue(self.store.acquire(self.url))
+        with mock.patch.object(keys_module, "_SHARED_WAIT", 0.1):
+            self.assertTrue(same_key(get_signing_key(make_token(kid="kid-1")), KEY))
+        self.assertEqual(self._fetches(), 1)
+
+    def test_expired_set_refreshed_and_published(self):
+        self.store.set(self.url, {"keys": [FakeKey("kid-1").to_jwk()]}, 0)
+        get_signing_key(make_token(kid="kid-1"))
+        self.assertEqual(self._fetches(), 1)
+        self.assertGreater(self.store.get(self.url)[1], 0)
+        # the lock is released after publishing
+        self.assertTrue(self.store.acquire(self.url))
+
+    def test_forced_refresh_adopts_newer_shared_set(self):
+        get_signing_key(make_token(kid="kid-1"))
+        # another process picked up a rotation meanwhile
+        rotated = {"keys": [FakeKey("kid-2", key=ROTATED).to_jwk()]}
+        self.store.set(self.url, rotated, keys_module._snapshot_time(self.url) + 1)
+        key = get_signing_key(make_token(kid="kid-2"))
+        self.assertTrue(same_key(key, ROTATED))
+        self.assertEqual(self._fetches(), 1)
+
+
+class TestJWKSSnapshot(TestCase):
+    def setUp(self):
+        patch_jwks(self)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "jwks.json")
+        self._configure(JWKS_SNAPSHOT_PATH=self.path)
+        self.addCleanup(reset_jwks_client)
+        self.url = keys_module._certs_url()
+        self.token = make_token(kid="kid-1")
+
+    def _configure(self, **config):
+        override = override_settings(KEYCLOAK_CONFIG=config)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _write(self, fetched_at, url=None):
+        entry = {
+            "fetched_at": fetched_at,
+            "jwks": {"keys": [FakeKey("kid-1").to_jwk()]},
+        }
+        with open(self.path, "w") as fh:
+            json.dump({"sets": {url or self.url: entry}}, fh)
+
+    def _keycloak_down(self):
+        FakeJWKSEndpoint.at().connection_error = True
+
+    def test_successful_fetch_is_written(self):
+        get_signing_key(self.token)
+        with open(self.path) as fh:
+            entry = json.load(fh)["sets"][self.url]
+        self.assertEqual(entry["jwks"]["keys"][0]["kid"], "kid-1")
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["jwks.json"])
+
+    def test_cold_start_loads_fresh_snapshot_without_network(self):
+        self._write(time.time())
+        self.assertTrue(same_key(get_signing_key(self.token), KEY))
+        self.assertEqual(FakeJWKSEndpoint.instances, [])
+
+    def _join_revalidation(self):
+        for thread in threading.enumerate():
+            if thread.name == "drf-keycloak-jwks-revalidate":
+                thread.join(5)
+
+    def test_stale_snapshot_served_while_keycloak_unreachable(self):
+        self._write(time.time() - 3600)
+        self._keycloak_down()
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.assertTrue(same_key(get_signing_key(self.token), KEY))
+            self._join_revalidation()
+        # retried only after the cooldown, not on every request
+        self.assertIsNotNone(keys_module._cached_signing_keys(self.url))
+
+    def test_cold_start_serves_stale_snapshot_and_revalidates_in_background(self):
+        self._write(time.time() - 3600)
+        with mock.patch.object(
+            keys_module, "_fetch_signing_keys", wraps=keys_module._fetch_signing_keys
+        ) as fetch:
+            self.assertTrue(same_key(get_signing_key(self.token), KEY))
+            self._join_revalidation()
+        # the one fetch happened off the request thread
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(FakeJWKSEndpoint.at().fetches, 1)
+        self.assertGreater(keys_module._snapshot_time(self.url), time.time() - 60)
+
+    def test_expired_in_memory_set_survives_outage(self):
+        get_signing_key(self.token)
+        os.unlink(self.path)
+        age_snapshot(10**4)
+        self._keycloak_down()
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.assertTrue(same_key(get_signing_key(self.token), KEY))
+
+    def test_snapshot_older_than_max_age_is_not_served(self):
+        self._configure(JWKS_SNAPSHOT_PATH=self.path, JWKS_SNAPSHOT_MAX_AGE=60)
+        self._write(time.time() - 3600)
+        self._keycloak_down()
+        with self.assertRaises(KeycloakAPIError):
+            get_signing_key(self.token)
+
+    def test_snapshot_for_other_realm_is_ignored(self):
+        self._write(time.time(), url="https://other.example/certs")
+        self._keycloak_down()
+        with self.assertRaises(KeycloakAPIError):
+            get_signing_key(self.token)
+
+    def test_unwritable_path_does_not_break_resolution(self):
+        missing = os.path.join(os.path.dirname(self.path), "missing", "jwks.json")
+        self._configure(JWKS_SNAPSHOT_PATH=missing)
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.assertTrue(same_key(get_signing_key(self.token), KEY))
+
+
+@override_settings(
+    KEYCLOAK_CONFIG={
+        "TRUSTED_ISSUERS": {
+            "https://kc.test/realms/a": None,
+            "https://kc.test/realms/b": "http://kc.internal/realms/b",
+        }
+    }
+)
+class TestPerIssuerKeys(TestCase):
+    def setUp(self):
+        reset_jwks_client()
+        patch_jwks(self)
+        self.addCleanup(reset_jwks_client)
+
+    def test_each_issuer_has_its_own_client(self):
+        get_signing_key(make_token(kid="kid-1"), "https://kc.test/realms/a")
+        get_signing_key(make_token(kid="kid-1"), "https://kc.test/realms/b")
+        self.assertEqual(
+            [client.url for client in FakeJWKSEndpoint.instances],
+            [
+                "https://kc.test/realms/a/protocol/openid-connect/certs",
+                "http://kc.internal/realms/b/protocol/openid-connect/certs",
+            ],
+        )
+
+    def test_cooldown_is_per_issuer(self):
+        for issuer in ("https://kc.test/realms/a", "https://kc.test/realms/b"):
+            with self.assertRaises(TokenBackendError):
+                get_signing_key(make_token(kid="unknown"), issuer)
+        self.assertEqual(
+            [client.refresh_calls for client in FakeJWKSEndpoint.instances], [1, 1]
         )
+
+    def test_prefetch_loads_every_issuer(self):
+        keys_module.prefetch_signing_keys()
+        self.assertEqual(len(FakeJWKSEndpoint.instances), 2)
@@ -0,0 +1,293 @@
+"""Tests for the Keycloak circuit breaker and introspection bulkhead."""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from rest_framework.exceptions import APIException
+
+from drf_keycloak import resilience
+from drf_keycloak.aio import AsyncKeycloakApi
+from drf_keycloak.api import KeycloakApi
+from drf_keycloak.exceptions import KeycloakAPIError
+from drf_keycloak.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    AsyncBulkhead,
+    Bulkhead,
+    CircuitBreaker,
+)
+
+from .conftest import TEST_ISSUER, TEST_SERVER_URL
+
+
+def _config(**extra):
+    base = {"SERVER_URL": TEST_SERVER_URL, "ISSUER": TEST_ISSUER}
+    base.update(extra)
+    return base
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(SimpleTestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(resilience.time, "monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("kc", threshold=3, reset_timeout=30)
+
+    def fail(self, times):
+        for _ in range(times):
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CLOSED)
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.fail(1)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_the_count(self):
+        self.fail(2)
+        self.breaker.record_success()
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_lets_limited_probes_through(self):
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.fail(3)
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_probe_closes(self):
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.fail(3)
+        self.clock.now += 30
+        self.breaker.allow()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.fail(3)
+        self.clock.now += 30
+        self.breaker.allow()
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.fail(1)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(
+            self.breaker.snapshot(), {"state": OPEN, "failures": 4, "retry_in": 30}
+        )
+
+    def test_released_probe_frees_its_slot(self):
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.fail(3)
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+
+
+@override_settings(
+    KEYCLOAK_CONFIG=_config(CLIENT_SECRET="secret", CIRCUIT_BREAKER_THRESHOLD=2)
+)
+class TestKeycloakApiCircuit(SimpleTestCase):
+    def setUp(self):
+        resilience.reset_circuit_breakers()
+        self.addCleanup(resilience.reset_circuit_breakers)
+        patcher = mock.patch("requests.Session.post")
+        self.post = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def introspect(self):
+        with self.assertRaises(KeycloakAPIError):
+            KeycloakApi().get_introspect("token")
+
+    def test_open_circuit_fails_fast_without_network(self):
+        self.post.side_effect = requests.ConnectionError("refused")
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.introspect()
+            self.introspect()
+        self.introspect()
+        self.assertEqual(self.post.call_count, 2)
+        self.assertEqual(resilience.circuit_breakers()["kc.test"]["state"], OPEN)
+
+    def test_server_errors_count_client_errors_do_not(self):
+        self.post.return_value = mock.Mock(status_code=500, json=dict, content=b"")
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.introspect()
+            self.introspect()
+        self.assertEqual(resilience.circuit_breakers()["kc.test"]["state"], OPEN)
+
+        resilience.reset_circuit_breakers()
+        self.post.return_value = mock.Mock(status_code=401, json=dict, content=b"")
+        for _ in range(3):
+            with self.assertLogs("drf_keycloak", "ERROR"):
+                with self.assertRaises(APIException) as raised:
+                    KeycloakApi().get_introspect("token")
+            self.assertEqual(raised.exception.status_code, 401)
+        self.assertEqual(resilience.circuit_breakers()["kc.test"]["state"], CLOSED)
+
+    def open_circuit(self):
+        self.post.side_effect = requests.ConnectionError("refused")
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            self.introspect()
+            self.introspect()
+        breaker = resilience.get_circuit_breaker(TEST_SERVER_URL)
+        breaker._opened_at -= breaker.reset_timeout  # due for a probe
+        return breaker
+
+    def test_probe_ending_in_an_unexpected_error_frees_its_slot(self):
+        breaker = self.open_circuit()
+        self.post.side_effect = RuntimeError("custom session bug")
+        with self.assertRaises(RuntimeError):
+            KeycloakApi().get_introspect("token")
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+    def test_cancelled_async_probe_frees_its_slot(self):
+        breaker = self.open_circuit()
+        api = AsyncKeycloakApi()
+
+        async def probe():
+            with mock.patch.object(
+                type(api), "connection", new_callable=mock.PropertyMock
+            ) as connection:
+                connection.return_value.get = mock.AsyncMock(
+                    side_effect=asyncio.CancelledError
+                )
+                await api.send("get", f"{TEST_SERVER_URL}/certs")
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(probe())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+    def test_settings_change_resets_breakers(self):
+        resilience.get_circuit_breaker(TEST_SERVER_URL)
+        with override_settings(KEYCLOAK_CONFIG=_config()):
+            self.assertEqual(resilience.circuit_breakers(), {})
+            self.assertIsNone(resilience.get_circuit_breaker(TEST_SERVER_URL))
+
+
+class TestBulkhead(SimpleTestCase):
+    def setUp(self):
+        self.bulkhead = Bulkhead("Test", max_calls=1, max_queue=1, timeout=5)
+
+    def test_calls_within_the_limit_do_not_wait(self):
+        bulkhead = Bulkhead("Test", max_calls=2, max_queue=0, timeout=0)
+        with bulkhead, bulkhead:
+            self.assertEqual(bulkhead.snapshot(), {"active": 2, "waiting": 0})
+        self.assertEqual(bulkhead.snapshot(), {"active": 0, "waiting": 0})
+
+    def test_queued_call_gets_the_released_slot(self):
+        self.bulkhead.acquire()
+        with ThreadPoolExecutor(1) as pool:
+            future = pool.submit(self.bulkhead.acquire)
+            while not self.bulkhead.snapshot()["waiting"]:
+                threading.Event().wait(0.001)
+            self.bulkhead.release()
+            self.assertIsNone(future.result(5))
+        self.assertEqual(self.bulkhead.snapshot(), {"active": 1, "waiting": 0})
+
+    def test_full_queue_rejects_at_once(self):
+        self.bulkhead.acquire()
+        with ThreadPoolExecutor(1) as pool:
+            pool.submit(self.bulkhead.acquire)
+            while not self.bulkhead.snapshot()["waiting"]:
+                threading.Event().wait(0.001)
+            with self.assertLogs("drf_keycloak", "WARNING") as logs:
+                with self.assertRaises(KeycloakAPIError):
+                    self.bulkhead.acquire()
+            self.assertIn("queue full", logs.output[0])
+            self.bulkhead.release()
+
+    def test_wait_past_the_deadline_rejects(self):
+        bulkhead = Bulkhead("Test", max_calls=1, max_queue=1, timeout=0.01)
+        bulkhead.acquire()
+        with self.assertLogs("drf_keycloak", "WARNING") as logs:
+            with self.assertRaises(KeycloakAPIError):
+                bulkhead.acquire()
+        self.assertIn("timed out", logs.output[0])
+        self.assertEqual(bulkhead.snapshot(), {"active": 1, "waiting": 0})
+
+
+class TestAsyncBulkhead(SimpleTestCase):
+    def test_caps_concurrency_and_rejects_past_the_deadline(self):
+        bulkhead = AsyncBulkhead("Test", max_calls=2, max_queue=10, timeout=0.05)
+        peak = []
+
+        async def call(delay):
+            async with bulkhead:
+                peak.append(bulkhead.snapshot()["active"])
+                await asyncio.sleep(delay)
+
+        async def main():
+            return await asyncio.gather(
+                call(0.01),
+                call(0.01),
+                call(0.01),
+                call(0.2),
+                call(0.2),
+                call(0),
+                return_exceptions=True,
+            )
+
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            results = asyncio.run(main())
+        self.assertEqual(max(peak), 2)
+        self.assertIsInstance(results[-1], KeycloakAPIError)
+        self.assertEqual(bulkhead.snapshot(), {"active": 0, "waiting": 0})
+
+
+@override_settings(
+    KEYCLOAK_CONFIG=_config(
+        CLIENT_SECRET="secret",
+        INTROSPECTION_MAX_CONCURRENCY=2,
+        INTROSPECTION_QUEUE_SIZE=0,
+    )
+)
+class TestIntrospectionBulkhead(SimpleTestCase):
+    def test_calls_past_the_limit_are_rejected_without_network(self):
+        entered = threading.Semaphore(0)
+        release = threading.Event()
+
+        def post(*args, **kwargs):
+            entered.release()
+            release.wait(5)
+            return mock.Mock(status_code=200, json=lambda: {"active": True})
+
+        api = KeycloakApi()
+        with mock.patch("requests.Session.post", side_effect=post) as mock_post:
+            with ThreadPoolExecutor(2) as pool:
+                futures = [pool.submit(api.get_introspect, "t") for _ in range(2)]
+                entered.acquire(timeout=5)
+                entered.acquire(timeout=5)
+                with self.assertLogs("drf_keycloak", "WARNING"):
+                    with self.assertRaises(KeycloakAPIError):
+                        api.get_introspect("t")
+                release.set()
+        self.assertEqual(mock_post.call_count, 2)
+        for future in futures:
+            self.assertEqual(future.result(), {"active": True})
+
+    def test_disabled_by_default(self):
+        with override_settings(KEYCLOAK_CONFIG=_config()):
+            self.assertIsNone(resilience.get_introspection_bulkhead())
@@ -0,0 +1,406 @@
+"""Tests for back-channel logout and the revocation store."""
+
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+from urllib.parse import urlencode
+
+import jwt
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from drf_keycloak import keys
+from drf_keycloak.aio import AsyncJWToken
+from drf_keycloak.exceptions import TokenBackendError
+from drf_keycloak.revocation import (
+    RevocationFilter,
+    add_revocations,
+    ais_revoked,
+    get_revocation_filter,
+    get_revocation_store,
+    is_revoked,
+    reset_revocation_store,
+)
+from drf_keycloak.token import BACKCHANNEL_LOGOUT_EVENT, JWToken, LogoutToken
+
+from .conftest import TEST_ISSUER, TEST_SERVER_URL
+from .helpers import make_token, private_key, public_key
+
+LOCAL = "drf_keycloak.revocation.LocalRevocationStore"
+SHARED = "drf_keycloak.revocation.DjangoRevocationStore"
+SID = "session-1"
+SUB = "user-1"
+
+
+def _config(**extra):
+    base = {"SERVER_URL": TEST_SERVER_URL, "ISSUER": TEST_ISSUER}
+    base.update(extra)
+    return base
+
+
+def logout_token(iat=None, **claims):
+    payload = {
+        "aud": "account",
+        "iat": int(time.time()) if iat is None else iat,
+        "jti": "logout-1",
+        "sub": SUB,
+        "sid": SID,
+        "events": {BACKCHANNEL_LOGOUT_EVENT: {}},
+    }
+    payload.update(claims)
+    return make_token({k: v for k, v in payload.items() if v is not None})
+
+
+class RevocationTestCase(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "drf_keycloak.token.get_signing_key", return_value=public_key()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        reset_revocation_store()
+        cache.clear()
+
+    def post_logout(self, **data):
+        """POST ``data`` form-encoded, as Keycloak does."""
+        return self.client.post(
+            reverse("drf_keycloak:backchannel-logout"),
+            urlencode(data),
+            content_type="application/x-www-form-urlencoded",
+        )
+
+
+@override_settings(KEYCLOAK_CONFIG=_config(REVOCATION_STORE=LOCAL))
+class TestLogoutToken(RevocationTestCase):
+    def test_valid_logout_token(self):
+        self.assertEqual(LogoutToken(logout_token()).payload["sid"], SID)
+
+    def test_sub_alone_is_enough(self):
+        self.assertEqual(LogoutToken(logout_token(sid=None)).payload["sub"], SUB)
+
+    def test_rejected_claims(self):
+        for claims in (
+            {"events": None},
+            {"events": {"other": {}}},
+            {"nonce": "n"},
+            {"sub": None, "sid": None},
+            {"aud": "other-client"},
+            {"iss": "https://evil.example/realms/test"},
+        ):
+            with self.subTest(claims=claims), self.assertRaises(TokenBackendError):
+                LogoutToken(logout_token(**claims))
+
+    def test_access_token_is_not_a_logout_token(self):
+        with self.assertRaises(TokenBackendError):
+            LogoutToken(make_token({"aud": "account", "sid": SID}))
+
+
+class RevocationChecks:
+    def revoke(self, **claims):
+        response = self.post_logout(logout_token=logout_token(**claims))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "no-store")
+
+    def test_tokens_of_the_logged_out_session_are_rejected(self):
+        token = make_token({"sid": SID, "sub": SUB})
+        self.revoke()
+        with self.assertRaisesMessage(TokenBackendError, "Token is revoked"):
+            JWToken(token)
+
+    def test_other_sessions_of_the_user_still_pass(self):
+        self.revoke()
+        JWToken(make_token({"sid": "session-2", "sub": SUB}))
+
+    def test_logout_without_sid_ends_every_session_of_the_user(self):
+        now = int(time.time())
+        self.revoke(sid=None, iat=now)
+        payload = {"iss": TEST_ISSUER, "sid": "session-2", "sub": SUB, "iat": now - 1}
+        self.assertTrue(is_revoked(payload))
+        # logging in again afterwards yields a token that passes
+        self.assertFalse(is_revoked({**payload, "iat": now + 1}))
+
+    def test_legacy_session_state_claim(self):
+        self.revoke()
+        self.assertTrue(
+            is_revoked({"iss": TEST_ISSUER, "session_state": SID, "iat": 0})
+        )
+
+    async def test_async_token_is_rejected(self):
+        token = make_token({"sid": SID, "sub": SUB})
+        self.revoke()
+        with (
+            mock.patch("drf_keycloak.aio.aget_signing_key", return_value=public_key()),
+            self.assertRaisesMessage(TokenBackendError, "Token is revoked"),
+        ):
+            await AsyncJWToken(token).validate()
+
+
+@override_settings(KEYCLOAK_CONFIG=_config(REVOCATION_STORE=LOCAL))
+class TestLocalRevocationStore(RevocationChecks, RevocationTestCase):
+    pass
+
+
+@override_settings(KEYCLOAK_CONFIG=_config(REVOCATION_STORE=SHARED))
+class TestDjangoRevocationStore(RevocationChecks, RevocationTestCase):
+    def test_revocation_is_shared_through_the_cache(self):
+        self.revoke()
+        with override_settings(KEYCLOAK_CONFIG=_config(REVOCATION_STORE=SHARED)):
+            self.assertTrue(is_revoked({"sid": SID, "iss": TEST_ISSUER, "iat": 0}))
+
+    def test_one_cache_round_trip_per_request(self):
+        store = get_revocation_store()
+        payload = {"iss": TEST_ISSUER, "sid": SID, "sub": SUB, "iat": 0}
+        with mock.patch.object(
+            store._cache, "get_many", wraps=store._cache.get_many
+        ) as get_many:
+            self.assertFalse(is_revoked(payload))
+        get_many.assert_called_once()
+        self.assertEqual(len(get_many.call_args.args[0]), 3)
+
+    async def test_async_lookup_is_batched(self):
+        self.revoke()
+        store = get_revocation_store()
+        payload = {"iss": TEST_ISSUER, "sid": SID, "sub": SUB, "iat": 0}
+        with mock.patch.object(
+            store._cache, "aget_many", wraps=store._cache.aget_many
+        ) as aget_many:
+            self.assertTrue(await ais_revoked(payload))
+        aget_many.assert_called_once()
+
+
+class TestBackchannelLogoutView(RevocationTestCase):
+    def test_disabled_without_store(self):
+        with self.assertLogs("drf_keycloak", "WARNING"):
+            response = self.post_logout(logout_token=logout_token())
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(KEYCLOAK_CONFIG=_config(REVOCATION_STORE=LOCAL))
+    def test_invalid_token_is_a_bad_request(self):
+        with self.assertLogs("drf_keycloak", "INFO"):
+            response = self.post_logout(logout_token="not.a.token")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "invalid_request")
+
+    @override_settings(KEYCLOAK_CONFIG=_config(REVOCATION_STORE=LOCAL))
+    def test_missing_token_is_a_bad_request(self):
+        response = self.post_logout()
+        self.assertEqual(response.status_code, 400)
+
+    def test_no_revocation_checks_without_store(self):
+        self.assertFalse(is_revoked({"sid": SID, "iat": 0}))
+
+
+def push_action(not_before, **claims):
+    """The signed admin action Keycloak posts to ``k_push_not_before``."""
+    payload = {
+        "id": "action-1",
+        "expiration": int(time.time()) + 60,
+        "resource": "account",
+        "action": "PUSH_NOT_BEFORE",
+        "notBefore": not_before,
+    }
+    payload.update(claims)
+    return jwt.encode(payload, private_key(), algorithm="RS256", headers={"kid": "k"})
+
+
+@override_settings(KEYCLOAK_CONFIG=_config(REVOCATION_STORE=LOCAL))
+class TestPushNotBefore(RevocationTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch(
+            "drf_keycloak.token.resolve_signing_key", return_value=public_key()
+        )
+        self.resolve = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.now = int(time.time())
+
+    def push(self, action):
+        return self.client.post(
+            reverse("drf_keycloak:push-not-before"),
+            action,
+            content_type="text/plain",
+        )
+
+    def test_tokens_issued_before_the_watermark_are_rejected(self):
+        token = make_token()
+        with self.assertLogs("drf_keycloak", "INFO"):
+            response = self.push(push_action(self.now + 1))
+        self.assertEqual(response.status_code, 204)
+        with self.assertRaisesMessage(TokenBackendError, "Token is revoked"):
+            JWToken(token)
+        # a token issued at the watermark is valid, as in Keycloak's adapters
+        self.assertFalse(is_revoked({"iss": TEST_ISSUER, "iat": self.now + 1}))
+
+    def test_watermark_only_moves_forward(self):
+        with self.assertLogs("drf_keycloak", "INFO"):
+            self.push(push_action(self.now))
+            self.push(push_action(self.now - 100))
+        self.assertTrue(is_revoked({"iss": TEST_ISSUER, "iat": self.now - 1}))
+
+    def test_invalid_actions_are_rejected(self):
+        for claims in (
+            {"action": "LOGOUT"},
+            {"resource": "other-client"},
+            {"expiration": self.now - 10},
+            {"notBefore": "soon"},
+        ):
+            with self.subTest(claims=claims), self.assertLogs("drf_keycloak", "INFO"):
+                response = self.push(push_action(self.now, **claims))
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(is_revoked({"iss": TEST_ISSUER, "iat": 0}))
+
+    def test_unknown_signing_key_is_rejected(self):
+        self.resolve.side_effect = TokenBackendError("Signing key not found")
+        with self.assertLogs("drf_keycloak", "INFO"):
+            response = self.push(push_action(self.now))
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_header_is_a_bad_request(self):
+        # the real lookup, against a loaded key set
+        self.resolve.side_effect = keys.resolve_signing_key
+        action = push_action(self.now)
+        for kid in (["k"], {}):
+            header = base64.urlsafe_b64encode(
+                json.dumps({"alg": "RS256", "kid": kid}).encode()
+            ).rstrip(b"=")
+            forged = header.decode() + action[action.index(".") :]
+            with (
+                self.subTest(kid=kid),
+                mock.patch.object(
+                    keys, "_cached_signing_keys", return_value={"k": public_key()}
+                ),
+                self.assertLogs("drf_keycloak", "INFO"),
+            ):
+                response = self.push(forged)
+                self.assertEqual(response.status_code, 400)
+
+    def test_watermark_applies_to_the_realm_that_signed_it(self):
+        other = "https://kc.test/realms/other"
+
+        def resolve(kid, issuer):
+            if issuer != other:
+                raise TokenBackendError("Signing key not found")
+            return public_key()
+
+        self.resolve.side_effect = resolve
+        config = _config(REVOCATION_STORE=LOCAL, TRUSTED_ISSUERS=[TEST_ISSUER, other])
+        with override_settings(KEYCLOAK_CONFIG=config):
+            with self.assertLogs("drf_keycloak", "INFO"):
+                self.push(push_action(self.now))
+            self.assertTrue(is_revoked({"iss": other, "iat": 0}))
+            self.assertFalse(is_revoked({"iss": TEST_ISSUER, "iat": 0}))
+
+
+@override_settings(KEYCLOAK_CONFIG=_config(REVOCATION_FILTER_CAPACITY=1000))
+class TestRevocationFilter(RevocationTestCase):
+    def write(self, path, entries):
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.writelines(json.dumps(entry) + "\n" for entry in entries)
+
+    def test_revoked_jti_and_session_are_rejected(self):
+        exp = int(time.time()) + 60
+        added = add_revocations([{"jti": "t-1", "exp": exp}, {"sid": SID}])
+        self.assertEqual(added, 2)
+        with self.assertRaisesMessage(TokenBackendError, "Token is revoked"):
+            JWToken(make_token({"jti": "t-1"}))
+        with self.assertRaisesMessage(TokenBackendError, "Token is revoked"):
+            JWToken(make_token({"session_state": SID}))
+        JWToken(make_token({"jti": "t-2", "sid": "session-2"}))
+
+    def test_expired_and_malformed_entries_are_skipped(self):
+        entries = [{"jti": "old", "exp": time.time() - 1}, {"exp": 1}, "t-3", {}]
+        self.assertEqual(add_revocations(entries), 0)
+        self.assertFalse(is_revoked({"jti": "old"}))
+
+    async def test_async_token_is_rejected(self):
+        add_revocations([{"jti": "t-1"}])
+        with (
+            mock.patch("drf_keycloak.aio.aget_signing_key", return_value=public_key()),
+            self.assertRaisesMessage(TokenBackendError, "Token is revoked"),
+        ):
+            await AsyncJWToken(make_token({"jti": "t-1"})).validate()
+
+    def test_loaded_from_file_and_reloaded_when_it_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "revoked.jsonl")
+            self.write(path, [{"jti": "t-1"}])
+            config = _config(
+                REVOCATION_FILTER_CAPACITY=1000,
+                REVOCATION_FILTER_PATH=path,
+                REVOCATION_FILTER_RELOAD_INTERVAL=0,
+            )
+            with override_settings(KEYCLOAK_CONFIG=config):
+                with self.assertLogs("drf_keycloak", "INFO"):
+                    self.assertTrue(is_revoked({"jti": "t-1"}))
+                self.assertFalse(is_revoked({"jti": "t-2"}))
+                self.write(path, [{"jti": "t-1"}, {"jti": "t-2"}, "bad"])
+                with open(path, "a", encoding="utf-8") as fh:
+                    fh.write("not json\n")
+                os.utime(path, ns=(0, time.time_ns() + 10**9))
+                with self.assertLogs("drf_keycloak", "INFO") as logs:
+                    # reloaded in the background; wait for it to finish
+                    is_revoked({})
+                    with get_revocation_filter()._lock:
+                        pass
+                self.assertIn("Skipped 1 bad line(s)", logs.output[0])
+                self.assertTrue(is_revoked({"jti": "t-2"}))
+
+    def test_callers_wait_for_the_first_load(self):
+        started, proceed = threading.Event(), threading.Event()
+        read = RevocationFilter._read
+
+        def slow_read(self):
+            started.set()
+            proceed.wait(5)
+            return read(self)
+
+        results = {}
+
+        def check(name):
+            results[name] = is_revoked({"jti": "t-1"})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "revoked.jsonl")
+            self.write(path, [{"jti": "t-1"}])
+            config = _config(
+                REVOCATION_FILTER_CAPACITY=1000, REVOCATION_FILTER_PATH=path
+            )
+            with (
+                override_settings(KEYCLOAK_CONFIG=config),
+                mock.patch.object(RevocationFilter, "_read", slow_read),
+                self.assertLogs("drf_keycloak", "INFO"),
+            ):
+                first = threading.Thread(target=check, args=("first",))
+                first.start()
+                started.wait(5)
+                second = threading.Thread(target=check, args=("second",))
+                second.start()
+                second.join(0.1)
+                self.assertTrue(second.is_alive())
+                proceed.set()
+                first.join(5)
+                second.join(5)
+        self.assertEqual(results, {"first": True, "second": True})
+
+    def test_unreadable_file_is_logged_and_ignored(self):
+        config = _config(
+            REVOCATION_FILTER_CAPACITY=1000, REVOCATION_FILTER_PATH="/nonexistent"
+        )
+        with override_settings(KEYCLOAK_CONFIG=config):
+            with self.assertLogs("drf_keycloak", "WARNING"):
+                self.assertFalse(is_revoked({"jti": "t-1"}))
+            # not retried before the reload interval
+            with self.assertNoLogs("drf_keycloak", "WARNING"):
+                self.assertFalse(is_revoked({"jti": "t-1"}))
+
+    def test_add_requires_a_capacity(self):
+        with override_settings(KEYCLOAK_CONFIG=_config()):
+            with self.assertRaises(ImproperlyConfigured):
+                add_revocations([{"jti": "t-1"}])
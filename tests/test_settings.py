@@ -18,6 +18,8 @@ class KeycloakSettingsTestCase(TestCase):
         self.assertEqual(keycloak_settings.USER_ID_FIELD, "username")
         self.assertEqual(keycloak_settings.USER_ID_CLAIM, "preferred_username")
         self.assertEqual(keycloak_settings.LEEWAY, 0)
+        self.assertEqual(keycloak_settings.TOKEN_CACHE_SIZE, 0)
+        self.assertFalse(keycloak_settings.FAST_VERIFICATION)
         self.assertTrue(keycloak_settings.VERIFY_CERTIFICATE)
         self.assertEqual(
             keycloak_settings.CLAIM_MAPPING,
@@ -55,3 +57,21 @@ class KeycloakSettingsTestCase(TestCase):
     def test_reload_keycloak_settings(self):
         self.assertEqual(keycloak_settings.SERVER_URL, "https://foo.com")
         self.assertEqual(keycloak_settings.base_url, "https://foo.com")
+
+    def test_trusted_issuers_list_maps_to_itself(self):
+        issuers = ["https://kc/realms/a", "https://kc/realms/b"]
+        with override_settings(KEYCLOAK_CONFIG={"TRUSTED_ISSUERS": issuers}):
+            self.assertEqual(keycloak_settings.trusted_issuers, {i: i for i in issuers})
+        # cached per configuration, cleared on reload
+        self.assertEqual(keycloak_settings.trusted_issuers, {})
+
+    @override_settings(
+        KEYCLOAK_CONFIG={
+            "TRUSTED_ISSUERS": {"https://kc/realms/a": "http://kc.internal/realms/a"}
+        }
+    )
+    def test_trusted_issuers_dict_maps_to_base_url(self):
+        self.assertEqual(
+            keycloak_settings.trusted_issuers,
+            {"https://kc/realms/a": "http://kc.internal/realms/a"},
+        )
@@ -0,0 +1,169 @@
+"""Tests for coalescing of concurrent identical calls."""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+import drf_keycloak.keys as keys_module
+from drf_keycloak.exceptions import KeycloakAPIError
+from drf_keycloak.keys import get_signing_key, reset_jwks_client
+from drf_keycloak.singleflight import AsyncSingleFlight, SingleFlight
+from drf_keycloak.token import JWToken
+
+from .conftest import TEST_ISSUER, TEST_SERVER_URL
+from .helpers import jwks, make_token, public_key
+
+THREADS = 8
+
+
+class Blocking:
+    """A call that blocks until released, counting how often it ran."""
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        self.entered.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _run_concurrently(fn, blocking, threads=THREADS):
+    """Start ``fn`` in ``threads`` threads; release ``blocking`` once all wait."""
+    with ThreadPoolExecutor(threads) as pool:
+        futures = [pool.submit(fn) for _ in range(threads)]
+        blocking.entered.wait(5)
+        # let the followers reach the flight before the leader returns
+        threading.Event().wait(0.05)
+        blocking.release.set()
+    return futures
+
+
+class TestSingleFlight(SimpleTestCase):
+    def test_concurrent_calls_share_one_result(self):
+        flight = SingleFlight()
+        blocking = Blocking(result=object())
+        futures = _run_concurrently(lambda: flight.do("k", blocking), blocking)
+        self.assertEqual(blocking.calls, 1)
+        self.assertEqual({f.result() for f in futures}, {blocking.result})
+
+    def test_concurrent_calls_share_the_exception(self):
+        flight = SingleFlight()
+        blocking = Blocking(error=KeycloakAPIError())
+        futures = _run_concurrently(lambda: flight.do("k", blocking), blocking)
+        self.assertEqual(blocking.calls, 1)
+        for future in futures:
+            self.assertIsInstance(future.exception(), KeycloakAPIError)
+
+    def test_nothing_kept_after_the_call(self):
+        flight = SingleFlight()
+        fn = mock.Mock(side_effect=[1, 2])
+        self.assertEqual(flight.do("k", fn), 1)
+        self.assertEqual(flight.do("k", fn), 2)
+        self.assertIsNone(flight.wait("k"))
+
+    def test_distinct_keys_do_not_share(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("a", lambda: "a"), "a")
+        self.assertEqual(flight.do("b", lambda: "b"), "b")
+
+
+class TestAsyncSingleFlight(SimpleTestCase):
+    def test_concurrent_calls_share_one_result(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "keys"
+
+        async def main():
+            return await asyncio.gather(*(flight.do("k", fetch) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ["keys"] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_cancelled_caller_hands_over_to_a_waiter(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "keys"
+
+        async def main():
+            leader = asyncio.create_task(flight.do("k", fetch))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flight.do("k", fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(main()), "keys")
+        self.assertEqual(len(calls), 2)
+
+
+class TestCoalescedFetches(SimpleTestCase):
+    def setUp(self):
+        reset_jwks_client()
+        self.addCleanup(reset_jwks_client)
+        self.fetch = Blocking(result=(None, jwks()))
+        patcher = mock.patch.object(
+            keys_module.keycloak_api, "get_jwks", side_effect=self.fetch
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cold_start_burst_fetches_once(self):
+        token = make_token()
+        futures = _run_concurrently(lambda: get_signing_key(token), self.fetch)
+        self.assertEqual(self.fetch.calls, 1)
+        for future in futures:
+            self.assertEqual(
+                future.result().public_numbers(), public_key().public_numbers()
+            )
+
+    def test_unknown_kid_waits_for_refresh_in_flight(self):
+        self.fetch.release.set()
+        get_signing_key(make_token())
+        self.fetch.release.clear()
+        self.fetch.entered.clear()
+        token = make_token(kid="unknown")
+        futures = _run_concurrently(lambda: get_signing_key(token), self.fetch)
+        # one forced refresh, however many threads ask for the new kid
+        self.assertEqual(self.fetch.calls, 2)
+        for future in futures:
+            self.assertEqual(str(future.exception()), "Signing key not found")
+
+
+@override_settings(
+    KEYCLOAK_CONFIG={
+        "SERVER_URL": TEST_SERVER_URL,
+        "ISSUER": TEST_ISSUER,
+        "VERIFY_TOKENS_WITH_KEYCLOAK": True,
+        "CLIENT_SECRET": "secret",
+    }
+)
+class TestCoalescedIntrospection(SimpleTestCase):
+    @mock.patch("drf_keycloak.token.get_signing_key", return_value=public_key())
+    def test_parallel_requests_with_one_token_introspect_once(self, _):
+        introspect = Blocking(result={"active": True})
+        token = make_token()
+        with mock.patch("drf_keycloak.token.keycloak_api.get_introspect", introspect):
+            futures = _run_concurrently(lambda: JWToken(token), introspect)
+        self.assertEqual(introspect.calls, 1)
+        for future in futures:
+            self.assertIsNone(future.exception())
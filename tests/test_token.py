@@ -1,5 +1,6 @@
 """tests for token functions"""
 
+import time
 from unittest import mock
 
 import jwt
@@ -7,7 +8,11 @@ from cryptography.hazmat.primitives.asymmetric import rsa
 from django.test import TestCase
 from django.test.utils import override_settings
 
-from drf_keycloak.exceptions import TokenBackendError, TokenBackendExpiredToken
+from drf_keycloak.exceptions import (
+    KeycloakAPIError,
+    TokenBackendError,
+    TokenBackendExpiredToken,
+)
 from drf_keycloak.token import JWToken
 
 from .conftest import TEST_ISSUER, TEST_SERVER_URL
@@ -89,3 +94,216 @@ class TestKeycloakToken(TestCase):
         mock_introspect.return_value = b"not json"
         with self.assertRaises(TokenBackendError):
             JWToken(make_token())
+
+
+class TestTokenCache(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "drf_keycloak.token.get_signing_key", return_value=public_key()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        decode_patcher = mock.patch("drf_keycloak.token.jwt.decode", wraps=jwt.decode)
+        self.mock_decode = decode_patcher.start()
+        self.addCleanup(decode_patcher.stop)
+
+    def test_disabled_by_default(self):
+        token = make_token()
+        JWToken(token)
+        JWToken(token)
+        self.assertEqual(self.mock_decode.call_count, 2)
+
+    @override_settings(KEYCLOAK_CONFIG=_config(TOKEN_CACHE_SIZE=8))
+    def test_repeat_token_skips_verification(self):
+        token = make_token()
+        first = JWToken(token).payload
+        second = JWToken(token).payload
+        self.assertEqual(first, second)
+        self.assertEqual(self.mock_decode.call_count, 1)
+
+    @override_settings(KEYCLOAK_CONFIG=_config(TOKEN_CACHE_SIZE=8))
+    def test_cached_payload_is_not_shared(self):
+        token = make_token()
+        JWToken(token).payload["injected"] = True
+        self.assertNotIn("injected", JWToken(token).payload)
+
+    @override_settings(KEYCLOAK_CONFIG=_config(TOKEN_CACHE_SIZE=8))
+    def test_entry_is_not_served_past_exp(self):
+        token = make_token(exp_delta=60)
+        JWToken(token)
+        later = time.time() + 120
+        with mock.patch("drf_keycloak.cache.time.time", return_value=later):
+            # the stale entry is dropped and the token goes through full decode
+            JWToken(token)
+        self.assertEqual(self.mock_decode.call_count, 2)
+
+    @override_settings(KEYCLOAK_CONFIG=_config(TOKEN_CACHE_SIZE=8, LEEWAY=30))
+    def test_deadline_is_shortened_by_leeway(self):
+        # valid for another 10s, but LEEWAY=30 puts the deadline in the past
+        token = make_token(exp_delta=10)
+        JWToken(token)
+        JWToken(token)
+        self.assertEqual(self.mock_decode.call_count, 2)
+
+    @override_settings(KEYCLOAK_CONFIG=_config(TOKEN_CACHE_SIZE=8))
+    def test_invalid_token_is_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(TokenBackendError):
+                JWToken(make_token(claims={"iss": "https://evil.example/realms/x"}))
+        self.assertEqual(self.mock_decode.call_count, 2)
+
+    @override_settings(KEYCLOAK_CONFIG=_config(TOKEN_CACHE_SIZE=8))
+    def test_settings_change_invalidates(self):
+        token = make_token()
+        JWToken(token)
+        with override_settings(KEYCLOAK_CONFIG=_config(TOKEN_CACHE_SIZE=8)):
+            JWToken(token)
+        self.assertEqual(self.mock_decode.call_count, 2)
+
+
+class TestIntrospectionCache(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "drf_keycloak.token.get_signing_key", return_value=public_key()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        introspect_patcher = mock.patch(
+            "drf_keycloak.token.keycloak_api.get_introspect"
+        )
+        self.mock_introspect = introspect_patcher.start()
+        self.addCleanup(introspect_patcher.stop)
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(VERIFY_TOKENS_WITH_KEYCLOAK=True, CLIENT_SECRET="s")
+    )
+    def test_disabled_by_default(self):
+        self.mock_introspect.return_value = {"active": True}
+        token = make_token()
+        JWToken(token)
+        JWToken(token)
+        self.assertEqual(self.mock_introspect.call_count, 2)
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(
+            VERIFY_TOKENS_WITH_KEYCLOAK=True,
+            CLIENT_SECRET="s",
+            INTROSPECTION_CACHE_TTL=30,
+        )
+    )
+    def test_active_verdict_is_reused(self):
+        self.mock_introspect.return_value = {"active": True}
+        token = make_token()
+        JWToken(token)
+        JWToken(token)
+        self.mock_introspect.assert_called_once()
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(
+            VERIFY_TOKENS_WITH_KEYCLOAK=True,
+            CLIENT_SECRET="s",
+            INTROSPECTION_CACHE_TTL=30,
+        )
+    )
+    def test_active_verdict_expires_after_ttl(self):
+        self.mock_introspect.return_value = {"active": True}
+        token = make_token()
+        JWToken(token)
+        later = time.time() + 31
+        with mock.patch("drf_keycloak.cache.time.time", return_value=later):
+            JWToken(token)
+        self.assertEqual(self.mock_introspect.call_count, 2)
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(
+            VERIFY_TOKENS_WITH_KEYCLOAK=True,
+            CLIENT_SECRET="s",
+            INTROSPECTION_CACHE_TTL=300,
+        )
+    )
+    def test_verdict_never_outlives_exp(self):
+        self.mock_introspect.return_value = {"active": True}
+        token = make_token(exp_delta=10)
+        JWToken(token)
+        later = time.time() + 11
+        with mock.patch("drf_keycloak.cache.time.time", return_value=later):
+            JWToken(token)
+        self.assertEqual(self.mock_introspect.call_count, 2)
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(
+            VERIFY_TOKENS_WITH_KEYCLOAK=True,
+            CLIENT_SECRET="s",
+            INTROSPECTION_CACHE_TTL=30,
+            INTROSPECTION_CACHE_NEGATIVE_TTL=5,
+        )
+    )
+    def test_inactive_verdict_uses_negative_ttl(self):
+        self.mock_introspect.return_value = {"active": False}
+        token = make_token()
+        for _ in range(2):
+            with self.assertRaises(TokenBackendError):
+                JWToken(token)
+        self.mock_introspect.assert_called_once()
+        later = time.time() + 6
+        with mock.patch("drf_keycloak.cache.time.time", return_value=later):
+            with self.assertRaises(TokenBackendError):
+                JWToken(token)
+        self.assertEqual(self.mock_introspect.call_count, 2)
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(
+            VERIFY_TOKENS_WITH_KEYCLOAK=True,
+            CLIENT_SECRET="s",
+            INTROSPECTION_CACHE_TTL=30,
+        )
+    )
+    def test_outage_is_not_cached(self):
+        self.mock_introspect.side_effect = KeycloakAPIError()
+        token = make_token()
+        for _ in range(2):
+            with self.assertRaises(KeycloakAPIError):
+                JWToken(token)
+        self.assertEqual(self.mock_introspect.call_count, 2)
+
+
+REALM_A = "https://kc.test/realms/a"
+REALM_B = "https://kc.test/realms/b"
+
+
+@override_settings(KEYCLOAK_CONFIG=_config(TRUSTED_ISSUERS=[REALM_A, REALM_B]))
+class TestTrustedIssuers(TestCase):
+    def setUp(self):
+        self.issuers = []
+
+        def resolve(_token_or_kid, issuer):
+            self.issuers.append(issuer)
+            return public_key()
+
+        for target in ("get_signing_key", "resolve_signing_key"):
+            patcher = mock.patch(f"drf_keycloak.token.{target}", side_effect=resolve)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_token_routed_to_its_issuer(self):
+        payload = JWToken(make_token(claims={"iss": REALM_B})).payload
+        self.assertEqual(payload["iss"], REALM_B)
+        self.assertEqual(self.issuers, [REALM_B])
+
+    def test_fast_path_routes_too(self):
+        with override_settings(
+            KEYCLOAK_CONFIG=_config(
+                TRUSTED_ISSUERS=[REALM_A, REALM_B], FAST_VERIFICATION=True
+            )
+        ):
+            JWToken(make_token(claims={"iss": REALM_A}))
+        self.assertEqual(self.issuers, [REALM_A])
+
+    def test_untrusted_issuer_rejected_before_key_lookup(self):
+        with self.assertRaisesMessage(TokenBackendError, "Token is invalid"):
+            JWToken(make_token(claims={"iss": "https://evil.example/realms/a"}))
+        self.assertEqual(self.issuers, [])
+
+    def test_configured_issuer_not_implicitly_trusted(self):
+        with self.assertRaises(TokenBackendError):
+            JWToken(make_token())
@@ -0,0 +1,181 @@
+"""tests for the single-parse verification fast path"""
+
+import base64
+import json
+import time
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from drf_keycloak.exceptions import TokenBackendError, TokenBackendExpiredToken
+from drf_keycloak.token import JWToken
+from drf_keycloak.verifier import parse
+
+from .conftest import TEST_ISSUER, TEST_SERVER_URL
+from .helpers import TEST_KID, USERNAME, make_token, private_key, public_key
+
+_EC_KEY = ec.generate_private_key(ec.SECP256R1())
+
+
+def _config(**extra):
+    base = {"SERVER_URL": TEST_SERVER_URL, "ISSUER": TEST_ISSUER}
+    base.update(extra)
+    return base
+
+
+def _outcome(token):
+    try:
+        return JWToken(token).payload
+    except TokenBackendError as exc:
+        return type(exc), str(exc)
+
+
+class TestFastPathParity(TestCase):
+    """Every token must get the same verdict with and without the fast path."""
+
+    def setUp(self):
+        self.key = public_key()
+        for target in ("get_signing_key", "resolve_signing_key"):
+            patcher = mock.patch(
+                f"drf_keycloak.token.{target}", side_effect=lambda *_: self.key
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assertParity(self, token, **config):
+        with override_settings(KEYCLOAK_CONFIG=_config(**config)):
+            slow = _outcome(token)
+        with override_settings(
+            KEYCLOAK_CONFIG=_config(FAST_VERIFICATION=True, **config)
+        ):
+            fast = _outcome(token)
+        self.assertEqual(slow, fast)
+        return fast
+
+    def test_valid(self):
+        payload = self.assertParity(make_token())
+        self.assertEqual(payload["preferred_username"], USERNAME)
+
+    def test_expired(self):
+        outcome = self.assertParity(make_token(exp_delta=-10))
+        self.assertEqual(outcome, (TokenBackendExpiredToken, "Token is expired"))
+
+    def test_leeway(self):
+        self.assertParity(make_token(exp_delta=-5), LEEWAY=30)
+
+    def test_wrong_issuer(self):
+        self.assertParity(make_token(claims={"iss": "https://evil.example/realms/x"}))
+
+    def test_missing_issuer(self):
+        token = jwt.encode({"sub": "x"}, private_key(), algorithm="RS256")
+        self.assertParity(token)
+
+    def test_not_yet_valid(self):
+        self.assertParity(make_token(claims={"nbf": int(time.time()) + 600}))
+        self.assertParity(make_token(claims={"iat": int(time.time()) + 600}))
+
+    def test_non_numeric_exp(self):
+        self.assertParity(make_token(claims={"exp": "soon"}))
+
+    def test_audience(self):
+        for aud in ("api", ["other", "api"], "other", None, 42):
+            claims = {"aud": aud} if aud is not None else None
+            self.assertParity(make_token(claims=claims), AUDIENCE="api")
+
+    def test_bad_signature(self):
+        forged = jwt.encode(
+            {"iss": TEST_ISSUER},
+            rsa.generate_private_key(public_exponent=65537, key_size=2048),
+            algorithm="RS256",
+            headers={"kid": TEST_KID},
+        )
+        self.assertParity(forged)
+
+    def test_malformed(self):
+        for token in ("garbage.token.here", "no-dots", "a.b", "e30.e30.e30.e30"):
+            self.assertParity(token)
+
+    def test_non_string_kid(self):
+        for kid in (["a"], {}, 1):
+            token = make_token()
+            header = base64.urlsafe_b64encode(
+                json.dumps({"alg": "RS256", "kid": kid}).encode()
+            ).rstrip(b"=")
+            forged = header.decode() + token[token.index(".") :]
+            outcome = self.assertParity(forged)
+            self.assertEqual(outcome, (TokenBackendError, "Token is invalid"))
+
+    def test_disallowed_algorithm(self):
+        outcome = self.assertParity(make_token(), ALGORITHM=["ES256"])
+        self.assertEqual(outcome, (TokenBackendError, "Algorithm is invalid"))
+
+    def test_pss(self):
+        token = jwt.encode({"iss": TEST_ISSUER}, private_key(), algorithm="PS256")
+        self.assertParity(token, ALGORITHM=["PS256"])
+
+    def test_ecdsa(self):
+        self.key = _EC_KEY.public_key()
+        token = jwt.encode({"iss": TEST_ISSUER}, _EC_KEY, algorithm="ES256")
+        payload = self.assertParity(token, ALGORITHM=["ES256"])
+        self.assertEqual(payload["iss"], TEST_ISSUER)
+
+    @override_settings(KEYCLOAK_CONFIG=_config(FAST_VERIFICATION=True))
+    def test_key_type_mismatch_is_invalid(self):
+        # PyJWT raises a bare TypeError here; the fast path rejects cleanly
+        self.key = _EC_KEY.public_key()
+        self.assertEqual(
+            _outcome(make_token()), (TokenBackendError, "Token is invalid")
+        )
+
+
+class TestFastPathRouting(TestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "drf_keycloak.token.resolve_signing_key", return_value=public_key()
+        )
+        self.mock_resolve = patcher.start()
+        self.addCleanup(patcher.stop)
+        decode_patcher = mock.patch("drf_keycloak.token.jwt.decode")
+        self.mock_decode = decode_patcher.start()
+        self.addCleanup(decode_patcher.stop)
+
+    @override_settings(KEYCLOAK_CONFIG=_config(FAST_VERIFICATION=True))
+    def test_bypasses_pyjwt_and_header_reparse(self):
+        JWToken(make_token())
+        self.mock_decode.assert_not_called()
+        self.mock_resolve.assert_called_once_with(TEST_KID, None)
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(FAST_VERIFICATION=True, ALGORITHM=["HS256"])
+    )
+    def test_symmetric_algorithm_falls_back_to_pyjwt(self):
+        token = jwt.encode({"iss": TEST_ISSUER}, "s" * 32, algorithm="HS256")
+        with mock.patch("drf_keycloak.token.get_signing_key", return_value="s" * 32):
+            JWToken(token)
+        self.mock_decode.assert_called_once()
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(FAST_VERIFICATION=True, VERIFY_SIGNATURE=False)
+    )
+    def test_unverified_signature_uses_pyjwt(self):
+        with mock.patch("drf_keycloak.token.get_signing_key", return_value=None):
+            JWToken(make_token())
+        self.mock_decode.assert_called_once()
+
+
+class TestParse(TestCase):
+    def test_parses_once_into_parts(self):
+        jws = parse(make_token())
+        self.assertEqual(jws.kid, TEST_KID)
+        self.assertEqual(jws.alg, "RS256")
+        self.assertEqual(jws.payload["preferred_username"], USERNAME)
+
+    def test_accepts_bytes(self):
+        self.assertEqual(parse(make_token().encode()).kid, TEST_KID)
+
+    def test_rejects_non_object_segments(self):
+        with self.assertRaises(TokenBackendError):
+            parse("WzFd.WzFd.c2ln")  # [1].[1].sig
@@ -0,0 +1,75 @@
+"""Tests for the startup warm-up and the keycloak_warmup command."""
+
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+import drf_keycloak.keys as keys_module
+from drf_keycloak.exceptions import KeycloakAPIError
+from drf_keycloak.keys import reset_jwks_client
+from drf_keycloak.warmup import warm_up_on_startup
+
+from .conftest import TEST_ISSUER, TEST_SERVER_URL
+from .helpers import TEST_KID, jwks
+
+
+def _config(**extra):
+    base = {"SERVER_URL": TEST_SERVER_URL, "ISSUER": TEST_ISSUER}
+    base.update(extra)
+    return base
+
+
+class TestWarmUp(TestCase):
+    def setUp(self):
+        reset_jwks_client()
+        self.addCleanup(reset_jwks_client)
+        patcher = mock.patch.object(
+            keys_module.keycloak_api, "get_jwks", return_value=(None, jwks())
+        )
+        self.get_jwks = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_disabled_by_default(self):
+        warm_up_on_startup()
+        self.get_jwks.assert_not_called()
+
+    @override_settings(KEYCLOAK_CONFIG=_config(WARM_UP_ON_STARTUP=True))
+    def test_ready_loads_signing_keys(self):
+        apps.get_app_config("drf_keycloak").ready()
+        keyset = keys_module._realm(keys_module._certs_url()).keyset
+        self.assertIn(TEST_KID, keyset[0])
+
+    @override_settings(KEYCLOAK_CONFIG=_config(WARM_UP_ON_STARTUP=True))
+    def test_failure_is_logged(self):
+        with mock.patch(
+            "drf_keycloak.warmup.prefetch_signing_keys", side_effect=KeycloakAPIError
+        ):
+            with self.assertLogs("drf_keycloak", "WARNING"):
+                warm_up_on_startup()
+
+    @override_settings(
+        KEYCLOAK_CONFIG=_config(WARM_UP_ON_STARTUP=True, WARM_UP_STRICT=True)
+    )
+    def test_strict_failure_raises(self):
+        with mock.patch(
+            "drf_keycloak.warmup.prefetch_signing_keys", side_effect=KeycloakAPIError
+        ):
+            with self.assertRaises(KeycloakAPIError):
+                warm_up_on_startup()
+
+    def test_command_succeeds(self):
+        out = StringIO()
+        call_command("keycloak_warmup", stdout=out)
+        self.assertIn("succeeded", out.getvalue())
+        self.assertIsNotNone(keys_module._realm(keys_module._certs_url()).keyset)
+
+    def test_command_fails_when_keycloak_unreachable(self):
+        with mock.patch(
+            "drf_keycloak.warmup.prefetch_signing_keys", side_effect=KeycloakAPIError
+        ):
+            with self.assertRaises(CommandError):
+                call_command("keycloak_warmup")
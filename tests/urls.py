@@ -1 +1,5 @@
-urlpatterns = []
+from django.urls import include, path
+
+urlpatterns = [
+    path("keycloak/", include("drf_keycloak.urls")),
+]